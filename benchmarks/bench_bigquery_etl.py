@@ -0,0 +1,73 @@
+import pytest
+
+from datahub.ingestion.api.common import PipelineContext
+
+from sync.archive import read_tarball
+from sync.bigquery_etl import _iter_table_references
+from sync.datahub import bigquery_etl_source
+from sync.datahub.bigquery_etl_source import BigQueryEtlSource
+
+pytestmark = pytest.mark.benchmark(group="bigquery_etl")
+
+
+def _walk(tar) -> int:
+    return sum(1 for _ in tar)
+
+
+def _parse_table_references(tar) -> dict:
+    return dict(_iter_table_references(tar))
+
+
+@pytest.fixture(scope="module")
+def table_references(bigquery_etl_archive):
+    return bigquery_etl_archive.read(_parse_table_references)
+
+
+@pytest.fixture
+def create_source(monkeypatch, table_references):
+    monkeypatch.setattr(
+        bigquery_etl_source,
+        "iter_bigquery_etl_table_references",
+        lambda *args: table_references.items(),
+    )
+    return lambda: BigQueryEtlSource.create({}, PipelineContext(run_id="benchmark"))
+
+
+def test_fetch(measure, bigquery_etl_archive):
+    """Download, decompress and walk the tarball without parsing members."""
+    members = measure(
+        read_tarball,
+        bigquery_etl_archive.members,
+        bigquery_etl_archive.url,
+        _walk,
+    )
+    assert members == bigquery_etl_archive.members
+
+
+def test_decompress(measure, bigquery_etl_archive, gzip_backend):
+    """Decompress and walk the tarball from disk, in archive bytes per second."""
+    members = measure(
+        bigquery_etl_archive.read,
+        bigquery_etl_archive.path.stat().st_size,
+        _walk,
+        gzip_backend,
+    )
+    assert members == bigquery_etl_archive.members
+
+
+def test_parse(measure, bigquery_etl_archive):
+    table_references = measure(
+        bigquery_etl_archive.read,
+        bigquery_etl_archive.members,
+        _parse_table_references,
+    )
+    assert table_references
+
+
+def test_build_mcps(measure, create_source, table_references):
+    source = create_source()
+    measure(lambda: list(source.get_workunits_internal()), len(table_references))
+
+
+def test_emit_workunits(measure, create_source, table_references):
+    measure(lambda: list(create_source().get_workunits()), len(table_references))
@@ -0,0 +1,39 @@
+import pytest
+
+from datahub.ingestion.api.common import PipelineContext
+
+from sync import glean
+from sync.datahub import glean_source
+from sync.datahub.glean_source import GleanSource
+
+pytestmark = pytest.mark.benchmark(group="glean")
+
+
+@pytest.fixture(scope="module")
+def glean_pings(glean_dictionary_url):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(glean, "GLEAN_DICTIONARY_URL", glean_dictionary_url)
+        return glean.get_glean_pings()
+
+
+@pytest.fixture
+def create_source(monkeypatch, glean_pings):
+    monkeypatch.setattr(glean_source, "iter_glean_pings", lambda **kwargs: glean_pings)
+    # Stateful ingestion only allows one get_workunits per source
+    return lambda: GleanSource.create({}, PipelineContext(run_id="benchmark"))
+
+
+def test_fetch(measure, monkeypatch, sizes, glean_dictionary_url):
+    """Fetch and decode the index of every app."""
+    monkeypatch.setattr(glean, "GLEAN_DICTIONARY_URL", glean_dictionary_url)
+    pings = measure(glean.get_glean_pings, sizes.glean_apps)
+    assert pings
+
+
+def test_build_mcps(measure, create_source, glean_pings):
+    source = create_source()
+    measure(lambda: list(source.get_workunits_internal()), len(glean_pings))
+
+
+def test_emit_workunits(measure, create_source, glean_pings):
+    measure(lambda: list(create_source().get_workunits()), len(glean_pings))
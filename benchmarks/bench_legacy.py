@@ -0,0 +1,90 @@
+import pytest
+
+from datahub.ingestion.api.common import PipelineContext
+
+from sync.archive import read_tarball
+from sync.datahub import legacy_source
+from sync.datahub.legacy_source import LegacySource
+from sync.legacy import (
+    PING_RECORD,
+    LegacyPing,
+    LegacyPingSchemas,
+    LegacySchemaField,
+    _iter_ping_schemas,
+)
+
+pytestmark = pytest.mark.benchmark(group="legacy")
+
+
+def _walk(tar) -> int:
+    return sum(1 for _ in tar)
+
+
+def _parse_ping_schemas(tar) -> list:
+    return list(_iter_ping_schemas(tar))
+
+
+@pytest.fixture(scope="module")
+def legacy_pings(pipeline_schemas_archive):
+    ping_schemas = pipeline_schemas_archive.read(_parse_ping_schemas)
+    return [
+        LegacyPing(
+            name=ping["name"],
+            versions=[int(v.split(".")[1]) for v in ping["schemas"]],
+            schema_version=ping["schema_version"],
+            fields=[LegacySchemaField(*f) for f in ping["fields"]],
+        )
+        for kind, ping in ping_schemas
+        if kind == PING_RECORD
+    ]
+
+
+@pytest.fixture
+def create_source(monkeypatch, legacy_pings):
+    monkeypatch.setattr(
+        legacy_source,
+        "read_legacy_ping_schemas",
+        lambda *args: LegacyPingSchemas(legacy_pings),
+    )
+    # Stateful ingestion only allows one get_workunits per source
+    return lambda: LegacySource.create({}, PipelineContext(run_id="benchmark"))
+
+
+def test_fetch(measure, pipeline_schemas_archive):
+    """Download, decompress and walk the tarball without parsing members."""
+    members = measure(
+        read_tarball,
+        pipeline_schemas_archive.members,
+        pipeline_schemas_archive.url,
+        _walk,
+    )
+    assert members == pipeline_schemas_archive.members
+
+
+def test_decompress(measure, pipeline_schemas_archive, gzip_backend):
+    """Decompress and walk the tarball from disk, in archive bytes per second."""
+    members = measure(
+        pipeline_schemas_archive.read,
+        pipeline_schemas_archive.path.stat().st_size,
+        _walk,
+        gzip_backend,
+    )
+    assert members == pipeline_schemas_archive.members
+
+
+def test_parse(measure, pipeline_schemas_archive):
+    ping_schemas = measure(
+        pipeline_schemas_archive.read,
+        pipeline_schemas_archive.members,
+        _parse_ping_schemas,
+    )
+    assert ping_schemas
+
+
+def test_build_mcps(measure, create_source, legacy_pings):
+    source = create_source()
+    measure(lambda: list(source.get_workunits_internal()), len(legacy_pings))
+
+
+def test_emit_workunits(measure, create_source, legacy_pings):
+    measure(lambda: list(create_source().get_workunits()), len(legacy_pings))
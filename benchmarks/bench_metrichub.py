@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from datahub.ingestion.api.common import PipelineContext
+
+from sync import metrichub
+from sync.datahub import metrichub_source
+from sync.datahub.metrichub_glossary import (
+    _build_product_dicts,
+    _index_by_product,
+    _write_glossary,
+)
+from sync.datahub.metrichub_source import MetricHubGlossarySource
+
+pytestmark = pytest.mark.benchmark(group="metrichub")
+
+
+def _patch_repos(monkeypatch, metric_hub_repo):
+    repo, looker = metric_hub_repo
+    monkeypatch.setattr(metrichub, "METRIC_HUB_REPO_URL", str(repo))
+    monkeypatch.setattr(metrichub, "LOOKER_METRICS_URL", str(looker))
+
+
+@pytest.fixture(scope="module")
+def metrics(metric_hub_repo):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        _patch_repos(monkeypatch, metric_hub_repo)
+        return metrichub.get_metric_definitions()
+
+
+@pytest.fixture
+def create_source(monkeypatch, metrics):
+    monkeypatch.setattr(
+        metrichub_source, "get_metric_definitions", lambda *args, **kwargs: metrics
+    )
+    return lambda: MetricHubGlossarySource.create(
+        {}, PipelineContext(run_id="benchmark")
+    )
+
+
+def test_parse(measure, monkeypatch, sizes, metric_hub_repo):
+    """Load the definitions and extract the tables of their data sources."""
+    _patch_repos(monkeypatch, metric_hub_repo)
+    metrics = measure(metrichub.get_metric_definitions, sizes.metric_hub_metrics)
+    assert metrics
+
+
+def test_write_glossary(measure, metrics):
+    def write():
+        _write_glossary(io.StringIO(), _build_product_dicts(_index_by_product(metrics)))
+
+    measure(write, len(metrics))
+
+
+def test_build_mcps(measure, create_source, metrics):
+    source = create_source()
+    measure(lambda: list(source.get_workunits_internal()), len(metrics))
+
+
+def test_emit_workunits(measure, create_source, metrics):
+    measure(lambda: list(create_source().get_workunits()), len(metrics))
@@ -0,0 +1,49 @@
+import pytest
+
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
+from datahub.ingestion.api.common import PipelineContext, RecordEnvelope
+from datahub.ingestion.api.sink import NoopWriteCallback
+from datahub.ingestion.sink.sink_registry import sink_registry
+from datahub.metadata.schema_classes import StatusClass
+
+from synthetic import FakeGms
+
+pytestmark = pytest.mark.benchmark(group="sink")
+
+SINKS = ["datahub-rest", "sync.datahub.batch_sink.BatchRestSink"]
+# Seconds GMS takes per batch, and the batches it accepts at once
+LATENCY = 0.02
+CAPACITY = {"unsaturated": 64, "saturated": 4}
+
+
+@pytest.fixture(params=list(CAPACITY))
+def gms(request):
+    with FakeGms(LATENCY, CAPACITY[request.param]) as gms:
+        yield gms
+
+
+@pytest.mark.parametrize("sink_type", SINKS)
+def test_write_records(measure, sizes, gms, sink_type):
+    """Write one record per BigQuery-ETL table, e.g. their lineage."""
+    records = [
+        RecordEnvelope(
+            MetadataChangeProposalWrapper(
+                entityUrn=f"urn:li:corpuser:user{i}", aspect=StatusClass(removed=False)
+            ),
+            metadata={},
+        )
+        for i in range(sizes.bigquery_etl_tables)
+    ]
+
+    def write():
+        sink = sink_registry.get(sink_type).create(
+            {"server": gms.url}, PipelineContext(run_id="benchmark")
+        )
+        with sink:
+            for record in records:
+                sink.write_record_async(record, NoopWriteCallback())
+        return sink.get_report()
+
+    report = measure(write, len(records))
+    assert report.total_records_written == len(records)
+    assert not report.failures
@@ -0,0 +1,98 @@
+from dataclasses import replace
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from sync.decompress import BACKENDS, is_available
+from synthetic import (
+    REALISTIC,
+    Archive,
+    Sizes,
+    UpstreamServer,
+    glean_dictionary_files,
+    write_bigquery_etl_archive,
+    write_metric_hub_repo,
+    write_pipeline_schemas_archive,
+)
+
+# Multiples of the realistic size of every upstream to benchmark at
+SCALES = {"realistic": 1, "10x": 10}
+ROUNDS = 3
+
+
+@pytest.fixture(scope="session", params=list(SCALES))
+def sizes(request) -> Sizes:
+    scale = SCALES[request.param]
+    return replace(
+        REALISTIC,
+        bigquery_etl_tables=REALISTIC.bigquery_etl_tables * scale,
+        glean_apps=REALISTIC.glean_apps * scale,
+        legacy_doctypes=REALISTIC.legacy_doctypes * scale,
+        metric_hub_metrics=REALISTIC.metric_hub_metrics * scale,
+    )
+
+
+@pytest.fixture(params=BACKENDS)
+def gzip_backend(request) -> str:
+    """Every gzip backend that is installed, to compare their throughput."""
+    if not is_available(request.param):
+        pytest.skip(f"{request.param} isn't installed")
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def upstream():
+    with UpstreamServer() as server:
+        yield server
+
+
+@pytest.fixture(scope="session")
+def bigquery_etl_archive(sizes, upstream, tmp_path_factory) -> Archive:
+    path = tmp_path_factory.mktemp("bigquery_etl") / "generated-sql.tar.gz"
+    members = write_bigquery_etl_archive(path, sizes.bigquery_etl_tables)
+    url = upstream.add(f"/bigquery-etl/{path.parent.name}.tar.gz", path.read_bytes())
+    return Archive(path, url, members)
+
+
+@pytest.fixture(scope="session")
+def pipeline_schemas_archive(sizes, upstream, tmp_path_factory) -> Archive:
+    path = tmp_path_factory.mktemp("pipeline_schemas") / "generated-schemas.tar.gz"
+    members = write_pipeline_schemas_archive(path, sizes.legacy_doctypes)
+    url = upstream.add(f"/schemas/{path.parent.name}.tar.gz", path.read_bytes())
+    return Archive(path, url, members)
+
+
+@pytest.fixture(scope="session")
+def glean_dictionary_url(sizes, upstream) -> str:
+    """Return the base URL of a Glean Dictionary of `sizes.glean_apps` apps."""
+    prefix = f"/glean/{sizes.glean_apps}"
+    for path, content in glean_dictionary_files(sizes.glean_apps).items():
+        upstream.add(f"{prefix}{path}", content)
+    return f"{upstream.url}{prefix}"
+
+
+@pytest.fixture(scope="session")
+def metric_hub_repo(sizes, tmp_path_factory) -> List[Path]:
+    """Return the metric-hub and looker definition directories."""
+    path = tmp_path_factory.mktemp("metric_hub")
+    return write_metric_hub_repo(path, sizes.metric_hub_metrics)
+
+
+@pytest.fixture
+def measure(benchmark):
+    """
+    Time `function(*args)` over `ROUNDS` rounds and record how many `items` it
+    handles per second with the results.
+    """
+
+    def measure(function, items: int, *args):
+        result = benchmark.pedantic(function, args=args, rounds=ROUNDS, iterations=1)
+        benchmark.extra_info["items"] = items
+        # Without stats when benchmarks are disabled, which only runs them once
+        if benchmark.stats:
+            mean = benchmark.stats.stats.mean
+            benchmark.extra_info["items_per_second"] = round(items / mean)
+        return result
+
+    return measure
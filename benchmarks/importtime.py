@@ -0,0 +1,114 @@
+"""
+Measures the cold-start import time of the sync modules.
+
+Every module in the budget file is imported in fresh interpreters with
+`python -X importtime`, and the median cumulative import time is compared with
+its `max_ms`. Packages listed under `forbidden` must not be imported with the
+module at all. Exits with an error when any module is over budget.
+"""
+
+import argparse
+import json
+import math
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_FILENAME = Path(__file__).with_name("importtime_budget.json")
+REPEATS = 5
+# Budgets written by --update-budget leave this much room over the median.
+HEADROOM = 2
+
+
+def _import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Return the self and cumulative microseconds of everything `module` imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        prefix, _, rest = line.partition(":")
+        if prefix != "import time":
+            continue
+        parts = rest.split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        times[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return times
+
+
+def measure(module: str, repeats: int = REPEATS) -> Dict:
+    # The first import compiles bytecode, which isn't part of a cold start
+    _import_times(module)
+    runs = [_import_times(module) for _ in range(repeats)]
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)
+    return {
+        "median_ms": statistics.median(run[module][1] for run in runs) / 1000,
+        "runs_ms": [run[module][1] / 1000 for run in runs],
+        "imported": sorted(runs[-1]),
+        "slowest_ms": [[name, times[0] / 1000] for name, times in slowest[:10]],
+    }
+
+
+def _forbidden_imports(imported: List[str], forbidden: List[str]) -> List[str]:
+    return [
+        name
+        for name in imported
+        if any(
+            name == package or name.startswith(f"{package}.") for package in forbidden
+        )
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("modules", nargs="*", help="Modules to measure, by default all")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--output", help="Write the measurements to this JSON file")
+    parser.add_argument(
+        "--update-budget",
+        action="store_true",
+        help=f"Set every measured budget to {HEADROOM}x its median instead of checking",
+    )
+    args = parser.parse_args()
+
+    budget = json.loads(BUDGET_FILENAME.read_text())
+    results = {}
+    over_budget = []
+    for module in args.modules or budget:
+        result = results[module] = measure(module, args.repeats)
+        module_budget = budget.setdefault(module, {})
+        forbidden = _forbidden_imports(
+            result["imported"], module_budget.get("forbidden", [])
+        )
+        if args.update_budget:
+            module_budget["max_ms"] = math.ceil(result["median_ms"] * HEADROOM)
+
+        max_ms = module_budget.get("max_ms", math.inf)
+        status = "ok"
+        if result["median_ms"] > max_ms:
+            status = "OVER BUDGET"
+        if forbidden:
+            status = f"imports {', '.join(forbidden)}"
+        if status != "ok":
+            over_budget.append(module)
+        print(f"{module:40} {result['median_ms']:8.1f}ms / {max_ms:6}ms  {status}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.update_budget:
+        BUDGET_FILENAME.write_text(json.dumps(budget, indent=2) + "\n")
+    elif over_budget:
+        sys.exit(f"Over the import time budget: {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Synthetic stand-ins for the upstreams of the sync sources.
+
+Every generator is deterministic and sized by a count whose default, in
+`REALISTIC`, approximates the current upstream, so benchmarks can be run at
+multiples of it. `UpstreamServer` serves the generated files over HTTP from
+memory, the way GitHub and the Glean Dictionary would, and `FakeGms` accepts
+batches of metadata change proposals the way GMS would.
+"""
+
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+from pathlib import Path
+import random
+import subprocess
+import tarfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from sync.archive import _open_stream
+from sync.bigquery_etl import FILE_PREFIX
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Sizes:
+    bigquery_etl_tables: int
+    glean_apps: int
+    legacy_doctypes: int
+    metric_hub_metrics: int
+
+
+@dataclass(frozen=True)
+class Archive:
+    path: Path
+    url: str
+    members: int
+
+    def read(
+        self, parse: Callable[[tarfile.TarFile], T], backend: Optional[str] = None
+    ) -> T:
+        """Return `parse` applied to the archive, read from disk with `backend`."""
+        with open(self.path, "rb") as fp, _open_stream(fp, backend=backend) as tar:
+            return parse(tar)
+
+
+# Roughly the size of each upstream at the time of writing
+REALISTIC = Sizes(
+    bigquery_etl_tables=6000,
+    glean_apps=150,
+    legacy_doctypes=1000,
+    metric_hub_metrics=2500,
+)
+
+SCHEMAS_PREFIX = "mozilla-pipeline-schemas-generated-schemas/schemas"
+PROJECTS = ["moz-fx-data-shared-prod", "moz-fx-data-marketing-prod", "mozdata"]
+METRIC_HUB_PLATFORMS = 25
+LOOKER_PLATFORMS = 5
+LOOKER_METRICS_PER_PLATFORM = 10
+# Metrics per data source, as metric-hub definitions share them heavily
+METRICS_PER_DATA_SOURCE = 5
+
+
+def _add_file(tar: tarfile.TarFile, name: str, content: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(content)
+    tar.addfile(info, io.BytesIO(content))
+
+
+def _add_dir(tar: tarfile.TarFile, name: str) -> None:
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.DIRTYPE
+    tar.addfile(info)
+
+
+def _bq_schema(rng: random.Random, fields: int) -> bytes:
+    return json.dumps(
+        [
+            {
+                "description": f"Field {i} of the ping",
+                "mode": rng.choice(["NULLABLE", "REPEATED"]),
+                "name": f"field_{i}",
+                "type": rng.choice(["STRING", "INT64", "BOOLEAN", "TIMESTAMP"]),
+            }
+            for i in range(fields)
+        ],
+        indent=2,
+    ).encode()
+
+
+def write_bigquery_etl_archive(path: Path, tables: int, seed: int = 0) -> int:
+    """Write a generated-sql tarball with `tables` tables and return its members."""
+    rng = random.Random(seed)
+    members = 0
+    with tarfile.open(path, "w:gz", compresslevel=6) as tar:
+        _add_file(tar, "bigquery-etl-generated-sql/README.md", b"# bigquery-etl\n")
+        members += 1
+        for i in range(tables):
+            # Tables of unsupported projects are skipped by the parser
+            project = PROJECTS[i % len(PROJECTS)]
+            table_dir = f"{FILE_PREFIX}/{project}/dataset_{i // 50}/table_{i}_v1"
+            _add_dir(tar, table_dir)
+
+            query_file = rng.choice(["query.sql", "view.sql", "query.py"])
+            query = f"SELECT client_id, submission_date FROM source_{i} WHERE x = 1\n"
+            _add_file(tar, f"{table_dir}/{query_file}", query.encode() * 10)
+
+            metadata = (
+                f"friendly_name: Table {i}\n"
+                f"description: |-\n  Synthetic table {i}\n"
+                "owners:\n- owner@mozilla.com\n"
+                "labels:\n  incremental: true\n"
+            )
+            if rng.random() < 0.4:
+                metadata += f"scheduling:\n  dag_name: bqetl_dag_{i % 120}\n"
+            _add_file(tar, f"{table_dir}/metadata.yaml", metadata.encode())
+
+            _add_file(tar, f"{table_dir}/schema.yaml", _bq_schema(rng, 10))
+            members += 4
+    return members
+
+
+def write_pipeline_schemas_archive(path: Path, doctypes: int, seed: int = 0) -> int:
+    """
+    Write a generated-schemas tarball with `doctypes` document types, a tenth of
+    them in the telemetry namespace, and return its members.
+    """
+    rng = random.Random(seed)
+    members = 0
+    with tarfile.open(path, "w:gz", compresslevel=6) as tar:
+        for i in range(doctypes):
+            namespace = "telemetry" if i % 10 == 0 else f"namespace-{i % 97}"
+            doctype = f"doctype-{i}"
+            doctype_dir = f"{SCHEMAS_PREFIX}/{namespace}/{doctype}"
+            _add_dir(tar, doctype_dir)
+            members += 1
+            for version in range(1, rng.randint(1, 6) + 1):
+                schema = _bq_schema(rng, 15)
+                _add_file(tar, f"{doctype_dir}/{doctype}.{version}.bq", schema)
+                _add_file(tar, f"{doctype_dir}/{doctype}.{version}.schema.json", schema)
+                members += 2
+    return members
+
+
+def glean_dictionary_files(apps: int, seed: int = 0) -> Dict[str, bytes]:
+    """Return the Glean Dictionary files of `apps` apps, keyed by their path."""
+    rng = random.Random(seed)
+    app_names = [f"app_{i}" for i in range(apps)]
+    files = {
+        "/data/apps.json": json.dumps(
+            [{"app_name": name, "app_description": ""} for name in app_names]
+        ).encode()
+    }
+    for name in app_names:
+        app = {
+            "app_name": name,
+            "app_ids": [
+                {"name": f"org.mozilla.{name}.channel_{channel}"}
+                for channel in range(rng.randint(1, 4))
+            ],
+            "pings": [
+                {"name": f"ping-{ping}", "description": f"Ping {ping} of {name}"}
+                for ping in range(rng.randint(4, 16))
+            ],
+            # Most of an index is its metrics, which the sync doesn't use
+            "metrics": [
+                {
+                    "name": f"metric.name_{metric}",
+                    "description": f"Metric {metric} of {name}",
+                    "type": "counter",
+                    "expires": "never",
+                }
+                for metric in range(rng.randint(50, 500))
+            ],
+        }
+        files[f"/data/{name}/index.json"] = json.dumps(app).encode()
+    return files
+
+
+def _from_expression(rng: random.Random, i: int) -> str:
+    shape = rng.random()
+    if shape < 0.7:
+        return f"mozdata.telemetry.table_{i}"
+    if shape < 0.9:
+        return (
+            f"(SELECT client_id, submission_date FROM "
+            f"`moz-fx-data-shared-prod.telemetry.table_{i}` WHERE sample_id = 0)"
+        )
+    # Joins need a full parse
+    return (
+        f"(SELECT * FROM mozdata.telemetry.table_{i} AS a "
+        f"JOIN mozdata.telemetry.clients_{i} AS b USING (client_id))"
+    )
+
+
+def _definitions_toml(
+    rng: random.Random, platform: str, prefix: str, metrics: int
+) -> str:
+    lines = []
+    data_sources = max(1, metrics // METRICS_PER_DATA_SOURCE)
+    for i in range(metrics):
+        lines += [
+            f"[metrics.{prefix}metric_{i}]",
+            f'select_expression = "COUNT(DISTINCT IF(x_{i} > 0, client_id, NULL))"',
+            f'data_source = "{prefix}source_{i % data_sources}"',
+            f'description = "Metric {i} of {platform}"',
+            f'friendly_name = "Metric {i}"',
+            'owner = ["owner@mozilla.com"]',
+        ]
+        if rng.random() < 0.1:
+            lines.append(f'level = "{rng.choice(["gold", "silver", "bronze"])}"')
+        if rng.random() < 0.3:
+            lines += [f"[metrics.{prefix}metric_{i}.statistics.sum]", ""]
+        lines.append("")
+    for i in range(data_sources):
+        from_expression = _from_expression(rng, i).replace('"', '\\"')
+        lines += [
+            f"[data_sources.{prefix}source_{i}]",
+            f'from_expression = "{from_expression}"',
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def write_metric_hub_repo(path: Path, metrics: int, seed: int = 0) -> List[Path]:
+    """
+    Write a metric-hub git repository with `metrics` metrics in its definitions,
+    plus the few looker definitions, and return both directories.
+    """
+    rng = random.Random(seed)
+    (path / "definitions").mkdir(parents=True)
+    for i in range(METRIC_HUB_PLATFORMS):
+        platform = f"platform_{i}"
+        (path / "definitions" / f"{platform}.toml").write_text(
+            _definitions_toml(rng, platform, "", metrics // METRIC_HUB_PLATFORMS)
+        )
+
+    # metric-config-parser merges definitions of the same platform pairwise, so
+    # the looker ones are kept as small as upstream and don't scale
+    looker = path / "looker"
+    (looker / "definitions").mkdir(parents=True)
+    for i in range(LOOKER_PLATFORMS):
+        platform = f"platform_{i}"
+        (looker / "definitions" / f"{platform}.toml").write_text(
+            _definitions_toml(rng, platform, "looker_", LOOKER_METRICS_PER_PLATFORM)
+        )
+
+    git = ["git", "-C", str(path), "-c", "user.name=sync", "-c", "user.email=sync@"]
+    subprocess.run([*git, "init", "-q", "-b", "main"], check=True)
+    subprocess.run([*git, "add", "."], check=True)
+    subprocess.run([*git, "commit", "-q", "-m", "Synthetic metrics"], check=True)
+    return [path, looker]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    files: Dict[str, bytes] = {}
+
+    def do_GET(self) -> None:
+        content = self.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class UpstreamServer:
+    """Local HTTP server serving files added with `add` from memory."""
+
+    def __init__(self):
+        handler = type("Handler", (_Handler,), {"files": {}})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._files = handler.files
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def add(self, path: str, content: bytes) -> str:
+        self._files[path] = content
+        return f"{self.url}{path}"
+
+    def __enter__(self) -> "UpstreamServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _GmsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    gms: "FakeGms"
+
+    def _respond(self, status: int, content: bytes = b"{}") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None:
+        # The server config datahub-rest reads before sending anything
+        config = {
+            "noCode": "true",
+            "versions": {"acryldata/datahub": {"version": "v1.2.0"}},
+        }
+        self._respond(200, json.dumps(config).encode())
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if not self.gms._capacity.acquire(blocking=False):
+            with self.gms._lock:
+                self.gms.throttled += 1
+            self._respond(429)
+            return
+        try:
+            time.sleep(self.gms.latency)
+        finally:
+            self.gms._capacity.release()
+        with self.gms._lock:
+            self.gms.accepted += 1
+        self._respond(200)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class FakeGms:
+    """
+    Local HTTP server accepting metadata change proposals after `latency`
+    seconds per request, for at most `capacity` requests at once. Requests over
+    that get a 429, as GMS answers when its ingestion is saturated.
+    """
+
+    def __init__(self, latency: float, capacity: int):
+        self.latency = latency
+        self.accepted = 0
+        self.throttled = 0
+        self._capacity = threading.BoundedSemaphore(capacity)
+        self._lock = threading.Lock()
+        handler = type("Handler", (_GmsHandler,), {"gms": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> "FakeGms":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,423 @@
+"""Helpers for reading the GitHub tarballs that several sources are built from."""
+
+import contextlib
+from dataclasses import dataclass
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
+
+import requests
+
+from sync.decompress import open_gzip
+from sync.session import DEFAULT_TIMEOUT, get_session
+
+if TYPE_CHECKING:
+    from sync.snapshot import Snapshot
+
+# How much of the HTTP body is read at a time when draining it.
+CHUNK_SIZE = 1024 * 1024
+ARCHIVE_FILENAME = "archive.tar.gz"
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class TarballStats:
+    """
+    Where the time of reading tarballs goes, summed over every read.
+
+    Download covers reading the compressed archive, from the network or from
+    disk, and parse is whatever `parse` does besides reading members.
+    """
+
+    download_seconds: float = 0.0
+    downloaded_bytes: int = 0
+    decompress_seconds: float = 0.0
+    decompressed_bytes: int = 0
+    parse_seconds: float = 0.0
+    members_scanned: int = 0
+    # Incremented by `parse` for the members it uses
+    members_matched: int = 0
+
+
+class _TimedReader:
+    """Counts the bytes read from `source` and the time spent reading them."""
+
+    def __init__(self, source: BinaryIO):
+        self._source = source
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def read(self, size: int = -1) -> bytes:
+        start = time.perf_counter()
+        chunk = self._source.read(size)
+        self.seconds += time.perf_counter() - start
+        self.bytes += len(chunk)
+        return chunk
+
+    def readinto(self, buffer) -> int:
+        # Some gzip backends read into their own buffers
+        chunk = self.read(len(buffer))
+        memoryview(buffer)[: len(chunk)] = chunk
+        return len(chunk)
+
+
+@contextlib.contextmanager
+def _open_stream(
+    fileobj: BinaryIO,
+    stats: Optional[TarballStats] = None,
+    backend: Optional[str] = None,
+) -> Iterator[tarfile.TarFile]:
+    """
+    Read the gzipped tar stream `fileobj` with the gzip `backend`, by default the
+    fastest one installed, adding to `stats` once it is closed.
+    """
+    compressed = _TimedReader(fileobj)
+    with open_gzip(compressed, backend) as f:
+        decompressed = _TimedReader(f)
+        start = time.perf_counter()
+        # Decompressing outside of tarfile makes it measurable and lets a faster
+        # backend do it. tarfile slices its whole buffer on every read, so a larger
+        # bufsize than the default makes walking many small members quadratic.
+        with tarfile.open(fileobj=decompressed, mode="r|") as tar:
+            yield tar
+        end = time.perf_counter()
+    if stats is not None:
+        stats.download_seconds += compressed.seconds
+        stats.downloaded_bytes += compressed.bytes
+        # pigz downloads on a thread of its own, so this is only the time spent
+        # waiting for decompression beyond the download
+        stats.decompress_seconds += max(decompressed.seconds - compressed.seconds, 0)
+        stats.decompressed_bytes += decompressed.bytes
+        stats.parse_seconds += end - start - decompressed.seconds
+        stats.members_scanned += len(tar.members)
+
+
+@contextlib.contextmanager
+def open_tarball(
+    url: str, stats: Optional[TarballStats] = None
+) -> Iterator[tarfile.TarFile]:
+    """
+    Stream the gzipped tarball at `url` straight into a `r|gz` tar reader.
+
+    The response body is never buffered as a whole: tarfile reads small blocks
+    from the socket as it walks the members, so download, decompression
+    and member matching overlap and memory use does not depend on archive size.
+    """
+    with get_session().get(url, stream=True, timeout=DEFAULT_TIMEOUT) as response:
+        response.raise_for_status()
+        # Undo any transfer encoding so tarfile sees the same bytes as `.content`
+        response.raw.decode_content = True
+        with _open_stream(response.raw, stats) as tar:
+            yield tar
+
+
+def _iter_parsed(
+    opened: ContextManager[tarfile.TarFile],
+    parse: Callable[[tarfile.TarFile], Iterable[T]],
+    stats: Optional[TarballStats] = None,
+) -> Iterator[T]:
+    """Yield the items `parse` produces from the tar stream `opened`."""
+    paused = 0.0
+    with opened as tar:
+        for item in parse(tar):
+            start = time.perf_counter()
+            yield item
+            paused += time.perf_counter() - start
+    if stats is not None:
+        # Time spent by the consumer of the items isn't spent parsing
+        stats.parse_seconds -= paused
+
+
+def iter_tarball(
+    url: str,
+    parse: Callable[[tarfile.TarFile], Iterable[T]],
+    cache: Optional["ArchiveCache"] = None,
+    result_key: Optional[str] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+) -> Iterator[T]:
+    """
+    Yield the items `parse` produces from the tarball at `url`, as soon as it
+    produces them, so they can be used while the rest of the archive is read.
+
+    With a `cache`, the archive is only downloaded when upstream has changed and
+    the items are stored under `result_key`, so they have to be JSON serializable.
+    Change the key whenever `parse` changes what it yields.
+
+    With a `snapshot`, the archive is read from it instead and `cache` is unused.
+    Reads that actually happen are added to `stats`, so cached items add none.
+    """
+    if snapshot is not None:
+        with snapshot.open(url) as fp:
+            yield from _iter_parsed(_open_stream(fp, stats), parse, stats)
+    elif cache is None:
+        yield from _iter_parsed(open_tarball(url, stats), parse, stats)
+    else:
+        yield from cache.iter(url, parse, result_key, stats)
+
+
+def read_tarball(
+    url: str,
+    parse: Callable[[tarfile.TarFile], T],
+    cache: Optional["ArchiveCache"] = None,
+    result_key: Optional[str] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+) -> T:
+    """Return `parse` applied to the tarball at `url`, read as by `iter_tarball`."""
+    (result,) = iter_tarball(
+        url, lambda tar: [parse(tar)], cache, result_key, snapshot, stats
+    )
+    return result
+
+
+def _write_results(items: Iterable[T], path: Path) -> Iterator[T]:
+    """Yield `items` while writing them to `path` as JSON lines."""
+    with open(path, "w") as f:
+        for item in items:
+            f.write(json.dumps(item) + "\n")
+            yield item
+
+
+class _TeeReader:
+    """Copies everything read from `source` into `sink`, hashing it on the way."""
+
+    def __init__(self, source: BinaryIO, sink: BinaryIO):
+        self._source = source
+        self._sink = sink
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._source.read(size)
+        self._sink.write(chunk)
+        self._hash.update(chunk)
+        return chunk
+
+    def drain(self) -> None:
+        # tarfile stops at the end-of-archive marker, which may leave padding unread
+        while self.read(CHUNK_SIZE):
+            pass
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class ArchiveCache:
+    """
+    Content-addressed, on-disk cache of downloaded tarballs.
+
+    Every URL gets a small index entry holding the ETag and Last-Modified
+    validators of the last download and the sha256 of its content. Archives and
+    the results parsed from them live under `objects/<sha256>/`, so a run against
+    an unchanged upstream costs a single 304 round-trip and no parsing.
+
+    Objects that haven't been used for `max_age`, and the least recently used
+    objects beyond `max_bytes` in total, are removed after every read.
+
+    Reads of the same URL hold a lock on its index entry, so sources sharing the
+    cache, in one run or several, download an upstream once: the others wait and
+    then revalidate what it downloaded.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[timedelta] = None,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def _index_path(self, url: str) -> Path:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / "index" / f"{key}.json"
+
+    @contextlib.contextmanager
+    def _lock(self, url: str) -> Iterator[None]:
+        lock_path = self._index_path(url).with_suffix(".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _object_dir(self, digest: str) -> Path:
+        return self.directory / "objects" / digest
+
+    def _load_entry(self, url: str) -> Optional[Dict[str, Any]]:
+        index_path = self._index_path(url)
+        if not index_path.exists():
+            return None
+
+        entry = json.loads(index_path.read_text())
+        if not (self._object_dir(entry["digest"]) / ARCHIVE_FILENAME).exists():
+            return None
+        return entry
+
+    def _store_entry(self, url: str, response: requests.Response, digest: str) -> None:
+        index_path = self._index_path(url)
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "url": url,
+            "digest": digest,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        index_path.write_text(json.dumps(entry))
+
+    def _result_path(self, digest: str, result_key: str) -> Path:
+        return self._object_dir(digest) / f"{result_key}.jsonl"
+
+    def iter(
+        self,
+        url: str,
+        parse: Callable[[tarfile.TarFile], Iterable[T]],
+        result_key: str,
+        stats: Optional[TarballStats] = None,
+    ) -> Iterator[T]:
+        with self._lock(url):
+            yield from self._iter_locked(url, parse, result_key, stats)
+
+        self.prune()
+
+    def _iter_locked(
+        self,
+        url: str,
+        parse: Callable[[tarfile.TarFile], Iterable[T]],
+        result_key: str,
+        stats: Optional[TarballStats] = None,
+    ) -> Iterator[T]:
+        entry = self._load_entry(url)
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with get_session().get(
+            url, stream=True, headers=headers, timeout=DEFAULT_TIMEOUT
+        ) as response:
+            if entry is not None and response.status_code == 304:
+                logger.info(f"{url} has not changed, using cached {entry['digest']}")
+                yield from self._iter_cached(entry["digest"], parse, result_key, stats)
+            else:
+                response.raise_for_status()
+                digest = yield from self._iter_response(
+                    response, parse, result_key, stats
+                )
+                self._store_entry(url, response, digest)
+
+    def _iter_cached(
+        self,
+        digest: str,
+        parse: Callable[[tarfile.TarFile], Iterable[T]],
+        result_key: str,
+        stats: Optional[TarballStats] = None,
+    ) -> Iterator[T]:
+        archive_path = self._object_dir(digest) / ARCHIVE_FILENAME
+        # The modification time doubles as the last use for eviction
+        archive_path.touch()
+
+        result_path = self._result_path(digest, result_key)
+        if result_path.exists():
+            with open(result_path) as f:
+                for line in f:
+                    yield json.loads(line)
+            return
+
+        # Results are only stored once every item has been parsed
+        tmp_path = result_path.with_name(f"{result_path.name}.tmp")
+        try:
+            with open(archive_path, "rb") as fp:
+                items = _iter_parsed(_open_stream(fp, stats), parse, stats)
+                yield from _write_results(items, tmp_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.replace(tmp_path, result_path)
+
+    def _iter_response(
+        self,
+        response: requests.Response,
+        parse: Callable[[tarfile.TarFile], Iterable[T]],
+        result_key: str,
+        stats: Optional[TarballStats] = None,
+    ) -> Generator[T, None, str]:
+        """Yield the items parsed from `response` and return the archive digest."""
+        objects_dir = self.directory / "objects"
+        objects_dir.mkdir(parents=True, exist_ok=True)
+
+        # Parse while downloading, and keep the archive once it is complete
+        response.raw.decode_content = True
+        with tempfile.NamedTemporaryFile(dir=objects_dir, delete=False) as fp:
+            tmp_path = Path(f"{fp.name}.jsonl")
+            try:
+                reader = _TeeReader(response.raw, fp)
+                items = _iter_parsed(_open_stream(reader, stats), parse, stats)
+                yield from _write_results(items, tmp_path)
+                reader.drain()
+            except BaseException:
+                os.unlink(fp.name)
+                tmp_path.unlink(missing_ok=True)
+                raise
+
+        digest = reader.hexdigest()
+        object_dir = self._object_dir(digest)
+        object_dir.mkdir(exist_ok=True)
+        os.replace(fp.name, object_dir / ARCHIVE_FILENAME)
+        os.replace(tmp_path, self._result_path(digest, result_key))
+        return digest
+
+    def prune(self) -> None:
+        objects_dir = self.directory / "objects"
+        if not objects_dir.exists():
+            return
+
+        objects = []
+        for object_dir in objects_dir.iterdir():
+            archive_path = object_dir / ARCHIVE_FILENAME
+            if not archive_path.exists():
+                continue
+            size = sum(path.stat().st_size for path in object_dir.iterdir())
+            objects.append((archive_path.stat().st_mtime, size, object_dir))
+
+        # Oldest first, so both limits evict the least recently used objects
+        objects.sort()
+        total_size = sum(size for _, size, _ in objects)
+        now = time.time()
+        for last_used, size, object_dir in objects:
+            expired = (
+                self.max_age is not None
+                and now - last_used > self.max_age.total_seconds()
+            )
+            oversized = self.max_bytes is not None and total_size > self.max_bytes
+            if expired or oversized:
+                logger.info(f"Evicting {object_dir.name} from the archive cache")
+                shutil.rmtree(object_dir)
+                total_size -= size
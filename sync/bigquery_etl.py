@@ -1,14 +1,24 @@
-import collections
-import re
+import functools
 from pathlib import Path
-from typing import Dict
-import logging
-import requests
-from io import BytesIO
+import re
 import tarfile
+import time
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Set, Tuple
+import logging
 
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML was built without libyaml
+    from yaml import SafeLoader
+
+from sync.archive import ArchiveCache, TarballStats, iter_tarball
+
+if TYPE_CHECKING:
+    from sync.checkout import GitCheckout
+    from sync.snapshot import Snapshot
+
 FILE_PREFIX = "bigquery-etl-generated-sql/sql"
 QUERY_FILES = {
     "query.sql",
@@ -20,42 +30,176 @@ SUPPORTED_PROJECTS = {
     "moz-fx-data-shared-prod",
     "moz-fx-data-marketing-prod",
 }
-VALID_TABLE_RE = re.compile(
-    rf"{FILE_PREFIX}\/({'|'.join(SUPPORTED_PROJECTS)})\/([a-z0-9_-]+)\/([a-z0-9_-]+)\/({'|'.join(QUERY_FILES)}|{METADATA_FILE})"  # noqa
-)
+TABLE_FILE_PATTERN = rf"({'|'.join(SUPPORTED_PROJECTS)})\/([a-z0-9_-]+)\/([a-z0-9_-]+)\/({'|'.join(QUERY_FILES)}|{METADATA_FILE})"  # noqa
+VALID_TABLE_RE = re.compile(rf"{FILE_PREFIX}\/{TABLE_FILE_PATTERN}")
+# The same files in a checkout of the generated-sql branch
+CHECKOUT_TABLE_RE = re.compile(rf"sql\/{TABLE_FILE_PATTERN}")
 
 REPO_ARCHIVE = "https://github.com/mozilla/bigquery_etl/archive/generated-sql.tar.gz"
 REPO_URL = "https://github.com/mozilla/bigquery-etl/blob/generated-sql/sql"
+REPO_GIT_URL = "https://github.com/mozilla/bigquery-etl.git"
+GENERATED_SQL_BRANCH = "generated-sql"
 WTMO_URL = "https://workflow.telemetry.mozilla.org/dags"
+# Bump when the shape of the parsed table references changes
+RESULT_KEY = "table_references.v2"
 
 logger = logging.getLogger(__name__)
 
 
-def get_bigquery_etl_table_references() -> Dict:
-    table_references = collections.defaultdict(dict)
-    # dictionary shape: {qualified_name: {bigquery_etl_url: ..., wtmo_url: ...}}
+def _parse_dag_name(content: bytes) -> Optional[str]:
+    """Return `scheduling.dag_name` from the contents of a metadata.yaml file."""
+    # Most tables aren't scheduled, so skip the full parse when the key can't be there
+    if b"dag_name" not in content:
+        return None
+
+    metadata = yaml.load(content, Loader=SafeLoader) or {}
+    scheduling = metadata.get("scheduling") or {}
+    return scheduling.get("dag_name")
+
+
+def _iter_table_references(
+    tar: tarfile.TarFile, stats: Optional[TarballStats] = None
+) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+    Yield the qualified name and references of every table with any, as soon as
+    the archive moves past its directory. Git archives write the files of a
+    directory together; an archive that returns to a directory it moved past
+    raises, rather than yielding the table twice with part of its references.
+    """
+    # references shape: {bigquery_etl_url: ..., wtmo_url: ...}
+    qualified_name, references = None, {}
+    # The tables of the directories the archive moved past
+    read: Set[str] = set()
+
+    parsed_files, parse_seconds = 0, 0.0
+
+    for member in tar:
+        match = VALID_TABLE_RE.match(member.name)
+        if match is None:
+            continue
+        if stats is not None:
+            stats.members_matched += 1
+
+        project, dataset, table, filename = match.groups()
+        if f"{project}.{dataset}.{table}" != qualified_name:
+            if references:
+                yield qualified_name, references
+            read.add(qualified_name)
+            qualified_name, references = f"{project}.{dataset}.{table}", {}
+            if qualified_name in read:
+                raise tarfile.TarError(
+                    f"{member.name} isn't with the other files of its directory"
+                )
 
+        if filename == METADATA_FILE:
+            start = time.perf_counter()
+            dag_name = _parse_dag_name(tar.extractfile(member).read())
+            elapsed = time.perf_counter() - start
+            logger.debug(f"Parsed {member.name} in {elapsed * 1000:.2f}ms")
+            parsed_files += 1
+            parse_seconds += elapsed
+
+            if dag_name is not None:
+                references["wtmo_url"] = f"{WTMO_URL}/{dag_name}/grid"
+
+        elif filename in QUERY_FILES:
+            bigquery_etl_url = f"{REPO_URL}/{project}/{dataset}/{table}/{filename}"
+            references["bigquery_etl_url"] = bigquery_etl_url
+
+    if references:
+        yield qualified_name, references
+
+    logger.info(
+        f"Parsed {parsed_files} metadata files in {parse_seconds:.2f}s "
+        f"({SafeLoader.__name__})"
+    )
+
+
+def iter_bigquery_etl_table_references(
+    cache: Optional[ArchiveCache] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+) -> Iterator[Tuple[str, Dict[str, str]]]:
     logger.info("Fetching metadata from GitHub...")
+    for qualified_name, references in iter_tarball(
+        REPO_ARCHIVE,
+        functools.partial(_iter_table_references, stats=stats),
+        cache=cache,
+        result_key=RESULT_KEY,
+        snapshot=snapshot,
+        stats=stats,
+    ):
+        yield qualified_name, references
+
+
+def get_bigquery_etl_table_references(
+    cache: Optional[ArchiveCache] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+) -> Dict:
+    return dict(iter_bigquery_etl_table_references(cache, snapshot, stats))
+
+
+def _read_checkout_table(table_dir: Path) -> Dict[str, str]:
+    """Return the references of the table in `table_dir` of a checkout."""
+    project, dataset, table = table_dir.parts[-3:]
+    references = {}
+    # In the order of the tarball, so the same query file wins
+    for filename in sorted(QUERY_FILES | {METADATA_FILE}):
+        path = table_dir / filename
+        if not path.is_file():
+            continue
+
+        if filename == METADATA_FILE:
+            dag_name = _parse_dag_name(path.read_bytes())
+            if dag_name is not None:
+                references["wtmo_url"] = f"{WTMO_URL}/{dag_name}/grid"
+        else:
+            bigquery_etl_url = f"{REPO_URL}/{project}/{dataset}/{table}/{filename}"
+            references["bigquery_etl_url"] = bigquery_etl_url
+    return references
+
+
+def iter_changed_table_references(
+    checkout: "GitCheckout",
+) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+    Yield the qualified name and references of the tables whose files changed in
+    `checkout` since its synced commit, read from its working tree.
 
-    repo_content = BytesIO(requests.get(REPO_ARCHIVE).content)
-    with tarfile.open(fileobj=repo_content, mode="r|gz") as tar:
-        for member in tar:
-            match = VALID_TABLE_RE.match(member.name)
-            if match is None:
-                continue
+    Tables left without references, e.g. because they were deleted, come with
+    empty references so their links can be removed. Without a synced commit
+    every table is read, and only those with references are yielded.
+    """
+    since = checkout.synced_commit()
+    if since is None:
+        logger.info(f"Reading all tables of {checkout.directory}")
+        paths = [
+            path.relative_to(checkout.directory).as_posix()
+            for path in sorted((checkout.directory / "sql").glob("*/*/*/*"))
+        ]
+    else:
+        changed = checkout.changed_paths(since, checkout.head())
+        logger.info(f"{len(changed)} files changed since {since}")
+        paths = [path for _, path in changed]
 
-            project, dataset, table, filename = match.groups()
-            qualified_name = f"{project}.{dataset}.{table}"
+    read = set()
+    for path in paths:
+        match = CHECKOUT_TABLE_RE.match(path)
+        if match is None:
+            continue
+        project, dataset, table, _ = match.groups()
+        qualified_name = f"{project}.{dataset}.{table}"
+        if qualified_name in read:
+            continue
 
-            if filename == METADATA_FILE:
-                tar.extract(member)
-                metadata = yaml.safe_load(Path(member.name).read_text())
-                if "scheduling" in metadata and "dag_name" in metadata["scheduling"]:
-                    wtmo_url = f"{WTMO_URL}/{metadata['scheduling']['dag_name']}/grid"
-                    table_references[qualified_name]["wtmo_url"] = wtmo_url
+        read.add(qualified_name)
+        table_dir = checkout.directory / "sql" / project / dataset / table
+        references = _read_checkout_table(table_dir)
+        if references or since is not None:
+            yield qualified_name, references
 
-            elif filename in QUERY_FILES:
-                bigquery_etl_url = f"{REPO_URL}/{project}/{dataset}/{table}/{filename}"
-                table_references[qualified_name]["bigquery_etl_url"] = bigquery_etl_url
 
-    return table_references
+def get_changed_table_references(checkout: "GitCheckout") -> Dict:
+    """Return the references `iter_changed_table_references` yields, by table."""
+    return dict(iter_changed_table_references(checkout))
@@ -0,0 +1,192 @@
+"""
+Local index of the BigQuery tables that upstreams define, shared by the sources.
+
+The tables of an upstream are read into a SQLite file by the first source that
+needs them, and only read again once they are older than `max_age`, so the
+sources of a run share a single read. Every later check is an indexed lookup.
+"""
+
+from dataclasses import dataclass
+from datetime import timedelta
+import logging
+import re
+import sqlite3
+import time
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Tuple
+
+from sync.archive import ArchiveCache, TarballStats
+from sync.legacy import iter_ping_tables
+
+if TYPE_CHECKING:
+    from sync.snapshot import Snapshot
+
+# The live and stable tables of every ping, from the generated schemas
+PING_TABLES = "ping_tables"
+DEFAULT_MAX_AGE = timedelta(hours=1)
+# Long enough for a source to wait while another reads the same upstream
+BUSY_TIMEOUT_SECONDS = 600
+# Bump when the tables below change, so older catalogs are rebuilt
+CATALOG_VERSION = 2
+# Versioned tables, e.g. the `baseline_v2` table of the `baseline` ping
+VERSIONED_TABLE_RE = re.compile(r"(?P<base_name>.+)_v(?P<version>[0-9]+)")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CatalogStats:
+    # Whether this source read the upstream, or found it read by an earlier one
+    refreshed: bool = False
+    tables: int = 0
+
+
+def _split_table(qualified_name: str) -> Tuple[str, str, Optional[int]]:
+    """Return the qualified dataset, base name and version of a table."""
+    dataset, _, table = qualified_name.rpartition(".")
+    match = VERSIONED_TABLE_RE.fullmatch(table)
+    if match is None:
+        return dataset, table, None
+    return dataset, match["base_name"], int(match["version"])
+
+
+class Catalog:
+    """
+    SQLite file holding the tables of every upstream, by qualified name and by
+    qualified dataset and base name, so every version of a table is one lookup.
+    """
+
+    def __init__(self, path: str, max_age: timedelta = DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        # Transactions are explicit, so a refresh holds the write lock throughout
+        self._connection = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None
+        )
+        if self._version() != CATALOG_VERSION:
+            self._rebuild()
+
+    def _version(self) -> int:
+        (version,) = self._connection.execute("PRAGMA user_version").fetchone()
+        return version
+
+    def _rebuild(self) -> None:
+        self._connection.execute("BEGIN IMMEDIATE")
+        # Another source may have rebuilt it while this one waited for the lock
+        if self._version() != CATALOG_VERSION:
+            for statement in (
+                "DROP TABLE IF EXISTS tables",
+                "DROP TABLE IF EXISTS upstreams",
+                """
+                CREATE TABLE tables (
+                    qualified_name TEXT PRIMARY KEY,
+                    upstream TEXT NOT NULL,
+                    dataset TEXT NOT NULL,
+                    base_name TEXT NOT NULL,
+                    version INTEGER
+                )
+                """,
+                "CREATE INDEX tables_upstream ON tables (upstream)",
+                "CREATE INDEX tables_base_name ON tables (dataset, base_name)",
+                """
+                CREATE TABLE upstreams (
+                    name TEXT PRIMARY KEY,
+                    refreshed_at REAL NOT NULL
+                )
+                """,
+                f"PRAGMA user_version = {CATALOG_VERSION}",
+            ):
+                self._connection.execute(statement)
+        self._connection.execute("COMMIT")
+
+    def refresh(
+        self, upstream: str, fetch: Callable[[], Iterable[str]], force: bool = False
+    ) -> bool:
+        """
+        Replace the tables of `upstream` with those `fetch` returns, unless they
+        were read less than `max_age` ago, and return whether it was called.
+
+        The write lock is taken before checking, so a source refreshing the same
+        upstream meanwhile waits for this one and then finds it fresh.
+
+        With `force`, as when reading a snapshot, `fetch` is always called and its
+        tables are left stale, so later refreshes never reuse them.
+        """
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._connection.execute(
+                "SELECT refreshed_at FROM upstreams WHERE name = ?", (upstream,)
+            ).fetchone()
+            if (
+                not force
+                and row is not None
+                and time.time() - row[0] < self.max_age.total_seconds()
+            ):
+                self._connection.execute("COMMIT")
+                return False
+
+            self._connection.execute(
+                "DELETE FROM tables WHERE upstream = ?", (upstream,)
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO tables VALUES (?, ?, ?, ?, ?)",
+                (
+                    (qualified_name, upstream, *_split_table(qualified_name))
+                    for qualified_name in fetch()
+                ),
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO upstreams VALUES (?, ?)",
+                (upstream, 0.0 if force else time.time()),
+            )
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        logger.info(f"Read {self.count(upstream)} tables of {upstream} into catalog")
+        return True
+
+    def has_table(self, qualified_name: str) -> bool:
+        return (
+            self._connection.execute(
+                "SELECT 1 FROM tables WHERE qualified_name = ?", (qualified_name,)
+            ).fetchone()
+            is not None
+        )
+
+    def table_versions(self, dataset: str, base_name: str) -> List[int]:
+        """
+        Return the versions of the `<base_name>_v<version>` tables in `dataset`,
+        given as `<project>.<dataset>`, in order.
+        """
+        rows = self._connection.execute(
+            "SELECT version FROM tables "
+            "WHERE dataset = ? AND base_name = ? AND version IS NOT NULL "
+            "ORDER BY version",
+            (dataset, base_name),
+        ).fetchall()
+        return [version for (version,) in rows]
+
+    def count(self, upstream: str) -> int:
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM tables WHERE upstream = ?", (upstream,)
+        ).fetchone()
+        return count
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def refresh_ping_tables(
+    catalog: Catalog,
+    cache: Optional[ArchiveCache] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+) -> bool:
+    """
+    Read the ping tables into `catalog` unless they are fresh, see `refresh`.
+    Those of a snapshot are always read, so replaying it gives the same lineage.
+    """
+    return catalog.refresh(
+        PING_TABLES,
+        lambda: iter_ping_tables(cache, snapshot, stats),
+        force=snapshot is not None,
+    )
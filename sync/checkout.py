@@ -0,0 +1,90 @@
+"""A persistent git clone that remembers which of its commits were synced."""
+
+import logging
+from pathlib import Path
+import subprocess
+from typing import List, Optional, Tuple
+
+# Keeps the last synced commit, and with it its tree, in the clone
+SYNCED_REF = "refs/sync/synced"
+
+logger = logging.getLogger(__name__)
+
+
+class GitCheckout:
+    """
+    Shallow clone of one branch of a git repository in `directory`, kept across
+    runs and brought up to date with `update`.
+
+    The last commit a run has processed is recorded with `mark_synced`, so the
+    next run only needs the files changed since. Diffs compare trees rather than
+    walking history, so they work in a shallow clone and across force pushes.
+    """
+
+    def __init__(self, directory: str, repo_url: str, branch: str):
+        self.directory = Path(directory)
+        self.repo_url = repo_url
+        self.branch = branch
+
+    def _git(self, *args: str) -> str:
+        return subprocess.run(
+            ["git", "-C", str(self.directory), *args],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    def update(self) -> str:
+        """Check out the latest commit of the branch and return it."""
+        if not (self.directory / ".git").exists():
+            logger.info(f"Cloning {self.branch} of {self.repo_url}")
+            self.directory.parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run(
+                [
+                    "git",
+                    "clone",
+                    "--quiet",
+                    "--depth=1",
+                    "--single-branch",
+                    "--no-tags",
+                    f"--branch={self.branch}",
+                    self.repo_url,
+                    str(self.directory),
+                ],
+                check=True,
+                capture_output=True,
+            )
+        else:
+            self._git(
+                "fetch", "--quiet", "--depth=1", "--no-tags", "origin", self.branch
+            )
+            self._git("reset", "--quiet", "--hard", "FETCH_HEAD")
+        return self.head()
+
+    def head(self) -> str:
+        return self._git("rev-parse", "HEAD").strip()
+
+    def synced_commit(self) -> Optional[str]:
+        """Return the commit last passed to `mark_synced`, if any."""
+        result = subprocess.run(
+            ["git", "-C", str(self.directory), "rev-parse", "--verify", "--quiet"]
+            + [f"{SYNCED_REF}^{{commit}}"],
+            capture_output=True,
+            text=True,
+        )
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    def mark_synced(self, commit: str) -> None:
+        self._git("update-ref", SYNCED_REF, commit)
+
+    def changed_paths(self, since: str, until: str) -> List[Tuple[str, str]]:
+        """
+        Return the status letter and path of every file that differs between the
+        trees of `since` and `until`. Renames are reported as a deletion and an
+        addition.
+        """
+        output = self._git(
+            "diff", "--name-status", "--no-renames", "-z", since, until, "--"
+        )
+        fields = output.split("\0")[:-1]
+        return list(zip(fields[0::2], fields[1::2]))
@@ -0,0 +1,289 @@
+"""
+Sink that sends metadata change proposals to GMS in batches, slowing down when
+GMS pushes back.
+
+Proposals are grouped into `ingestProposalBatch` requests of up to
+`max_batch_size` proposals, of which up to `max_in_flight` are sent at once.
+A 429 or 503 response, or a failed connection, halves the number of batches
+allowed in flight and pauses every request for the `Retry-After` of the
+response, or else an exponential backoff, before the batch is retried. Each
+batch accepted after that allows one more batch in flight for every batch
+currently allowed, up to `max_in_flight` again.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import requests
+
+from datahub.configuration.common import ConfigModel
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
+from datahub.emitter.mcp_builder import mcps_from_mce
+from datahub.emitter.rest_emitter import ensure_has_system_metadata
+from datahub.emitter.serialization_helper import pre_json_transform
+from datahub.ingestion.api.common import RecordEnvelope
+from datahub.ingestion.api.sink import Sink, SinkReport, WriteCallback
+from datahub.ingestion.graph.client import DataHubGraph
+from datahub.ingestion.graph.config import DatahubClientConfig
+from datahub.metadata.schema_classes import (
+    MetadataChangeEventClass,
+    MetadataChangeProposalClass,
+)
+
+from sync.session import build_session
+
+BATCH_PATH = "/aspects?action=ingestProposalBatch"
+# Responses asking for fewer requests
+THROTTLE_STATUSES = (429, 503)
+
+logger = logging.getLogger(__name__)
+
+Proposal = Union[MetadataChangeProposalWrapper, MetadataChangeProposalClass]
+
+
+class BatchRestSinkConfig(ConfigModel):
+    server: str
+    token: Optional[str] = None
+    timeout_sec: float = 30
+    # Proposals per request, and their size when serialized
+    max_batch_size: int = 100
+    max_batch_bytes: int = 5 * 1024 * 1024
+    # Requests sent at once when GMS doesn't push back
+    max_in_flight: int = 8
+    # Retries of a throttled batch, and the first pause when GMS doesn't give one,
+    # doubled on every retry
+    max_retries: int = 6
+    backoff_sec: float = 1.0
+    # Let GMS accept proposals before they are written, as datahub-rest does
+    async_ingest: bool = True
+
+
+@dataclass
+class BatchRestSinkReport(SinkReport):
+    batches_sent: int = 0
+    batches_failed: int = 0
+    # 429 and 503 responses and failed connections, each retried after a pause
+    batches_throttled: int = 0
+    # Batches allowed in flight at the end of the run
+    in_flight_limit: int = 0
+    # Of every request that got a response, including retries
+    batch_latency_seconds: Dict[str, float] = field(default_factory=dict)
+    _latencies: List[float] = field(default_factory=list, repr=False)
+
+    def report_batch_latency(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def compute_stats(self) -> None:
+        super().compute_stats()
+        if self._latencies:
+            latencies = sorted(self._latencies)
+            self.batch_latency_seconds = {
+                "p50": round(latencies[(len(latencies) - 1) // 2], 4),
+                "p95": round(latencies[int((len(latencies) - 1) * 0.95)], 4),
+                "max": round(latencies[-1], 4),
+            }
+
+
+class _Throttle:
+    """Additive increase, multiplicative decrease limit on the batches in flight."""
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.limit = max_in_flight
+        self._in_flight = 0
+        self._accepted = 0
+        self._resume_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def wait(self) -> None:
+        """Wait for the pause of the last throttled batch to end."""
+        while (delay := self._resume_at - time.monotonic()) > 0:
+            time.sleep(delay)
+
+    def accepted(self) -> None:
+        with self._condition:
+            self._accepted += 1
+            if self._accepted >= self.limit and self.limit < self.max_in_flight:
+                self.limit += 1
+                self._accepted = 0
+                self._condition.notify_all()
+
+    def throttled(self, pause: float) -> None:
+        with self._condition:
+            now = time.monotonic()
+            # Batches throttled during the same pause were sent at the same limit
+            if now >= self._resume_at:
+                self.limit = max(self.limit // 2, 1)
+                self._accepted = 0
+            self._resume_at = max(self._resume_at, now + pause)
+
+
+def _retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    if response is None:
+        return None
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class BatchRestSink(Sink[BatchRestSinkConfig, BatchRestSinkReport]):
+    def __post_init__(self) -> None:
+        self._url = f"{self.config.server.rstrip('/')}{BATCH_PATH}"
+        self._session = build_session(pool_size=self.config.max_in_flight)
+        self._session.headers.update(
+            {
+                "X-RestLi-Protocol-Version": "2.0.0",
+                "Content-Type": "application/json",
+            }
+        )
+        if self.config.token:
+            self._session.headers["Authorization"] = f"Bearer {self.config.token}"
+
+        self._throttle = _Throttle(self.config.max_in_flight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.max_in_flight, thread_name_prefix="batch_sink"
+        )
+        self._lock = threading.Lock()
+        # Every record of the next batch, with its callback and serialized proposals
+        self._batch: List[Tuple[RecordEnvelope, WriteCallback, List[str]]] = []
+        self._batch_size = 0
+        self._batch_bytes = 0
+
+    def to_graph(self) -> DataHubGraph:
+        return DataHubGraph(
+            DatahubClientConfig(server=self.config.server, token=self.config.token)
+        )
+
+    def _serialize(self, record) -> List[str]:
+        if isinstance(record, MetadataChangeEventClass):
+            proposals: List[Proposal] = list(mcps_from_mce(record))
+        elif isinstance(
+            record, (MetadataChangeProposalWrapper, MetadataChangeProposalClass)
+        ):
+            proposals = [record]
+        else:
+            raise ValueError(f"Can't send {type(record).__name__} in a batch")
+
+        serialized = []
+        for proposal in proposals:
+            ensure_has_system_metadata(proposal)
+            serialized.append(json.dumps(pre_json_transform(proposal.to_obj())))
+        return serialized
+
+    def write_record_async(
+        self, record_envelope: RecordEnvelope, write_callback: WriteCallback
+    ) -> None:
+        try:
+            proposals = self._serialize(record_envelope.record)
+        except Exception as e:
+            self._fail([(record_envelope, write_callback, [])], e)
+            return
+
+        size, size_bytes = len(proposals), sum(len(p) for p in proposals)
+        if self._batch and (
+            self._batch_size + size > self.config.max_batch_size
+            or self._batch_bytes + size_bytes > self.config.max_batch_bytes
+        ):
+            self.flush()
+        self._batch.append((record_envelope, write_callback, proposals))
+        self._batch_size += size
+        self._batch_bytes += size_bytes
+
+    def flush(self) -> None:
+        """Send the records written since the last batch, waiting for a free slot."""
+        if not self._batch:
+            return
+
+        batch, self._batch = self._batch, []
+        self._batch_size = self._batch_bytes = 0
+        # Blocking here holds back whatever is writing records
+        self._throttle.acquire()
+        self._executor.submit(self._send, batch)
+
+    def _send(self, batch: List[Tuple[RecordEnvelope, WriteCallback, List[str]]]):
+        try:
+            payload = (
+                '{"proposals": ['
+                + ",".join(p for _, _, proposals in batch for p in proposals)
+                + f'], "async": "{str(self.config.async_ingest).lower()}"}}'
+            )
+            self._post(payload)
+        except Exception as e:
+            with self._lock:
+                self.report.batches_failed += 1
+            self._fail(batch, e)
+        else:
+            with self._lock:
+                self.report.batches_sent += 1
+                for record_envelope, _, _ in batch:
+                    self.report.report_record_written(record_envelope)
+            for record_envelope, write_callback, _ in batch:
+                write_callback.on_success(record_envelope, {})
+        finally:
+            self._throttle.release()
+
+    def _post(self, payload: str) -> None:
+        for attempt in range(self.config.max_retries + 1):
+            self._throttle.wait()
+            response = None
+            start = time.perf_counter()
+            try:
+                response = self._session.post(
+                    self._url, data=payload, timeout=self.config.timeout_sec
+                )
+            except requests.ConnectionError as e:
+                error: Exception = e
+            else:
+                with self._lock:
+                    self.report.report_batch_latency(time.perf_counter() - start)
+                if response.status_code not in THROTTLE_STATUSES:
+                    response.raise_for_status()
+                    self._throttle.accepted()
+                    return
+                error = requests.HTTPError(
+                    f"{response.status_code} from {self._url}", response=response
+                )
+
+            if attempt == self.config.max_retries:
+                raise error
+            pause = _retry_after(response)
+            if pause is None:
+                pause = self.config.backoff_sec * 2**attempt
+            logger.info(f"GMS is throttling ({error}), pausing for {pause:.1f}s")
+            with self._lock:
+                self.report.batches_throttled += 1
+            self._throttle.throttled(pause)
+
+    def _fail(
+        self,
+        batch: List[Tuple[RecordEnvelope, WriteCallback, List[str]]],
+        error: Exception,
+    ) -> None:
+        with self._lock:
+            self.report.report_failure({"error": str(error), "records": len(batch)})
+        for record_envelope, write_callback, _ in batch:
+            write_callback.on_failure(record_envelope, error, {})
+
+    def close(self) -> None:
+        super().close()
+        self.flush()
+        self._executor.shutdown(wait=True)
+        self._session.close()
+        self.report.in_flight_limit = self._throttle.limit
@@ -1,7 +1,14 @@
-from typing import Iterable
+from dataclasses import dataclass, field
+import functools
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+from datahub.ingestion.api.committable import Committable, CommitPolicy
 from datahub.ingestion.api.common import PipelineContext
-from datahub.ingestion.api.source import Source, SourceReport
+from datahub.ingestion.api.source import (
+    MetadataWorkUnitProcessor,
+    Source,
+    SourceReport,
+)
 from datahub.ingestion.api.workunit import MetadataWorkUnit
 from datahub.emitter.mcp import MetadataChangeProposalWrapper, ChangeTypeClass
 import datahub.emitter.mce_builder as builder
@@ -9,21 +16,66 @@ from datahub.metadata.schema_classes import (
     InstitutionalMemoryClass,
     InstitutionalMemoryMetadataClass,
 )
-from datahub.configuration.common import ConfigModel
 
-from sync.bigquery_etl import get_bigquery_etl_table_references
+from sync.archive import TarballStats
+from sync.bigquery_etl import (
+    iter_bigquery_etl_table_references,
+    iter_changed_table_references,
+)
+from sync.checkout import GitCheckout
+from sync.datahub.config import (
+    ArchiveCacheConfig,
+    GitCheckoutConfig,
+    StreamingSourceConfig,
+)
+from sync.datahub.fingerprint import AspectFingerprintReport
+from sync.datahub.stats import StageMetricsMixin, StageReport, report_stages
 from sync.datahub.utils import get_current_timestamp
+from sync.prefetch import prefetch
+from sync.snapshot import Snapshot
+
+
+class BigQueryEtlSourceConfig(StreamingSourceConfig):
+    archive_cache: Optional[ArchiveCacheConfig] = None
+    # Only sync the tables changed since the last run, read from a clone of the
+    # generated-sql branch. Takes precedence over the tarball options above.
+    git_checkout: Optional[GitCheckoutConfig] = None
+
+
+@dataclass
+class BigQueryEtlSourceReport(SourceReport):
+    aspect_fingerprints: AspectFingerprintReport = field(
+        default_factory=AspectFingerprintReport
+    )
+    stages: StageReport = field(default_factory=StageReport)
+    tarball: TarballStats = field(default_factory=TarballStats)
+    synced_commit: Optional[str] = None
+
 
+class SyncedCommitCommittable(Committable):
+    """Moves the synced ref of a checkout once the run's work units are written."""
 
-class BigQueryEtlSourceConfig(ConfigModel):
-    env: str = "PROD"
+    def __init__(
+        self, checkout: GitCheckout, commit: str, report: BigQueryEtlSourceReport
+    ):
+        super().__init__(name="synced_commit", commit_policy=CommitPolicy.ON_NO_ERRORS)
+        self.checkout = checkout
+        self.synced_commit = commit
+        self.report = report
 
+    def commit(self) -> None:
+        self.checkout.mark_synced(self.synced_commit)
+        self.report.synced_commit = self.synced_commit
+
+
+class BigQueryEtlSource(StageMetricsMixin, Source):
+    metrics_source = "bigquery_etl"
+    metrics_upstream = ("tarball",)
 
-class BigQueryEtlSource(Source):
     def __init__(self, config: BigQueryEtlSourceConfig, ctx: PipelineContext):
         super().__init__(ctx)
         self.config = config
-        self.report = SourceReport()
+        self.report = BigQueryEtlSourceReport()
         self.platform = "bigquery"
 
     @classmethod
@@ -31,8 +83,38 @@ class BigQueryEtlSource(Source):
         config = BigQueryEtlSourceConfig.parse_obj(config_dict)
         return cls(config, ctx)
 
+    def get_workunit_processors(self) -> List[Optional[MetadataWorkUnitProcessor]]:
+        return [
+            functools.partial(report_stages, report=self.report.stages),
+            *super().get_workunit_processors(),
+            (
+                self.config.aspect_fingerprints.build_processor(
+                    self.report.aspect_fingerprints, self.ctx
+                )
+                if self.config.aspect_fingerprints
+                else None
+            ),
+        ]
+
+    def _fetch_table_references(self) -> Iterator[Tuple[str, Dict[str, str]]]:
+        cache = self.config.archive_cache.build() if self.config.archive_cache else None
+        snapshot = (
+            Snapshot(self.config.snapshot_dir) if self.config.snapshot_dir else None
+        )
+        return iter_bigquery_etl_table_references(cache, snapshot, self.report.tarball)
+
     def get_workunits_internal(self) -> Iterable[MetadataWorkUnit]:
-        for qualified_table_name, urls in get_bigquery_etl_table_references().items():
+        checkout, head = None, None
+        if self.config.git_checkout:
+            checkout = self.config.git_checkout.build()
+            with self.report.stages.time_fetch():
+                head = checkout.update()
+            table_references = iter_changed_table_references(checkout)
+        else:
+            table_references = self._fetch_table_references()
+        for qualified_table_name, urls in self.report.stages.time_fetches(
+            prefetch(table_references, self.config.prefetch_items)
+        ):
 
             bigquery_qualified_urn = builder.make_dataset_urn(
                 platform=self.platform,
@@ -59,9 +141,8 @@ class BigQueryEtlSource(Source):
                     )
                 )
 
-            if not link_elements:
-                continue
-
+            # Tables left without links, which only a checkout reports, still get
+            # the aspect so the links of earlier runs are removed
             mcp = MetadataChangeProposalWrapper(
                 changeType=ChangeTypeClass.UPSERT,  # Should be UPDATE but it isn't supported
                 entityUrn=bigquery_qualified_urn,
@@ -71,5 +152,12 @@ class BigQueryEtlSource(Source):
             wu = mcp.as_workunit()
             yield wu
 
-    def get_report(self) -> SourceReport:
+        # The next run starts from here, once the sink has written this one, as
+        # stateful ingestion checkpoints are committed
+        if checkout is not None:
+            self.ctx.register_checkpointer(
+                SyncedCommitCommittable(checkout, head, self.report)
+            )
+
+    def get_report(self) -> BigQueryEtlSourceReport:
         return self.report
@@ -0,0 +1,91 @@
+from datetime import timedelta
+import functools
+from pathlib import Path
+from typing import Optional
+
+from datahub.configuration.common import ConfigModel
+from datahub.ingestion.api.common import PipelineContext
+from datahub.ingestion.api.source import MetadataWorkUnitProcessor
+
+from sync.archive import ArchiveCache
+from sync.bigquery_etl import GENERATED_SQL_BRANCH, REPO_GIT_URL
+from sync.catalog import Catalog
+from sync.checkout import GitCheckout
+from sync.datahub.fingerprint import (
+    AspectFingerprintReport,
+    AspectFingerprintStore,
+    skip_unchanged_aspects,
+)
+from sync.prefetch import DEFAULT_MAX_ITEMS
+
+
+def _days(days: Optional[int]) -> Optional[timedelta]:
+    return timedelta(days=days) if days is not None else None
+
+
+class ArchiveCacheConfig(ConfigModel):
+    directory: str
+    max_size_mb: Optional[int] = 2048
+    max_age_days: Optional[int] = 7
+
+    def build(self) -> ArchiveCache:
+        return ArchiveCache(
+            self.directory,
+            max_bytes=(
+                self.max_size_mb * 1024 * 1024 if self.max_size_mb is not None else None
+            ),
+            max_age=_days(self.max_age_days),
+        )
+
+
+class GitCheckoutConfig(ConfigModel):
+    directory: str
+    repo_url: str = REPO_GIT_URL
+    branch: str = GENERATED_SQL_BRANCH
+
+    def build(self) -> GitCheckout:
+        return GitCheckout(self.directory, self.repo_url, self.branch)
+
+
+class CatalogConfig(ConfigModel):
+    path: str
+    # Upstreams are read again once the catalog has them for longer than this
+    max_age_minutes: int = 60
+
+    def build(self) -> Catalog:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        return Catalog(self.path, max_age=timedelta(minutes=self.max_age_minutes))
+
+
+class AspectFingerprintConfig(ConfigModel):
+    path: str
+    # Re-emit unchanged aspects after this long, in case a write was lost
+    max_age_days: Optional[int] = 7
+
+    def build_processor(
+        self, report: AspectFingerprintReport, ctx: PipelineContext
+    ) -> MetadataWorkUnitProcessor:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        return functools.partial(
+            skip_unchanged_aspects,
+            store=AspectFingerprintStore(self.path),
+            report=report,
+            max_age=_days(self.max_age_days),
+            ctx=ctx,
+        )
+
+
+class SyncSourceConfig(ConfigModel):
+    """Options shared by the sources of this package."""
+
+    env: str = "PROD"
+    # Read upstream from a snapshot captured with `python -m sync.snapshot`
+    snapshot_dir: Optional[str] = None
+    aspect_fingerprints: Optional[AspectFingerprintConfig] = None
+    # Write the stage metrics of every run here, for node_exporter's textfile collector
+    prometheus_textfile: Optional[str] = None
+
+
+class StreamingSourceConfig(SyncSourceConfig):
+    # How many upstream items can be fetched ahead of the work units built from them
+    prefetch_items: int = DEFAULT_MAX_ITEMS
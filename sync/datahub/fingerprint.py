@@ -0,0 +1,172 @@
+"""Drops metadata change proposals that are identical to those of the previous run."""
+
+from dataclasses import dataclass
+from datetime import timedelta
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
+from datahub.ingestion.api.committable import Committable, CommitPolicy
+from datahub.ingestion.api.common import PipelineContext
+from datahub.ingestion.api.report import Report
+from datahub.ingestion.api.workunit import MetadataWorkUnit
+from datahub.metadata.schema_classes import ChangeTypeClass
+
+# Audit stamps are regenerated on every run without the aspect itself changing.
+VOLATILE_KEYS = {"auditStamp", "created", "createStamp", "lastModified"}
+
+
+@dataclass
+class AspectFingerprintReport(Report):
+    """
+    Work units sent on to the sink, and those dropped as unchanged. The source's
+    `events_produced` counts work units before they are dropped, since stale
+    entity removal has to see every entity, so `emitted` is what reaches GMS.
+    """
+
+    emitted: int = 0
+    skipped: int = 0
+    skipped_ratio: float = 0.0
+
+    def record(self, skipped: bool) -> None:
+        if skipped:
+            self.skipped += 1
+        else:
+            self.emitted += 1
+        self.skipped_ratio = round(self.skipped / (self.emitted + self.skipped), 4)
+
+
+class AspectFingerprintStore:
+    """SQLite file holding the fingerprint of the last emitted value of each aspect."""
+
+    def __init__(self, path: str):
+        # Committed by the pipeline once the sink is done, after the source's thread
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS aspect_fingerprints (
+                urn TEXT NOT NULL,
+                aspect TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (urn, aspect)
+            )
+            """
+        )
+        # Fingerprints of this run, only written when they are committed, so the
+        # file is never locked for longer than that
+        self._pending: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+    def is_unchanged(
+        self, urn: str, aspect: str, fingerprint: str, max_age: Optional[timedelta]
+    ) -> bool:
+        row = (
+            self._pending.get((urn, aspect))
+            or self._connection.execute(
+                "SELECT fingerprint, updated_at FROM aspect_fingerprints "
+                "WHERE urn = ? AND aspect = ?",
+                (urn, aspect),
+            ).fetchone()
+        )
+        if row is None or row[0] != fingerprint:
+            return False
+        return max_age is None or time.time() - row[1] <= max_age.total_seconds()
+
+    def put(self, urn: str, aspect: str, fingerprint: str) -> None:
+        self._pending[urn, aspect] = (fingerprint, time.time())
+
+    def commit(self) -> None:
+        """Persist the fingerprints put since the store was opened, and close it."""
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO aspect_fingerprints VALUES (?, ?, ?, ?)",
+                (key + value for key, value in self._pending.items()),
+            )
+        self._connection.close()
+
+    def close(self) -> None:
+        """Close the store, discarding the fingerprints that weren't committed."""
+        self._connection.close()
+
+
+class AspectFingerprintCommittable(Committable):
+    """Commits the fingerprints of a run once its work units have been written."""
+
+    def __init__(self, store: AspectFingerprintStore):
+        super().__init__(
+            name="aspect_fingerprints", commit_policy=CommitPolicy.ON_NO_ERRORS
+        )
+        self.store = store
+
+    def commit(self) -> None:
+        self.store.commit()
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: _normalize(item)
+            for key, item in value.items()
+            if key not in VOLATILE_KEYS
+        }
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def aspect_fingerprint(mcp: MetadataChangeProposalWrapper) -> str:
+    normalized = json.dumps(_normalize(mcp.aspect.to_obj()), sort_keys=True)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def skip_unchanged_aspects(
+    stream: Iterable[MetadataWorkUnit],
+    store: AspectFingerprintStore,
+    report: AspectFingerprintReport,
+    max_age: Optional[timedelta] = None,
+    ctx: Optional[PipelineContext] = None,
+) -> Iterable[MetadataWorkUnit]:
+    """
+    Work unit processor that drops UPSERTs whose aspect hasn't changed since it was
+    last emitted, ignoring audit stamps.
+
+    Fingerprints are discarded if the stream isn't exhausted. Otherwise they are
+    registered with `ctx` to be committed with the checkpoints, once the sink has
+    written the run without errors, or persisted right away without a `ctx`. An
+    aspect is emitted again after `max_age` even if unchanged, so writes that were
+    lost downstream of the source are eventually repaired.
+    """
+    try:
+        for wu in stream:
+            mcp = wu.metadata
+            if (
+                not isinstance(mcp, MetadataChangeProposalWrapper)
+                or mcp.aspect is None
+                or mcp.changeType != ChangeTypeClass.UPSERT
+            ):
+                report.record(skipped=False)
+                yield wu
+                continue
+
+            aspect_name = mcp.aspectName or mcp.aspect.get_aspect_name()
+            fingerprint = aspect_fingerprint(mcp)
+            unchanged = store.is_unchanged(
+                mcp.entityUrn, aspect_name, fingerprint, max_age
+            )
+            report.record(skipped=unchanged)
+            if unchanged:
+                continue
+
+            store.put(mcp.entityUrn, aspect_name, fingerprint)
+            yield wu
+    except BaseException:
+        store.close()
+        raise
+
+    if ctx is None:
+        store.commit()
+    else:
+        ctx.register_checkpointer(AspectFingerprintCommittable(store))
@@ -1,9 +1,11 @@
-from typing import Iterable, Optional, List
+from dataclasses import dataclass, field
+import functools
+from typing import Iterable, Optional, List, Sequence, Tuple
 
 from datahub.ingestion.api.common import PipelineContext
 from datahub.ingestion.api.source import MetadataWorkUnitProcessor
 from datahub.ingestion.api.workunit import MetadataWorkUnit
-from datahub.emitter.mcp import MetadataChangeProposalWrapper, ChangeTypeClass
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
 import datahub.emitter.mce_builder as builder
 from datahub.metadata.schema_classes import (
     BrowsePathsClass,
@@ -11,8 +13,6 @@ from datahub.metadata.schema_classes import (
     InstitutionalMemoryMetadataClass,
     DatasetPropertiesClass,
     SubTypesClass,
-    UpstreamLineageClass,
-    UpstreamClass,
 )
 from datahub.ingestion.source.state.stale_entity_removal_handler import (
     StatefulStaleMetadataRemovalConfig,
@@ -23,19 +23,51 @@ from datahub.ingestion.source.state.stateful_ingestion_base import (
     StatefulIngestionConfigBase,
     StatefulIngestionSourceBase,
 )
+from sync.catalog import PING_TABLES, Catalog, CatalogStats, refresh_ping_tables
+from sync.datahub.config import (
+    ArchiveCacheConfig,
+    CatalogConfig,
+    StreamingSourceConfig,
+)
+from sync.datahub.fingerprint import AspectFingerprintReport
+from sync.datahub.lineage import LineageAggregator, LineageReport
+from sync.datahub.stats import StageMetricsMixin, StageReport, report_stages
 from sync.datahub.utils import get_current_timestamp
-from sync.glean import get_glean_pings
+from sync.glean import DEFAULT_WORKERS, GleanPing, GleanStats, iter_glean_pings
+from sync.prefetch import prefetch
+from sync.session import DEFAULT_TIMEOUT
+from sync.snapshot import Snapshot
 
 
-class GleanSourceConfig(StatefulIngestionConfigBase):
-    env: str = "PROD"
+class GleanSourceConfig(StatefulIngestionConfigBase, StreamingSourceConfig):
+    max_workers: int = DEFAULT_WORKERS
+    request_timeout: float = DEFAULT_TIMEOUT
+    # Only emit lineage to the ping tables the generated schemas define
+    catalog: Optional[CatalogConfig] = None
+    # For the generated schemas tarball, when the catalog reads it
+    archive_cache: Optional[ArchiveCacheConfig] = None
     stateful_ingestion: Optional[StatefulStaleMetadataRemovalConfig] = None
 
 
-class GleanSource(StatefulIngestionSourceBase):
+@dataclass
+class GleanSourceReport(StaleEntityRemovalSourceReport):
+    aspect_fingerprints: AspectFingerprintReport = field(
+        default_factory=AspectFingerprintReport
+    )
+    lineage: LineageReport = field(default_factory=LineageReport)
+    stages: StageReport = field(default_factory=StageReport)
+    glean: GleanStats = field(default_factory=GleanStats)
+    catalog: CatalogStats = field(default_factory=CatalogStats)
+
+
+class GleanSource(StageMetricsMixin, StatefulIngestionSourceBase):
+    metrics_source = "glean"
+    metrics_upstream = ("glean",)
+
     def __init__(self, config: GleanSourceConfig, ctx: PipelineContext):
         super().__init__(config, ctx)
         self.config = config
+        self.report: GleanSourceReport = GleanSourceReport()
         self.platform = "Glean"
 
     def get_platform_instance_id(self) -> str:
@@ -48,14 +80,89 @@ class GleanSource(StatefulIngestionSourceBase):
 
     def get_workunit_processors(self) -> List[Optional[MetadataWorkUnitProcessor]]:
         return [
+            functools.partial(report_stages, report=self.report.stages),
             *super().get_workunit_processors(),
             StaleEntityRemovalHandler.create(
                 self, self.config, self.ctx
             ).workunit_processor,
+            (
+                self.config.aspect_fingerprints.build_processor(
+                    self.report.aspect_fingerprints, self.ctx
+                )
+                if self.config.aspect_fingerprints
+                else None
+            ),
         ]
 
+    def _report_app_failure(self, app_name: str, exc: Exception) -> None:
+        self.report.report_warning(
+            title="Failed to fetch Glean app",
+            message="Skipping app whose Glean Dictionary index could not be fetched",
+            context=app_name,
+            exc=exc,
+        )
+
+    def _read_catalog(self, snapshot: Optional[Snapshot]) -> Optional[Catalog]:
+        """
+        Read the ping tables into the catalog unless it has them already. Without
+        any, lineage isn't checked against it.
+        """
+        if not self.config.catalog:
+            return None
+
+        catalog = None
+        cache = self.config.archive_cache.build() if self.config.archive_cache else None
+        try:
+            catalog = self.config.catalog.build()
+            with self.report.stages.time_fetch():
+                self.report.catalog.refreshed = refresh_ping_tables(
+                    catalog, cache, snapshot
+                )
+        except Exception as e:
+            self.report.report_warning(
+                title="Failed to read catalog",
+                message="Checking lineage against the tables already in the catalog",
+                exc=e,
+            )
+        if catalog is not None:
+            self.report.catalog.tables = catalog.count(PING_TABLES)
+            if self.report.catalog.tables:
+                return catalog
+            catalog.close()
+        return None
+
+    def _resolve_tables(
+        self, glean_ping: GleanPing, catalog: Optional[Catalog]
+    ) -> Sequence[str]:
+        """Return every version of the ping's live tables that the catalog has."""
+        if catalog is None:
+            return glean_ping.bigquery_fully_qualified_names
+
+        base_name = glean_ping.bigquery_table_base_name
+        tables = []
+        for dataset in glean_ping.bigquery_datasets:
+            versions = catalog.table_versions(dataset, base_name)
+            if not versions:
+                self.report.lineage.missing_tables.append(f"{dataset}.{base_name}")
+            tables += [f"{dataset}.{base_name}_v{version}" for version in versions]
+        return tables
+
     def get_workunits_internal(self) -> Iterable[MetadataWorkUnit]:
-        for glean_ping in get_glean_pings():
+        snapshot = (
+            Snapshot(self.config.snapshot_dir) if self.config.snapshot_dir else None
+        )
+        glean_pings = iter_glean_pings(
+            max_workers=self.config.max_workers,
+            timeout=self.config.request_timeout,
+            on_error=self._report_app_failure,
+            snapshot=snapshot,
+            stats=self.report.glean,
+        )
+        # Every ping and its URN, whose tables are resolved once all are emitted
+        upstream_pings: List[Tuple[GleanPing, str]] = []
+        for glean_ping in self.report.stages.time_fetches(
+            prefetch(glean_pings, self.config.prefetch_items)
+        ):
             glean_qualified_urn = builder.make_dataset_urn(
                 platform=self.platform,
                 name=glean_ping.qualified_name,
@@ -83,32 +190,34 @@ class GleanSource(StatefulIngestionSourceBase):
                 entityUrn=glean_qualified_urn, aspects=glean_ping_aspects
             )
 
-            upstream_lineage = UpstreamLineageClass(
-                upstreams=[
-                    UpstreamClass(
-                        dataset=glean_qualified_urn,
-                        type="TRANSFORMED",
-                    )
-                ]
+            upstream_pings.append((glean_ping, glean_qualified_urn))
+
+            for mcp in glean_ping_mcps:
+                wu = mcp.as_workunit()
+                yield wu
+
+        lineage = LineageAggregator(self.report.lineage)
+        catalog = self._read_catalog(snapshot)
+        if catalog is None and upstream_pings:
+            self.report.report_warning(
+                title="Ping tables not resolved",
+                message="Emitting lineage to the _v1 live tables of every ping, "
+                "which may not exist, without a catalog of ping tables",
             )
-            upstream_lineage_mcps = [
-                MetadataChangeProposalWrapper(
-                    entityType="dataset",
-                    changeType=ChangeTypeClass.UPSERT,
-                    entityUrn=builder.make_dataset_urn(
+        for glean_ping, glean_qualified_urn in upstream_pings:
+            for qualified_table_name in self._resolve_tables(glean_ping, catalog):
+                lineage.add(
+                    builder.make_dataset_urn(
                         platform="bigquery",
                         name=qualified_table_name,
                         env=self.config.env,
                     ),
-                    aspectName="upstreamLineage",
-                    aspect=upstream_lineage,
+                    glean_qualified_urn,
                 )
-                for qualified_table_name in glean_ping.bigquery_fully_qualified_names
-            ]
+        if catalog is not None:
+            catalog.close()
 
-            for mcp in glean_ping_mcps + upstream_lineage_mcps:
-                wu = mcp.as_workunit()
-                yield wu
+        yield from lineage.gen_workunits()
 
-    def get_report(self) -> StaleEntityRemovalSourceReport:
+    def get_report(self) -> GleanSourceReport:
         return self.report
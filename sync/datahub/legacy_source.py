@@ -1,15 +1,29 @@
-from typing import Iterable, Optional, List
+from dataclasses import dataclass, field
+import functools
+from typing import Iterable, Optional, List, Tuple
 
 from datahub.ingestion.api.common import PipelineContext
 from datahub.ingestion.api.source import MetadataWorkUnitProcessor
 from datahub.ingestion.api.workunit import MetadataWorkUnit
-from datahub.emitter.mcp import MetadataChangeProposalWrapper, ChangeTypeClass
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
 import datahub.emitter.mce_builder as builder
+from datahub.ingestion.api.report import Report
 from datahub.metadata.schema_classes import (
+    ArrayTypeClass,
+    BooleanTypeClass,
     BrowsePathsClass,
+    BytesTypeClass,
+    DateTypeClass,
+    NullTypeClass,
+    NumberTypeClass,
+    OtherSchemaClass,
+    RecordTypeClass,
+    SchemaFieldClass,
+    SchemaFieldDataTypeClass,
+    SchemaMetadataClass,
+    StringTypeClass,
     SubTypesClass,
-    UpstreamLineageClass,
-    UpstreamClass,
+    TimeTypeClass,
 )
 from datahub.ingestion.source.state.stale_entity_removal_handler import (
     StatefulStaleMetadataRemovalConfig,
@@ -20,19 +34,98 @@ from datahub.ingestion.source.state.stateful_ingestion_base import (
     StatefulIngestionConfigBase,
     StatefulIngestionSourceBase,
 )
+from datahub.utilities.stats_collections import (
+    TopKDict,
+    float_top_k_dict,
+    int_top_k_dict,
+)
+
+from sync.archive import TarballStats
+from sync.catalog import PING_TABLES, Catalog, CatalogStats
+from sync.datahub.config import (
+    ArchiveCacheConfig,
+    CatalogConfig,
+    StreamingSourceConfig,
+)
+from sync.datahub.fingerprint import AspectFingerprintReport
+from sync.datahub.lineage import LineageAggregator, LineageReport
+from sync.datahub.stats import StageMetricsMixin, StageReport, report_stages
+from sync.legacy import LegacySchemaField, SchemaStats, read_legacy_ping_schemas
+from sync.prefetch import prefetch
+from sync.snapshot import Snapshot
 
-from sync.legacy import get_legacy_pings
+# DataHub types of the BigQuery column types, and their legacy names
+FIELD_TYPES = {
+    "STRING": StringTypeClass,
+    "BYTES": BytesTypeClass,
+    "INT64": NumberTypeClass,
+    "INTEGER": NumberTypeClass,
+    "FLOAT64": NumberTypeClass,
+    "FLOAT": NumberTypeClass,
+    "NUMERIC": NumberTypeClass,
+    "BIGNUMERIC": NumberTypeClass,
+    "BOOL": BooleanTypeClass,
+    "BOOLEAN": BooleanTypeClass,
+    "DATE": DateTypeClass,
+    "DATETIME": TimeTypeClass,
+    "TIME": TimeTypeClass,
+    "TIMESTAMP": TimeTypeClass,
+    "RECORD": RecordTypeClass,
+    "STRUCT": RecordTypeClass,
+}
 
 
-class LegacySourceConfig(StatefulIngestionConfigBase):
-    env: str = "PROD"
+class LegacySourceConfig(StatefulIngestionConfigBase, StreamingSourceConfig):
+    archive_cache: Optional[ArchiveCacheConfig] = None
+    # Only emit lineage to the ping tables the generated schemas define
+    catalog: Optional[CatalogConfig] = None
     stateful_ingestion: Optional[StatefulStaleMetadataRemovalConfig] = None
 
 
-class LegacySource(StatefulIngestionSourceBase):
+@dataclass
+class SchemaReport(SchemaStats, Report):
+    # Only the largest and slowest schema versions are reported
+    fields: TopKDict[str, int] = field(default_factory=int_top_k_dict)
+    parse_seconds: TopKDict[str, float] = field(default_factory=float_top_k_dict)
+
+
+@dataclass
+class LegacySourceReport(StaleEntityRemovalSourceReport):
+    aspect_fingerprints: AspectFingerprintReport = field(
+        default_factory=AspectFingerprintReport
+    )
+    lineage: LineageReport = field(default_factory=LineageReport)
+    stages: StageReport = field(default_factory=StageReport)
+    tarball: TarballStats = field(default_factory=TarballStats)
+    schemas: SchemaReport = field(default_factory=SchemaReport)
+    catalog: CatalogStats = field(default_factory=CatalogStats)
+    pings: int = 0
+
+
+def _make_schema_field(schema_field: LegacySchemaField) -> SchemaFieldClass:
+    if schema_field.mode == "REPEATED":
+        data_type = ArrayTypeClass(nestedType=[schema_field.type])
+        native_data_type = f"ARRAY<{schema_field.type}>"
+    else:
+        data_type = FIELD_TYPES.get(schema_field.type, NullTypeClass)()
+        native_data_type = schema_field.type
+    return SchemaFieldClass(
+        fieldPath=schema_field.path,
+        type=SchemaFieldDataTypeClass(type=data_type),
+        nativeDataType=native_data_type,
+        description=schema_field.description,
+        nullable=schema_field.mode != "REQUIRED",
+    )
+
+
+class LegacySource(StageMetricsMixin, StatefulIngestionSourceBase):
+    metrics_source = "legacy"
+    metrics_upstream = ("tarball",)
+
     def __init__(self, config: LegacySourceConfig, ctx: PipelineContext):
         super().__init__(config, ctx)
         self.config = config
+        self.report: LegacySourceReport = LegacySourceReport()
         self.platform = "LegacyTelemetry"
 
     def get_platform_instance_id(self) -> str:
@@ -45,14 +138,65 @@ class LegacySource(StatefulIngestionSourceBase):
 
     def get_workunit_processors(self) -> List[Optional[MetadataWorkUnitProcessor]]:
         return [
+            functools.partial(report_stages, report=self.report.stages),
             *super().get_workunit_processors(),
             StaleEntityRemovalHandler.create(
                 self, self.config, self.ctx
             ).workunit_processor,
+            (
+                self.config.aspect_fingerprints.build_processor(
+                    self.report.aspect_fingerprints, self.ctx
+                )
+                if self.config.aspect_fingerprints
+                else None
+            ),
         ]
 
+    def _read_catalog(
+        self, tables: Optional[List[str]], snapshot: Optional[Snapshot]
+    ) -> Optional[Catalog]:
+        """
+        Write the ping `tables`, read along with the pings, to the catalog unless
+        it has them already. Without any, lineage isn't checked against it.
+        """
+        if not self.config.catalog:
+            return None
+
+        catalog = None
+        try:
+            catalog = self.config.catalog.build()
+            # Those of a snapshot always replace them, so replays are repeatable
+            if tables is not None:
+                self.report.catalog.refreshed = catalog.refresh(
+                    PING_TABLES, lambda: tables, force=snapshot is not None
+                )
+        except Exception as e:
+            self.report.report_warning(
+                title="Failed to read catalog",
+                message="Checking lineage against the tables already in the catalog",
+                exc=e,
+            )
+        if catalog is not None:
+            self.report.catalog.tables = catalog.count(PING_TABLES)
+            if self.report.catalog.tables:
+                return catalog
+            catalog.close()
+        return None
+
     def get_workunits_internal(self) -> Iterable[MetadataWorkUnit]:
-        for legacy_ping in get_legacy_pings():
+        cache = self.config.archive_cache.build() if self.config.archive_cache else None
+        snapshot = (
+            Snapshot(self.config.snapshot_dir) if self.config.snapshot_dir else None
+        )
+        legacy_pings = read_legacy_ping_schemas(
+            cache, snapshot, self.report.tarball, self.report.schemas
+        )
+        # The tables of every ping and its URN, checked once all pings are emitted
+        upstream_tables: List[Tuple[str, str]] = []
+        for legacy_ping in self.report.stages.time_fetches(
+            prefetch(legacy_pings.pings, self.config.prefetch_items)
+        ):
+            self.report.pings += 1
             legacy_qualified_urn = builder.make_dataset_urn(
                 platform=self.platform,
                 name=legacy_ping.name,
@@ -64,35 +208,47 @@ class LegacySource(StatefulIngestionSourceBase):
                     paths=[f"/{self.config.env.lower()}/legacy/{legacy_ping.name}"]
                 ),
             ]
+            if legacy_ping.schema_version is not None:
+                # DataHub keeps a single schema per dataset, that of the latest version
+                legacy_ping_aspects.append(
+                    SchemaMetadataClass(
+                        schemaName=legacy_ping.name,
+                        platform=builder.make_data_platform_urn(self.platform),
+                        version=legacy_ping.schema_version,
+                        hash="",
+                        platformSchema=OtherSchemaClass(rawSchema=""),
+                        fields=[_make_schema_field(f) for f in legacy_ping.fields],
+                    )
+                )
             legacy_ping_mcps = MetadataChangeProposalWrapper.construct_many(
                 entityUrn=legacy_qualified_urn, aspects=legacy_ping_aspects
             )
 
-            upstream_lineage = UpstreamLineageClass(
-                upstreams=[
-                    UpstreamClass(
-                        dataset=legacy_qualified_urn,
-                        type="TRANSFORMED",
-                    )
-                ]
-            )
-            upstream_lineage_mcps = [
-                MetadataChangeProposalWrapper(
-                    entityType="dataset",
-                    changeType=ChangeTypeClass.UPSERT,
-                    entityUrn=builder.make_dataset_urn(
-                        platform="bigquery",
-                        name=qualified_table_name,
-                        env=self.config.env,
-                    ),
-                    aspectName="upstreamLineage",
-                    aspect=upstream_lineage,
-                )
-                for qualified_table_name in legacy_ping.bigquery_fully_qualified_names
-            ]
-            for mcp in legacy_ping_mcps + upstream_lineage_mcps:
+            for qualified_table_name in legacy_ping.bigquery_fully_qualified_names:
+                upstream_tables.append((qualified_table_name, legacy_qualified_urn))
+
+            for mcp in legacy_ping_mcps:
                 wu = mcp.as_workunit()
                 yield wu
 
-    def get_report(self) -> StaleEntityRemovalSourceReport:
+        lineage = LineageAggregator(self.report.lineage)
+        catalog = self._read_catalog(legacy_pings.tables, snapshot)
+        for qualified_table_name, legacy_qualified_urn in upstream_tables:
+            if catalog is not None and not catalog.has_table(qualified_table_name):
+                self.report.lineage.missing_tables.append(qualified_table_name)
+                continue
+            lineage.add(
+                builder.make_dataset_urn(
+                    platform="bigquery",
+                    name=qualified_table_name,
+                    env=self.config.env,
+                ),
+                legacy_qualified_urn,
+            )
+        if catalog is not None:
+            catalog.close()
+
+        yield from lineage.gen_workunits()
+
+    def get_report(self) -> LegacySourceReport:
         return self.report
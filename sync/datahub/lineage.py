@@ -0,0 +1,59 @@
+"""Merges the lineage edges of a run into one upstreamLineage aspect per dataset."""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable
+
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
+from datahub.ingestion.api.report import Report
+from datahub.ingestion.api.workunit import MetadataWorkUnit
+from datahub.metadata.schema_classes import (
+    DatasetLineageTypeClass,
+    UpstreamClass,
+    UpstreamLineageClass,
+)
+from datahub.utilities.lossy_collections import LossyList
+
+
+@dataclass
+class LineageReport(Report):
+    edges: int = 0
+    writes: int = 0
+    # Upstream tables missing from the catalog, whose edges were dropped. Glean
+    # pings without a table of any version are listed by base name.
+    missing_tables: LossyList[str] = field(default_factory=LossyList)
+
+
+class LineageAggregator:
+    """
+    Collects the upstreams of every downstream dataset over a whole run.
+
+    upstreamLineage is upserted as a whole, so emitting one aspect per edge makes
+    every write replace the previous one for the same dataset. Instead, each
+    downstream gets a single aspect listing all of its upstreams once the run is
+    complete.
+    """
+
+    def __init__(self, report: LineageReport):
+        self.report = report
+        # Upstreams are keyed by URN to drop repeated edges, in order of arrival
+        self._upstreams: Dict[str, Dict[str, UpstreamClass]] = defaultdict(dict)
+
+    def add(
+        self,
+        downstream_urn: str,
+        upstream_urn: str,
+        lineage_type: str = DatasetLineageTypeClass.TRANSFORMED,
+    ) -> None:
+        self.report.edges += 1
+        self._upstreams[downstream_urn].setdefault(
+            upstream_urn, UpstreamClass(dataset=upstream_urn, type=lineage_type)
+        )
+
+    def gen_workunits(self) -> Iterable[MetadataWorkUnit]:
+        for downstream_urn, upstreams in self._upstreams.items():
+            self.report.writes += 1
+            yield MetadataChangeProposalWrapper(
+                entityUrn=downstream_urn,
+                aspect=UpstreamLineageClass(upstreams=list(upstreams.values())),
+            ).as_workunit()
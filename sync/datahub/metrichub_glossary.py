@@ -1,24 +1,132 @@
 """Builds the metric-hub glossary YAML file for syncing to DataHub."""
 
-from collections import defaultdict
-import itertools
-import operator
+import argparse
+from collections import defaultdict, deque
+from concurrent.futures import Future
+import io
+import logging
+import os
 from os import linesep
-from typing import Any, Dict, List
-from metric_config_parser.metric import MetricLevel
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+)
 from datahub.emitter.mce_builder import make_term_urn, make_dataset_urn
 
 import yaml
 
+try:
+    from yaml import CDumper as Dumper
+except ImportError:
+    from yaml import Dumper
+
 from sync.metrichub import (
     METRIC_HUB_REPO_URL,
     get_metric_definitions,
     MetricHubDefinition,
+    TableReferenceCache,
+    process_pool,
 )
+from sync.snapshot import Snapshot
+
+if TYPE_CHECKING:
+    from metric_config_parser.metric import MetricLevel
 
 GLOSSARY_FILENAME = "metric_hub_glossary.yaml"
 TABLE_TO_METRIC_FILENAME = "datasets.yaml"
 LOOKER_EXPLORE_URL = "https://mozilla.cloud.looker.com/explore"
+SQL_CACHE_FILENAME = ".cache/metric_hub_sql.sqlite"
+GLOSSARY_SOURCE = "Metric-Hub"
+ROOT_NODE_NAME = "Metric Hub"
+ROOT_NODE_DESCRIPTION = (
+    "Central hub for metric definitions that are considered the source of truth."
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _YamlStreamWriter:
+    """
+    Writes one YAML document a piece at a time.
+
+    Collections are opened and closed explicitly and everything in between is
+    represented and emitted as soon as it is written, so only the piece being
+    written is held in memory. Output is the same as a single `yaml.dump` of the
+    whole document, except that the caller is responsible for key order.
+    """
+
+    def __init__(self, stream: TextIO, sort_keys: bool = True, dumper=Dumper):
+        self._dumper = dumper(stream, default_flow_style=False, sort_keys=sort_keys)
+
+    def __enter__(self) -> "_YamlStreamWriter":
+        self._dumper.emit(yaml.StreamStartEvent())
+        self._dumper.emit(yaml.DocumentStartEvent(explicit=False))
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._dumper.emit(yaml.DocumentEndEvent(explicit=False))
+        self._dumper.emit(yaml.StreamEndEvent())
+        self._dumper.dispose()
+
+    def start_mapping(self) -> None:
+        self._dumper.emit(yaml.MappingStartEvent(None, None, True, flow_style=False))
+
+    def end_mapping(self) -> None:
+        self._dumper.emit(yaml.MappingEndEvent())
+
+    def start_sequence(self) -> None:
+        self._dumper.emit(yaml.SequenceStartEvent(None, None, True, flow_style=False))
+
+    def end_sequence(self) -> None:
+        self._dumper.emit(yaml.SequenceEndEvent())
+
+    def write(self, data: Any) -> None:
+        node = self._dumper.represent_data(data)
+        # Forget represented objects so nothing outlives this piece
+        self._dumper.represented_objects = {}
+        self._dumper.object_keeper = []
+        self._dumper.alias_key = None
+        self._emit_node(node)
+
+    def _emit_node(self, node: yaml.Node) -> None:
+        resolve = self._dumper.resolve
+        if isinstance(node, yaml.ScalarNode):
+            implicit = (
+                node.tag == resolve(yaml.ScalarNode, node.value, (True, False)),
+                node.tag == resolve(yaml.ScalarNode, node.value, (False, True)),
+            )
+            self._dumper.emit(
+                yaml.ScalarEvent(None, node.tag, implicit, node.value, style=node.style)
+            )
+        elif isinstance(node, yaml.SequenceNode):
+            implicit = node.tag == resolve(yaml.SequenceNode, node.value, True)
+            self._dumper.emit(
+                yaml.SequenceStartEvent(
+                    None, node.tag, implicit, flow_style=node.flow_style
+                )
+            )
+            for item in node.value:
+                self._emit_node(item)
+            self._dumper.emit(yaml.SequenceEndEvent())
+        else:
+            implicit = node.tag == resolve(yaml.MappingNode, node.value, True)
+            self._dumper.emit(
+                yaml.MappingStartEvent(
+                    None, node.tag, implicit, flow_style=node.flow_style
+                )
+            )
+            for key, value in node.value:
+                self._emit_node(key)
+                self._emit_node(value)
+            self._dumper.emit(yaml.MappingEndEvent())
 
 
 def _build_metric_dict(metric: MetricHubDefinition) -> Dict:
@@ -62,7 +170,9 @@ def _build_metric_dict(metric: MetricHubDefinition) -> Dict:
     }
 
 
-def _get_metric_level_link_text(level: MetricLevel) -> str:
+def _get_metric_level_link_text(level: "MetricLevel") -> str:
+    from metric_config_parser.metric import MetricLevel
+
     url = "https://mozilla.acryl.io/glossaryTerm"
     if level == MetricLevel.GOLD:
         urn = make_term_urn("5fbb70ef-0a69-4db5-a301-907dd13148bc")
@@ -124,8 +234,41 @@ def _build_product_dict(product: str, metrics: List[MetricHubDefinition]) -> Dic
     }
 
 
+def _index_by_product(
+    metrics: Iterable[MetricHubDefinition],
+) -> Dict[str, List[MetricHubDefinition]]:
+    """Partition metrics by product, in order of each product's first metric."""
+    products = defaultdict(list)
+    for metric in metrics:
+        products[metric.product].append(metric)
+    return products
+
+
+def _build_product_dicts(
+    products: Dict[str, List[MetricHubDefinition]], workers: int = 1
+) -> Iterator[Dict]:
+    """
+    Build the glossary node of every product in order, in a pool of `workers`
+    processes. At most two products per worker are built ahead of the one being
+    written, so only those are held in memory.
+    """
+    if workers <= 1 or len(products) <= 1:
+        for product, metrics in products.items():
+            yield _build_product_dict(product, metrics)
+        return
+
+    with process_pool(workers) as executor:
+        in_flight: Deque[Future] = deque()
+        for product, metrics in products.items():
+            if len(in_flight) == 2 * workers:
+                yield in_flight.popleft().result()
+            in_flight.append(executor.submit(_build_product_dict, product, metrics))
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
 def _generate_table_to_term_data(
-    metrics: List[MetricHubDefinition],
+    metrics: List[MetricHubDefinition], env: str = "PROD"
 ) -> List[Dict[str, Any]]:
     source_table_to_metric = defaultdict(list)
     yaml_data = []
@@ -137,6 +280,7 @@ def _generate_table_to_term_data(
             source_table_urn = make_dataset_urn(
                 platform="bigquery",
                 name=bigquery_table,
+                env=env,
             )
             source_table_to_metric[source_table_urn].append(metric.urn)
 
@@ -146,36 +290,133 @@ def _generate_table_to_term_data(
     return yaml_data
 
 
-def main() -> None:
-    metric_hub_definitions = get_metric_definitions()
-    product_nodes = [
-        _build_product_dict(product, product_metrics)
-        for product, product_metrics in itertools.groupby(
-            metric_hub_definitions, operator.attrgetter("product")
+def _write_glossary(f: TextIO, product_nodes: Iterable[Dict], dumper=Dumper) -> None:
+    """Write the glossary one product at a time, with keys in sorted order."""
+    with _YamlStreamWriter(f, dumper=dumper) as writer:
+        writer.start_mapping()
+        writer.write("nodes")
+        writer.start_sequence()
+        writer.start_mapping()
+        writer.write("description")
+        writer.write(ROOT_NODE_DESCRIPTION)
+        writer.write("name")
+        writer.write(ROOT_NODE_NAME)
+        writer.write("nodes")
+        writer.start_sequence()
+        for product_node in product_nodes:
+            writer.write(product_node)
+        writer.end_sequence()
+        writer.end_mapping()
+        writer.end_sequence()
+        for key, value in [
+            ("owners", []),
+            ("source", GLOSSARY_SOURCE),
+            ("url", METRIC_HUB_REPO_URL),
+            ("version", 1),
+        ]:
+            writer.write(key)
+            writer.write(value)
+        writer.end_mapping()
+
+
+def _write_glossary_shards(
+    shard_dir: Path, product_nodes: Iterable[Dict], dumper=Dumper
+) -> List[Path]:
+    """
+    Write a complete glossary file per product into `shard_dir`.
+
+    Shards whose content hasn't changed are left untouched and shards of
+    products that no longer exist are removed. Returns the shards that were
+    written, which are the only ones that need to be ingested again.
+    """
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    stale = set(shard_dir.glob("*.yaml"))
+    changed = []
+    for product_node in product_nodes:
+        path = shard_dir / f"{product_node['name']}.yaml"
+        stale.discard(path)
+
+        f = io.StringIO()
+        _write_glossary(f, [product_node], dumper=dumper)
+        if path.exists() and path.read_text() == f.getvalue():
+            continue
+        path.write_text(f.getvalue())
+        changed.append(path)
+
+    for path in sorted(stale):
+        logger.info(f"Removing glossary shard of deleted product {path.stem}")
+        path.unlink()
+    return changed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sql-cache",
+        default=SQL_CACHE_FILENAME,
+        help="SQLite file caching table references parsed from metric-hub SQL",
+    )
+    parser.add_argument(
+        "--no-sql-cache",
+        dest="sql_cache",
+        action="store_const",
+        const=None,
+        help="Parse all metric-hub SQL from scratch",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes parsing metric-hub SQL",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes building glossary products",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        help="Read metric-hub from a snapshot captured with `python -m sync.snapshot`",
+    )
+    parser.add_argument(
+        "--shard-dir",
+        help="Write one glossary file per product into this directory instead, "
+        "printing the paths of the files that changed",
+    )
+    args = parser.parse_args(argv)
+
+    table_reference_cache = None
+    if args.sql_cache:
+        Path(args.sql_cache).parent.mkdir(parents=True, exist_ok=True)
+        table_reference_cache = TableReferenceCache(args.sql_cache)
+
+    try:
+        metric_hub_definitions = get_metric_definitions(
+            table_reference_cache,
+            parse_workers=args.parse_workers,
+            snapshot=Snapshot(args.snapshot_dir) if args.snapshot_dir else None,
         )
-    ]
-
-    glossary = {
-        "version": 1,
-        "source": "Metric-Hub",
-        "url": METRIC_HUB_REPO_URL,
-        "owners": [],
-        "nodes": [
-            {
-                "name": "Metric Hub",
-                "description": "Central hub for metric definitions that are considered the source of truth.",  # noqa: E501
-                "nodes": product_nodes,
-            }
-        ],
-    }
-
-    datasets_yaml_data = _generate_table_to_term_data(metric_hub_definitions)
-
-    with open(GLOSSARY_FILENAME, "w+") as f:
-        yaml.dump(glossary, f)
+    finally:
+        if table_reference_cache is not None:
+            table_reference_cache.close()
+
+    product_nodes = _build_product_dicts(
+        _index_by_product(metric_hub_definitions), workers=args.workers
+    )
+    if args.shard_dir:
+        for path in _write_glossary_shards(Path(args.shard_dir), product_nodes):
+            print(path)
+    else:
+        with open(GLOSSARY_FILENAME, "w+") as f:
+            _write_glossary(f, product_nodes)
 
     with open(TABLE_TO_METRIC_FILENAME, "w+") as f:
-        yaml.dump(datasets_yaml_data, f, sort_keys=False)
+        with _YamlStreamWriter(f, sort_keys=False) as writer:
+            writer.start_sequence()
+            for item in _generate_table_to_term_data(metric_hub_definitions):
+                writer.write(item)
+            writer.end_sequence()
 
 
 if __name__ == "__main__":
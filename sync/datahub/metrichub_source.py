@@ -0,0 +1,196 @@
+from dataclasses import dataclass, field
+import functools
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import datahub.emitter.mce_builder as builder
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
+from datahub.ingestion.api.common import PipelineContext
+from datahub.ingestion.api.source import (
+    MetadataWorkUnitProcessor,
+    Source,
+    SourceReport,
+)
+from datahub.ingestion.api.workunit import MetadataWorkUnit
+from datahub.ingestion.source.metadata.business_glossary import (
+    make_glossary_node_urn,
+)
+from datahub.metadata.schema_classes import (
+    GlossaryNodeInfoClass,
+    GlossaryTermAssociationClass,
+    GlossaryTermInfoClass,
+    GlossaryTermsClass,
+    OwnerClass,
+    OwnershipClass,
+    OwnershipTypeClass,
+)
+
+from sync.datahub.config import SyncSourceConfig
+from sync.datahub.fingerprint import AspectFingerprintReport
+from sync.datahub.metrichub_glossary import (
+    GLOSSARY_SOURCE,
+    ROOT_NODE_DESCRIPTION,
+    ROOT_NODE_NAME,
+    _build_metric_dict,
+    _generate_table_to_term_data,
+    _index_by_product,
+)
+from sync.datahub.stats import StageMetricsMixin, StageReport, report_stages
+from sync.datahub.utils import get_current_timestamp
+from sync.metrichub import (
+    METRIC_HUB_REPO_URL,
+    MetricHubStats,
+    TableReferenceCache,
+    get_metric_definitions,
+)
+from sync.snapshot import Snapshot
+
+
+class MetricHubGlossarySourceConfig(SyncSourceConfig):
+    # SQLite file caching table references parsed from metric-hub SQL
+    sql_cache: Optional[str] = None
+    parse_workers: int = 1
+
+
+@dataclass
+class MetricHubGlossarySourceReport(SourceReport):
+    glossary_nodes: int = 0
+    glossary_terms: int = 0
+    datasets: int = 0
+    aspect_fingerprints: AspectFingerprintReport = field(
+        default_factory=AspectFingerprintReport
+    )
+    stages: StageReport = field(default_factory=StageReport)
+    metric_hub: MetricHubStats = field(default_factory=MetricHubStats)
+
+
+class MetricHubGlossarySource(StageMetricsMixin, Source):
+    metrics_source = "metric_hub"
+    metrics_upstream = ("metric_hub",)
+
+    """
+    Emits the metric-hub glossary and the glossary terms of the tables behind each
+    metric, as the `datahub-business-glossary` source would from the YAML files
+    written by `sync.datahub.metrichub_glossary`.
+    """
+
+    def __init__(self, config: MetricHubGlossarySourceConfig, ctx: PipelineContext):
+        super().__init__(ctx)
+        self.config = config
+        self.report = MetricHubGlossarySourceReport()
+
+    @classmethod
+    def create(
+        cls, config_dict: dict, ctx: PipelineContext
+    ) -> "MetricHubGlossarySource":
+        config = MetricHubGlossarySourceConfig.parse_obj(config_dict)
+        return cls(config, ctx)
+
+    def get_workunit_processors(self) -> List[Optional[MetadataWorkUnitProcessor]]:
+        return [
+            functools.partial(report_stages, report=self.report.stages),
+            *super().get_workunit_processors(),
+            (
+                self.config.aspect_fingerprints.build_processor(
+                    self.report.aspect_fingerprints, self.ctx
+                )
+                if self.config.aspect_fingerprints
+                else None
+            ),
+        ]
+
+    def _node_workunits(
+        self, path: List[str], description: str, parent_node: Optional[str]
+    ) -> Iterable[MetadataWorkUnit]:
+        node_urn = make_glossary_node_urn(path, None, enable_auto_id=False)
+        self.report.glossary_nodes += 1
+        yield MetadataChangeProposalWrapper(
+            entityUrn=node_urn,
+            aspect=GlossaryNodeInfoClass(
+                definition=description, name=path[-1], parentNode=parent_node
+            ),
+        ).as_workunit()
+        # The glossary has no owners, which nodes inherit
+        yield MetadataChangeProposalWrapper(
+            entityUrn=node_urn, aspect=OwnershipClass(owners=[])
+        ).as_workunit()
+
+    def get_workunits_internal(self) -> Iterable[MetadataWorkUnit]:
+        table_reference_cache = None
+        if self.config.sql_cache:
+            Path(self.config.sql_cache).parent.mkdir(parents=True, exist_ok=True)
+            table_reference_cache = TableReferenceCache(self.config.sql_cache)
+
+        with self.report.stages.time_fetch():
+            try:
+                metric_hub_definitions = get_metric_definitions(
+                    table_reference_cache,
+                    parse_workers=self.config.parse_workers,
+                    snapshot=(
+                        Snapshot(self.config.snapshot_dir)
+                        if self.config.snapshot_dir
+                        else None
+                    ),
+                    stats=self.report.metric_hub,
+                )
+            finally:
+                if table_reference_cache is not None:
+                    table_reference_cache.close()
+
+        root_path = [ROOT_NODE_NAME]
+        root_urn = make_glossary_node_urn(root_path, None, enable_auto_id=False)
+        yield from self._node_workunits(root_path, ROOT_NODE_DESCRIPTION, None)
+
+        for product, metrics in _index_by_product(metric_hub_definitions).items():
+            product_path = [ROOT_NODE_NAME, product]
+            product_urn = make_glossary_node_urn(
+                product_path, None, enable_auto_id=False
+            )
+            yield from self._node_workunits(
+                product_path, f"{product} metrics", root_urn
+            )
+
+            for metric in metrics:
+                term = _build_metric_dict(metric)
+                self.report.glossary_terms += 1
+                yield MetadataChangeProposalWrapper(
+                    entityUrn=metric.urn,
+                    aspect=GlossaryTermInfoClass(
+                        definition=term["description"],
+                        termSource=term["term_source"],
+                        sourceRef=GLOSSARY_SOURCE,
+                        sourceUrl=METRIC_HUB_REPO_URL,
+                        parentNode=product_urn,
+                        name=term["name"],
+                    ),
+                ).as_workunit()
+                yield MetadataChangeProposalWrapper(
+                    entityUrn=metric.urn,
+                    aspect=OwnershipClass(
+                        owners=[
+                            OwnerClass(
+                                owner=builder.make_user_urn(owner),
+                                type=OwnershipTypeClass.DEVELOPER,
+                            )
+                            for owner in metric.owners or []
+                        ]
+                    ),
+                ).as_workunit()
+
+        for dataset in _generate_table_to_term_data(
+            metric_hub_definitions, env=self.config.env
+        ):
+            self.report.datasets += 1
+            yield MetadataChangeProposalWrapper(
+                entityUrn=dataset["urn"],
+                aspect=GlossaryTermsClass(
+                    terms=[
+                        GlossaryTermAssociationClass(urn=term)
+                        for term in dataset["glossary_terms"]
+                    ],
+                    auditStamp=get_current_timestamp(),
+                ),
+            ).as_workunit()
+
+    def get_report(self) -> MetricHubGlossarySourceReport:
+        return self.report
@@ -0,0 +1,137 @@
+"""Times the stages of a source run and exports them for Prometheus."""
+
+from collections import defaultdict
+import contextlib
+from dataclasses import dataclass, field, fields
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
+from datahub.ingestion.api.report import Report
+from datahub.ingestion.api.workunit import MetadataWorkUnit
+
+METRIC_PREFIX = "sync"
+
+T = TypeVar("T")
+_END = object()
+
+
+@dataclass
+class StageReport(Report):
+    # Waiting for upstream, including its download, decompression and parsing
+    fetch_seconds: float = 0.0
+    # Building work units from what was fetched
+    mcp_seconds: float = 0.0
+    mcps: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    @contextlib.contextmanager
+    def time_fetch(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fetch_seconds += time.perf_counter() - start
+
+    def time_fetches(self, iterable: Iterable[T]) -> Iterator[T]:
+        """Yield the items of `iterable`, timing the wait for each as a fetch."""
+        iterator = iter(iterable)
+        while True:
+            with self.time_fetch():
+                item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+
+
+def report_stages(
+    stream: Iterable[MetadataWorkUnit], report: StageReport
+) -> Iterable[MetadataWorkUnit]:
+    """
+    Work unit processor that times how long the source takes to produce its work
+    units, less the fetches it timed with `report.time_fetch()`, and counts them
+    by aspect.
+
+    It has to be the first processor, so that the time of the others isn't
+    counted as the source's.
+    """
+    iterator = iter(stream)
+    seconds = 0.0
+    while True:
+        start = time.perf_counter()
+        wu = next(iterator, None)
+        seconds += time.perf_counter() - start
+        report.mcp_seconds = seconds - report.fetch_seconds
+        if wu is None:
+            return
+
+        if isinstance(wu.metadata, MetadataChangeProposalWrapper):
+            report.mcps[wu.metadata.aspectName or "unknown"] += 1
+        else:
+            report.mcps[type(wu.metadata).__name__] += 1
+        yield wu
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    escaped = (
+        value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in labels.values()
+    )
+    return ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped))
+
+
+def write_prometheus_textfile(
+    path: str, source: str, stages: StageReport, upstream: Dict[str, Any]
+) -> None:
+    """
+    Write `stages` and the stats dataclasses in `upstream`, keyed by the prefix of
+    their metrics, as gauges in the text format read by node_exporter's textfile
+    collector. The file is replaced at once, since the collector may read it at
+    any time.
+    """
+    samples: Dict[str, List[Tuple[Dict[str, str], float]]] = defaultdict(list)
+    labels = {"source": source}
+    samples["run_timestamp_seconds"].append((labels, time.time()))
+    for stage in ("fetch", "mcp"):
+        value = getattr(stages, f"{stage}_seconds")
+        samples["stage_seconds"].append(({**labels, "stage": stage}, value))
+    for aspect, count in sorted(stages.mcps.items()):
+        samples["mcps"].append(({**labels, "aspect": aspect}, count))
+    for prefix, stats in upstream.items():
+        for stats_field in fields(stats):
+            value = getattr(stats, stats_field.name)
+            samples[f"{prefix}_{stats_field.name}"].append((labels, value))
+
+    lines = []
+    for name, values in samples.items():
+        metric = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# TYPE {metric} gauge")
+        lines += [f"{metric}{{{_format_labels(key)}}} {value}" for key, value in values]
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+class StageMetricsMixin:
+    """
+    Source mixin writing the stages of every run, and the stats dataclasses of
+    the report named in `metrics_upstream`, to the `prometheus_textfile` of the
+    source config when the source is closed.
+    """
+
+    # The `source` label of the metrics
+    metrics_source: str
+    metrics_upstream: Tuple[str, ...] = ()
+
+    def close(self) -> None:
+        if self.config.prometheus_textfile:
+            report = self.get_report()
+            write_prometheus_textfile(
+                self.config.prometheus_textfile,
+                self.metrics_source,
+                report.stages,
+                {name: getattr(report, name) for name in self.metrics_upstream},
+            )
+        super().close()
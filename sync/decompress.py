@@ -0,0 +1,126 @@
+"""
+Gzip decompression for the tarball readers, with the fastest backend installed.
+
+python-isal and zlib-ng are drop-in replacements for the `gzip` module with much
+faster inflation. `pigz` inflates in a process of its own, with reading, writing
+and checksums on separate threads. Without any of them, the `gzip` module is
+used. Set `SYNC_GZIP_BACKEND` to one of `BACKENDS` to force a backend.
+"""
+
+import contextlib
+import functools
+import gzip
+import importlib.util
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from typing import BinaryIO, Iterator, List, Optional
+
+# In order of preference
+BACKENDS = ["isal", "zlib_ng", "pigz", "stdlib"]
+BACKEND_ENV = "SYNC_GZIP_BACKEND"
+PIGZ_COMMAND = ["pigz", "--decompress", "--stdout"]
+# How much of the compressed stream is piped to pigz at a time
+CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def is_available(backend: str) -> bool:
+    if backend in ("isal", "zlib_ng"):
+        return importlib.util.find_spec(backend) is not None
+    if backend == "pigz":
+        return shutil.which(PIGZ_COMMAND[0]) is not None
+    return backend == "stdlib"
+
+
+def available_backends() -> List[str]:
+    return [backend for backend in BACKENDS if is_available(backend)]
+
+
+@functools.lru_cache(maxsize=None)
+def default_backend() -> str:
+    backend = os.environ.get(BACKEND_ENV)
+    if backend is not None:
+        if backend not in BACKENDS:
+            raise ValueError(f"{BACKEND_ENV} must be one of {', '.join(BACKENDS)}")
+        return backend
+
+    backend = available_backends()[0]
+    logger.info(f"Decompressing tarballs with {backend}")
+    return backend
+
+
+@contextlib.contextmanager
+def _pipe_through(fileobj: BinaryIO, command: List[str]) -> Iterator[BinaryIO]:
+    """
+    Yield the output of `command` fed with everything read from `fileobj`.
+
+    `fileobj` is read on a thread of its own, so downloading overlaps with
+    decompression. Output that isn't read is drained before the exit status is
+    checked, since a truncated tar stream would otherwise just end early.
+    """
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    errors: List[BaseException] = []
+
+    def feed() -> None:
+        try:
+            while chunk := fileobj.read(CHUNK_SIZE):
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            # The process exited early, which its exit status reports
+            pass
+        except BaseException as e:
+            errors.append(e)
+            process.kill()
+        finally:
+            with contextlib.suppress(BrokenPipeError):
+                process.stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        yield process.stdout
+        while process.stdout.read(CHUNK_SIZE):
+            pass
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        feeder.join()
+        returncode = process.wait()
+
+    if errors:
+        raise errors[0]
+    if returncode != 0:
+        raise OSError(f"{command[0]} failed to decompress with status {returncode}")
+
+
+@contextlib.contextmanager
+def open_gzip(fileobj: BinaryIO, backend: Optional[str] = None) -> Iterator[BinaryIO]:
+    """
+    Yield the decompressed stream of the gzipped `fileobj`, using `backend` or
+    else `default_backend()`.
+    """
+    backend = backend or default_backend()
+    if backend == "isal":
+        from isal import igzip
+
+        with igzip.IGzipFile(fileobj=fileobj, mode="rb") as f:
+            yield f
+    elif backend == "zlib_ng":
+        from zlib_ng import gzip_ng
+
+        with gzip_ng.GzipNGFile(fileobj=fileobj, mode="rb") as f:
+            yield f
+    elif backend == "pigz":
+        with _pipe_through(fileobj, PIGZ_COMMAND) as f:
+            yield f
+    elif backend == "stdlib":
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as f:
+            yield f
+    else:
+        raise ValueError(f"Unknown gzip backend {backend}")
@@ -1,9 +1,48 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Sequence
+import functools
+import logging
+import threading
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import requests
 
+from sync.session import DEFAULT_TIMEOUT, get_session
+
+if TYPE_CHECKING:
+    from sync.snapshot import Snapshot
+
 GLEAN_DICTIONARY_URL = "https://dictionary.telemetry.mozilla.org"
+DEFAULT_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+# App indexes are fetched by several threads, which all add to the same stats
+_stats_lock = threading.Lock()
+
+
+@dataclass
+class GleanStats:
+    """Volume of fetching the Glean Dictionary and where its time goes."""
+
+    # Summed over requests, which overlap across workers
+    download_seconds: float = 0.0
+    downloaded_bytes: int = 0
+    parse_seconds: float = 0.0
+    apps_fetched: int = 0
+    apps_failed: int = 0
+    pings: int = 0
 
 
 @dataclass
@@ -29,37 +68,117 @@ class GleanPing:
         ]
 
     @property
-    def bigquery_table_name(self) -> str:
-        return (
-            self.name.replace("-", "_") + "_v1"
-        )  # TODO: Update this to get the right ping version
+    def bigquery_datasets(self) -> Sequence[str]:
+        return [
+            f"moz-fx-data-shared-prod.{dataset_name}"
+            for dataset_name in self.bigquery_dataset_names
+        ]
+
+    @property
+    def bigquery_table_base_name(self) -> str:
+        return self.name.replace("-", "_")
 
     @property
     def bigquery_fully_qualified_names(self) -> Sequence[str]:
+        # Only the first version, for when the versions that exist aren't known
         return [
-            f"moz-fx-data-shared-prod.{dataset_name}.{self.bigquery_table_name}"
-            for dataset_name in self.bigquery_dataset_names
+            f"{dataset}.{self.bigquery_table_base_name}_v1"
+            for dataset in self.bigquery_datasets
         ]
 
 
-def get_glean_pings() -> Sequence[GleanPing]:
-    pings = []
-    apps = requests.get(f"{GLEAN_DICTIONARY_URL}/data/apps.json").json()
-    for app in apps:
-        app_name = app["app_name"]
-        app_data = requests.get(
-            f"{GLEAN_DICTIONARY_URL}/data/{app_name}/index.json"
-        ).json()
-        app_ids = [app_id["name"] for app_id in app_data["app_ids"]]
-        for ping_data in app_data["pings"]:
-
-            pings.append(
-                GleanPing(
-                    name=ping_data["name"],
-                    description=ping_data["description"],
-                    app_name=app_name,
-                    app_ids=app_ids,
-                )
-            )
-
-    return pings
+def _get_json(
+    session: requests.Session,
+    url: str,
+    timeout: float,
+    stats: Optional[GleanStats] = None,
+):
+    start = time.perf_counter()
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    downloaded = time.perf_counter()
+    data = response.json()
+    if stats is not None:
+        with _stats_lock:
+            stats.download_seconds += downloaded - start
+            stats.downloaded_bytes += len(response.content)
+            stats.parse_seconds += time.perf_counter() - downloaded
+    return data
+
+
+def _get_app_pings(get_json: Callable[[str], Any], app_name: str) -> List[GleanPing]:
+    app_data = get_json(f"{GLEAN_DICTIONARY_URL}/data/{app_name}/index.json")
+    app_ids = [app_id["name"] for app_id in app_data["app_ids"]]
+    return [
+        GleanPing(
+            name=ping_data["name"],
+            description=ping_data["description"],
+            app_name=app_name,
+            app_ids=app_ids,
+        )
+        for ping_data in app_data["pings"]
+    ]
+
+
+def iter_glean_pings(
+    max_workers: int = DEFAULT_WORKERS,
+    timeout: float = DEFAULT_TIMEOUT,
+    on_error: Optional[Callable[[str, Exception], None]] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[GleanStats] = None,
+) -> Iterator[GleanPing]:
+    """
+    Yield the pings of every app in the Glean Dictionary, app by app.
+
+    App indexes are fetched by up to `max_workers` threads sharing the connection
+    pool of `get_session()`, or read from `snapshot`. Only `max_workers` apps are
+    fetched ahead of the one being yielded, so a slow consumer slows the fetching
+    down. An app that still fails after retries is skipped and passed to
+    `on_error`, the rest are yielded in the order of `apps.json`. Requests, apps
+    and pings are counted in `stats`.
+    """
+    fetch = functools.partial(_get_json, get_session(), timeout=timeout, stats=stats)
+
+    def get_json(url: str) -> Any:
+        if snapshot is not None:
+            return snapshot.get_json(url, fetch)
+        return fetch(url)
+
+    apps = get_json(f"{GLEAN_DICTIONARY_URL}/data/apps.json")
+
+    def app_pings(app_name: str, future: "Future[List[GleanPing]]") -> List[GleanPing]:
+        try:
+            pings = future.result()
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.warning(f"Failed to fetch pings for {app_name}: {e}")
+            if stats is not None:
+                stats.apps_failed += 1
+            if on_error is not None:
+                on_error(app_name, e)
+            return []
+
+        if stats is not None:
+            stats.apps_fetched += 1
+            stats.pings += len(pings)
+        return pings
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: Deque[Tuple[str, "Future[List[GleanPing]]"]] = deque()
+        for app in apps:
+            future = executor.submit(_get_app_pings, get_json, app["app_name"])
+            pending.append((app["app_name"], future))
+            if len(pending) > max_workers:
+                yield from app_pings(*pending.popleft())
+        while pending:
+            yield from app_pings(*pending.popleft())
+
+
+def get_glean_pings(
+    max_workers: int = DEFAULT_WORKERS,
+    timeout: float = DEFAULT_TIMEOUT,
+    on_error: Optional[Callable[[str, Exception], None]] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[GleanStats] = None,
+) -> Sequence[GleanPing]:
+    """Return the pings of every app in the Glean Dictionary, see `iter_glean_pings`."""
+    return list(iter_glean_pings(max_workers, timeout, on_error, snapshot, stats))
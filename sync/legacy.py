@@ -1,60 +1,318 @@
-from collections import defaultdict
-from dataclasses import dataclass
-from typing import Sequence, Dict
+import functools
+from dataclasses import dataclass, field
+import logging
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-import requests
 import tarfile
-from io import BytesIO
+
+from sync.archive import ArchiveCache, TarballStats, iter_tarball
+
+if TYPE_CHECKING:
+    from sync.snapshot import Snapshot
 
 SCHEMA_URL = "https://github.com/mozilla-services/mozilla-pipeline-schemas/archive/generated-schemas.tar.gz"  # noqa: E501
+SCHEMAS_PREFIX = "mozilla-pipeline-schemas-generated-schemas/schemas/"
+TELEMETRY_PREFIX = f"{SCHEMAS_PREFIX}telemetry/"
+# The project the pipeline writes the pings of every namespace to
+PINGS_PROJECT = "moz-fx-data-shared-prod"
+# Bump when the shape of the parsed ping schemas changes
+RESULT_KEY = "ping_schemas.v5"
+# Bump when the tables yielded for the BigQuery schemas change
+TABLES_RESULT_KEY = "ping_tables.v1"
+# Kinds of the records parsed from the generated schemas, see `_iter_ping_schemas`
+PING_RECORD = "ping"
+TABLES_RECORD = "tables"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LegacySchemaField:
+    path: str
+    type: str
+    mode: str
+    description: Optional[str] = None
 
 
 @dataclass
 class LegacyPing:
     name: str
     versions: Sequence[int]
+    # The latest version that has a BigQuery schema, and its fields
+    schema_version: Optional[int] = None
+    fields: Sequence[LegacySchemaField] = ()
 
     @property
     def bigquery_fully_qualified_names(self) -> Sequence[str]:
         table_names = []
         for version in self.versions:
             table_name = f"{self.name.replace('-', '_')}_v{version}"
-            table_names.append(f"moz-fx-data-shared-prod.telemetry_live.{table_name}")
+            table_names.append(f"{PINGS_PROJECT}.telemetry_live.{table_name}")
         return table_names
 
 
-def _get_ping_schemas() -> Dict[str, Sequence[str]]:
+@dataclass
+class SchemaStats:
+    """Fields and parse time of the schema versions parsed, by `<ping>.v<version>`."""
+
+    fields: Dict[str, int] = field(default_factory=dict)
+    parse_seconds: Dict[str, float] = field(default_factory=dict)
+
+
+def _parse_bq_schema(fp: BinaryIO) -> List[List[Optional[str]]]:
+    """
+    Flatten the BigQuery schema in `fp` into the path, type, mode and description
+    of every field, each record before its subfields.
+
+    The JSON is parsed as a stream of events rather than loaded, since the
+    schemas of the largest pings run into tens of megabytes.
+    """
+    import ijson
+
+    # The attributes and flattened subfields of every field being read
+    stack: List[Any] = [({}, [])]
+    # Whether every open JSON container is a "field", an array of "fields" or neither
+    containers: List[Optional[str]] = []
+    key = None
+    for event, value in ijson.basic_parse(fp):
+        if event == "map_key":
+            key = value
+        elif event == "string":
+            if containers[-1] == "field":
+                stack[-1][0][key] = value
+        elif event == "start_map":
+            if containers[-1] == "fields":
+                containers.append("field")
+                stack.append(({}, []))
+            else:
+                containers.append(None)
+        elif event == "end_map":
+            if containers.pop() == "field":
+                attributes, subfields = stack.pop()
+                name = attributes["name"]
+                flattened = stack[-1][1]
+                flattened.append(
+                    [
+                        name,
+                        attributes.get("type"),
+                        attributes.get("mode", "NULLABLE"),
+                        attributes.get("description"),
+                    ]
+                )
+                flattened.extend([f"{name}.{path}", *rest] for path, *rest in subfields)
+        elif event == "start_array":
+            if not containers or (containers[-1] == "field" and key == "fields"):
+                containers.append("fields")
+            else:
+                containers.append(None)
+        elif event == "end_array":
+            containers.pop()
+    return stack[0][1]
+
+
+def _member_tables(member_name: str) -> List[str]:
+    """
+    Return the qualified names of the live and stable tables of the document type
+    version whose BigQuery schema is `member_name`, if it is one.
+    """
+    if not (member_name.startswith(SCHEMAS_PREFIX) and member_name.endswith(".bq")):
+        return []
+    parts = member_name.removeprefix(SCHEMAS_PREFIX).split("/")
+    if len(parts) != 3:
+        return []
+
+    namespace, doctype, file_name = parts
+    version = file_name.split(".")[-2]
+    dataset = namespace.replace("-", "_")
+    table = f"{doctype.replace('-', '_')}_v{version}"
+    return [
+        f"{PINGS_PROJECT}.{dataset}_live.{table}",
+        f"{PINGS_PROJECT}.{dataset}_stable.{table}",
+    ]
+
+
+def _new_ping(name: str) -> Dict[str, Any]:
+    return {"name": name, "schemas": [], "schema_version": None, "fields": []}
+
+
+def _iter_ping_schemas(
+    tar: tarfile.TarFile,
+    stats: Optional[TarballStats] = None,
+    schema_stats: Optional[SchemaStats] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield every telemetry ping with its schema file names and the fields of its
+    latest BigQuery schema, as soon as the archive moves past its directory. Git
+    archives write the files of a directory together.
+
+    The tables of every namespace, as `_iter_ping_tables` yields them, are read in
+    the same pass. Every record is yielded with its kind, `PING_RECORD` for each
+    ping and `TABLES_RECORD` for the list of tables, which comes last.
     """
-    Fetches the latest version of the schema tarball from GitHub and returns a dict of ping names and their schema
-    versions.
+    ping: Dict[str, Any] = _new_ping("")
+    tables: List[str] = []
+    for member in tar:
+        tables += _member_tables(member.name)
+        if not member.name.startswith(TELEMETRY_PREFIX):
+            continue
+
+        *_, ping_name, file_name = member.name.split("/")
+        if not file_name.endswith((".schema.json", ".bq")):
+            continue
+        if stats is not None:
+            stats.members_matched += 1
+
+        if ping_name != ping["name"]:
+            # Pings are defined by their JSON schemas
+            if ping["schemas"]:
+                yield PING_RECORD, ping
+            ping = _new_ping(ping_name)
+
+        if file_name.endswith(".schema.json"):
+            ping["schemas"].append(file_name)
+            continue
+
+        start = time.perf_counter()
+        fields = _parse_bq_schema(tar.extractfile(member))
+        seconds = time.perf_counter() - start
+
+        version = int(file_name.split(".")[1])
+        if schema_stats is not None:
+            schema_stats.fields[f"{ping_name}.v{version}"] = len(fields)
+            schema_stats.parse_seconds[f"{ping_name}.v{version}"] = seconds
+        # Only the latest version is kept, for the ping's schema metadata
+        if ping["schema_version"] is None or version > ping["schema_version"]:
+            ping["schema_version"] = version
+            ping["fields"] = fields
+
+    if ping["schemas"]:
+        yield PING_RECORD, ping
+    yield TABLES_RECORD, tables
+
+
+def _fetch_ping_schemas(
+    cache: Optional[ArchiveCache] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+    schema_stats: Optional[SchemaStats] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Fetches the latest version of the schema tarball from GitHub and yields every ping with its schema versions,
+    and the fields of its latest BigQuery schema, as a `PING_RECORD`.
 
     Example:
     {
-        'account-ecosystem': ['account-ecosystem.4.schema.json'],
-        'android-anr-report': ['android-anr-report.1.schema.json', 'android-anr-report.2.schema.json'],  # noqa: E501
-        'anonymous': ['anonymous.4.schema.json'],
+        'name': 'account-ecosystem',
+        'schemas': ['account-ecosystem.4.schema.json'],
+        'schema_version': 4,
+        'fields': [['additional_properties', 'STRING', 'NULLABLE', 'A JSON string ...'], ...],  # noqa: E501
     }
+
+    The ping tables of every namespace come last, as a `TABLES_RECORD`.
     """
-    print("Fetching schemas from GitHub...")
-    schemas = requests.get(SCHEMA_URL)
-    schema_file = BytesIO(schemas.content)
-
-    with tarfile.open(fileobj=schema_file, mode="r|gz") as tar:
-        schema_versions = defaultdict(list)
-        for member in tar:
-            if member.name.startswith(
-                "mozilla-pipeline-schemas-generated-schemas/schemas/telemetry/"
-            ) and member.name.endswith(".schema.json"):
-                *_, ping_name, schema_name = member.name.split("/")
-                schema_versions[ping_name].append(schema_name)
-    return schema_versions
-
-
-def get_legacy_pings() -> Sequence[LegacyPing]:
-    pings = []
-    schema_versions = _get_ping_schemas()
-    for key, value in schema_versions.items():
-        pings.append(
-            LegacyPing(name=key, versions=[int(v.split(".")[1]) for v in value])
-        )
-    return pings
+    logger.info("Fetching schemas from GitHub...")
+    return iter_tarball(
+        SCHEMA_URL,
+        functools.partial(_iter_ping_schemas, stats=stats, schema_stats=schema_stats),
+        cache=cache,
+        result_key=RESULT_KEY,
+        snapshot=snapshot,
+        stats=stats,
+    )
+
+
+@dataclass
+class LegacyPingSchemas:
+    """
+    The telemetry pings of the generated schemas, read as they are iterated, and
+    the ping tables of every namespace, read in the same pass.
+    """
+
+    pings: Iterable[LegacyPing]
+    # Set once every ping has been iterated
+    tables: Optional[List[str]] = None
+
+
+def read_legacy_ping_schemas(
+    cache: Optional[ArchiveCache] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+    schema_stats: Optional[SchemaStats] = None,
+) -> LegacyPingSchemas:
+    records = _fetch_ping_schemas(cache, snapshot, stats, schema_stats)
+    schemas = LegacyPingSchemas(pings=[])
+
+    def iter_pings() -> Iterator[LegacyPing]:
+        for kind, value in records:
+            if kind == TABLES_RECORD:
+                schemas.tables = value
+                continue
+            yield LegacyPing(
+                name=value["name"],
+                versions=[int(v.split(".")[1]) for v in value["schemas"]],
+                schema_version=value["schema_version"],
+                fields=[LegacySchemaField(*f) for f in value["fields"]],
+            )
+
+    schemas.pings = iter_pings()
+    return schemas
+
+
+def iter_legacy_pings(
+    cache: Optional[ArchiveCache] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+    schema_stats: Optional[SchemaStats] = None,
+) -> Iterator[LegacyPing]:
+    return iter(read_legacy_ping_schemas(cache, snapshot, stats, schema_stats).pings)
+
+
+def get_legacy_pings(
+    cache: Optional[ArchiveCache] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+    schema_stats: Optional[SchemaStats] = None,
+) -> Sequence[LegacyPing]:
+    return list(iter_legacy_pings(cache, snapshot, stats, schema_stats))
+
+
+def _iter_ping_tables(
+    tar: tarfile.TarFile, stats: Optional[TarballStats] = None
+) -> Iterator[str]:
+    """
+    Yield the qualified names of the live and stable tables of every document
+    type version with a BigQuery schema, in every namespace.
+    """
+    for member in tar:
+        tables = _member_tables(member.name)
+        if tables and stats is not None:
+            stats.members_matched += 1
+        yield from tables
+
+
+def iter_ping_tables(
+    cache: Optional[ArchiveCache] = None,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[TarballStats] = None,
+) -> Iterator[str]:
+    """Yield the qualified names of the ping tables the generated schemas define."""
+    return iter_tarball(
+        SCHEMA_URL,
+        functools.partial(_iter_ping_tables, stats=stats),
+        cache=cache,
+        result_key=TABLES_RESULT_KEY,
+        snapshot=snapshot,
+        stats=stats,
+    )
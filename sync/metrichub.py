@@ -1,14 +1,47 @@
+import hashlib
+import importlib.metadata
+import json
+import logging
+import multiprocessing
 import re
-from datahub.emitter.mce_builder import make_term_urn
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
 
-import sqlglot as sqlglot
-from metric_config_parser.config import ConfigCollection
-from metric_config_parser.metric import MetricLevel
+# sqlglot, metric-config-parser and datahub's schema classes take most of the
+# import time of this module, so they are imported where they are used. With a
+# warm table reference cache, sqlglot isn't imported at all.
+if TYPE_CHECKING:
+    import sqlglot
+    from metric_config_parser.config import ConfigCollection
+    from metric_config_parser.metric import MetricLevel
+    from sqlglot.tokens import Token
+
+    from sync.snapshot import Snapshot
 
 METRIC_HUB_REPO_URL = "https://github.com/mozilla/metric-hub"
-LOOKER_METRICS_URL = "https://github.com/mozilla/metric-hub/tree/main/looker"
+LOOKER_METRICS_PATH = "looker"
+LOOKER_METRICS_URL = f"{METRIC_HUB_REPO_URL}/tree/main/{LOOKER_METRICS_PATH}"
+# Bump when `_extract_table_references` changes what it returns for the same SQL
+EXTRACTOR_VERSION = "table_references.v1"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MetricHubStats:
+    """Volume of reading metric-hub and where its time goes."""
+
+    # metric-config-parser clones and parses the definitions in one go
+    load_seconds: float = 0.0
+    # Resolving data sources and extracting the tables they reference
+    parse_seconds: float = 0.0
+    metrics: int = 0
+    data_sources: int = 0
+    # Data source SQL that wasn't in the table reference cache
+    sql_parsed: int = 0
 
 
 @dataclass
@@ -36,7 +69,7 @@ class MetricHubDefinition:
     sql_definition: str
     product: str
     owners: Optional[List[str]]
-    level: Optional[MetricLevel]
+    level: Optional["MetricLevel"]
     bigquery_tables: Optional[List[str]]
     data_source: Optional[str]
     statistics: Optional[List[MetricStatistic]]
@@ -51,6 +84,8 @@ class MetricHubDefinition:
             metric_name += " ⚠️"
 
         if self.level:
+            from metric_config_parser.metric import MetricLevel
+
             if self.level == MetricLevel.GOLD:
                 metric_name += " 🥇"
             elif self.level == MetricLevel.SILVER:
@@ -62,6 +97,8 @@ class MetricHubDefinition:
 
     @property
     def urn(self) -> str:
+        from datahub.emitter.mce_builder import make_term_urn
+
         return f"{make_term_urn(f'Metric Hub.{self.product}.{self.name}')}"
 
     @property
@@ -69,7 +106,7 @@ class MetricHubDefinition:
         return self.name.replace("_", " ").title()
 
 
-def _raw_table_name(table: sqlglot.exp.Table) -> str:
+def _raw_table_name(table: "sqlglot.exp.Table") -> str:
     """
     Adapted from bigquery-etl:
     https://github.com/mozilla/bigquery-etl/blob/12c27464b1d5c41f15a6d3d9e2463547164e3518/bigquery_etl/dependency.py#L21
@@ -81,14 +118,35 @@ def _raw_table_name(table: sqlglot.exp.Table) -> str:
     )
 
 
-def _extract_table_references(sql: str) -> List[str]:
-    """
-    Return a list of tables referenced in the given SQL. Adapted from bigquery-etl:
-    https://github.com/mozilla/bigquery-etl/blob/12c27464b1d5c41f15a6d3d9e2463547164e3518/bigquery_etl/dependency.py#L31
-    """
-    # sqlglot cannot handle scripts with variables and control statements
-    if re.search(r"^\s*DECLARE\b", sql, flags=re.MULTILINE):
-        return []
+# Token types are named rather than referenced, so sqlglot is only imported to
+# tokenize. Tokens making up the dot-separated parts of a table name:
+NAME_PART_TOKENS = {"VAR", "IDENTIFIER"}
+# Clauses that can follow the table of a single-FROM query without referencing
+# other tables, as long as the query contains no other SELECT.
+SIMPLE_QUERY_CLAUSES = {
+    "WHERE",
+    "GROUP_BY",
+    "HAVING",
+    "QUALIFY",
+    "WINDOW",
+    "ORDER_BY",
+    "LIMIT",
+}
+# Anything that may define or combine tables needs the full parse.
+COMPLEX_QUERY_TOKENS = {
+    "WITH",
+    "CREATE",
+    "JOIN",
+    "UNION",
+    "INTERSECT",
+    "EXCEPT",
+    "SEMICOLON",
+    "L_BRACE",
+    "R_BRACE",
+}
+
+
+def _normalize_sql(sql: str) -> str:
     # sqlglot parses UDFs with keyword names incorrectly:
     # https://github.com/tobymao/sqlglot/issues/1535
     sql = re.sub(
@@ -111,6 +169,105 @@ def _extract_table_references(sql: str) -> List[str]:
         sql,
         flags=re.IGNORECASE,
     )
+    return sql
+
+
+def _table_name_end(tokens: List["Token"], start: int) -> Optional[int]:
+    """
+    Return the index after the table name starting at `tokens[start]`.
+
+    Names are made of identifiers joined by dots, or dashes in project names, with
+    no whitespace in between.
+    """
+    separators = {"DOT", "DASH"}
+    end, previous = start, "DOT"
+    while end < len(tokens):
+        token = tokens[end]
+        if end > start and token.start != tokens[end - 1].end + 1:
+            break
+
+        if previous == "DASH":
+            expected = NAME_PART_TOKENS | {"NUMBER"}
+        elif previous == "DOT":
+            expected = NAME_PART_TOKENS
+        else:
+            expected = separators
+        if token.token_type.name not in expected:
+            break
+
+        previous = token.token_type.name
+        end += 1
+
+    if end == start or previous in separators:
+        return None
+    return end
+
+
+def _extract_simple_table_references(sql: str) -> Optional[List[str]]:
+    """
+    Resolve the tables of a bare table name or of a query selecting from a single
+    table from tokens alone, without building a syntax tree.
+
+    Returns None for anything else, which then needs a full parse.
+    """
+    import sqlglot
+
+    tokens = sqlglot.tokenize(sql, read="bigquery")
+    token_types = [token.token_type.name for token in tokens]
+    if not tokens or COMPLEX_QUERY_TOKENS.intersection(token_types):
+        return None
+
+    if _table_name_end(tokens, 0) == len(tokens):
+        # A bare name of up to four parts parses as a column, which is returned as is
+        if "DASH" in token_types or len(tokens) > 7:
+            return None
+        return [sql.replace("`", "")]
+
+    # A query wrapped in a subquery references the same tables
+    if token_types[0] == "L_PAREN" and token_types[-1] == "R_PAREN":
+        tokens, token_types = tokens[1:-1], token_types[1:-1]
+
+    if not tokens or token_types[0] != "SELECT" or token_types.count("SELECT") != 1:
+        return None
+
+    # A FROM nested in parentheses belongs to e.g. EXTRACT, not to the query
+    depth = 0
+    from_indexes = []
+    for index, token_type in enumerate(token_types):
+        if token_type == "L_PAREN":
+            depth += 1
+        elif token_type == "R_PAREN":
+            depth -= 1
+        elif token_type == "FROM" and depth == 0:
+            from_indexes.append(index)
+    if len(from_indexes) != 1:
+        return None
+    from_index = from_indexes[0]
+
+    name_start = from_index + 1
+    name_end = _table_name_end(tokens, name_start)
+    if name_end is None or token_types[name_start:name_end].count("DOT") > 2:
+        return None
+
+    rest = name_end
+    if rest < len(tokens) and token_types[rest] == "ALIAS":
+        rest += 1
+        if rest == len(tokens) or token_types[rest] not in NAME_PART_TOKENS:
+            return None
+        rest += 1
+    elif rest < len(tokens) and token_types[rest] in NAME_PART_TOKENS:
+        rest += 1
+    if rest < len(tokens) and token_types[rest] not in SIMPLE_QUERY_CLAUSES:
+        return None
+
+    start, end = tokens[name_start].start, tokens[name_end - 1].end + 1
+    name = sql[start:end]
+    return [name.replace("`", "")]
+
+
+def _parse_table_references(sql: str) -> List[str]:
+    import sqlglot
+
     query_statements = sqlglot.parse(sql, read="bigquery")
 
     # If there's only one statement, and it's a Column token, it's the table name:
@@ -137,12 +294,161 @@ def _extract_table_references(sql: str) -> List[str]:
     return sorted(tables)
 
 
-def get_metric_definitions() -> List[MetricHubDefinition]:
-    config_collection = ConfigCollection.from_github_repos(
-        [METRIC_HUB_REPO_URL, LOOKER_METRICS_URL]
+def _extract_table_references(sql: str) -> List[str]:
+    """
+    Return a list of tables referenced in the given SQL. Adapted from bigquery-etl:
+    https://github.com/mozilla/bigquery-etl/blob/12c27464b1d5c41f15a6d3d9e2463547164e3518/bigquery_etl/dependency.py#L31
+
+    Most data sources are a table name or a short query on a single table, which
+    are resolved from tokens. Only the rest goes through a full sqlglot parse.
+    """
+    # sqlglot cannot handle scripts with variables and control statements
+    if re.search(r"^\s*DECLARE\b", sql, flags=re.MULTILINE):
+        return []
+
+    sql = _normalize_sql(sql)
+    tables = _extract_simple_table_references(sql)
+    if tables is None:
+        tables = _parse_table_references(sql)
+    return tables
+
+
+class TableReferenceCache:
+    """
+    SQLite cache of `_extract_table_references` results that persists across runs.
+
+    Entries are keyed by a hash of the SQL text, the sqlglot version and
+    `EXTRACTOR_VERSION`, since changing either can change what gets extracted.
+    The least recently used entries beyond `max_entries` are evicted when the
+    cache is closed.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Read from the package metadata, so a fully cached run never imports sqlglot
+        self._sqlglot_version = importlib.metadata.version("sqlglot")
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS table_references (
+                key TEXT PRIMARY KEY,
+                tables TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+
+    def _key(self, sql: str) -> str:
+        key = f"{EXTRACTOR_VERSION}\0{self._sqlglot_version}\0{sql}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, sql: str) -> Optional[List[str]]:
+        key = self._key(sql)
+        row = self._connection.execute(
+            "SELECT tables FROM table_references WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._connection.execute(
+            "UPDATE table_references SET last_used = ? WHERE key = ?",
+            (time.time(), key),
+        )
+        return json.loads(row[0])
+
+    def put(self, sql: str, tables: List[str]) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO table_references VALUES (?, ?, ?)",
+            (self._key(sql), json.dumps(tables), time.time()),
+        )
+
+    def close(self) -> None:
+        self._connection.execute(
+            """
+            DELETE FROM table_references WHERE key NOT IN (
+                SELECT key FROM table_references ORDER BY last_used DESC LIMIT ?
+            )
+            """,
+            (self.max_entries,),
+        )
+        self._connection.commit()
+        self._connection.close()
+        logger.info(f"Table reference cache: {self.hits} hits, {self.misses} misses")
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """Return a pool of `workers` processes for CPU bound metric-hub work."""
+    # Forking copies the locks other threads hold, e.g. those of the other
+    # sources under `python -m sync.run`, so workers start from a clean process
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
     )
 
-    metrics = []
+
+def _get_table_references(
+    sqls: Iterable[str],
+    cache: Optional[TableReferenceCache] = None,
+    workers: int = 1,
+) -> Dict[str, List[str]]:
+    """
+    Return the tables referenced by each distinct SQL expression in `sqls`.
+
+    Expressions missing from `cache` are parsed by a pool of `workers` processes,
+    since sqlglot parsing is CPU bound.
+    """
+    table_references = {}
+    unparsed = []
+    for sql in dict.fromkeys(sqls):
+        tables = cache.get(sql) if cache is not None else None
+        if tables is None:
+            unparsed.append(sql)
+        else:
+            table_references[sql] = tables
+
+    if workers > 1 and len(unparsed) > 1:
+        with process_pool(workers) as executor:
+            parsed = list(executor.map(_extract_table_references, unparsed))
+    else:
+        parsed = [_extract_table_references(sql) for sql in unparsed]
+
+    for sql, tables in zip(unparsed, parsed):
+        table_references[sql] = tables
+        if cache is not None:
+            cache.put(sql, tables)
+    return table_references
+
+
+def _load_config_collection(snapshot: Optional["Snapshot"]) -> "ConfigCollection":
+    from metric_config_parser.config import ConfigCollection
+
+    if snapshot is None:
+        return ConfigCollection.from_github_repos(
+            [METRIC_HUB_REPO_URL, LOOKER_METRICS_URL]
+        )
+    with snapshot.checkout(METRIC_HUB_REPO_URL) as repo:
+        return ConfigCollection.from_github_repos(
+            [str(repo), str(repo / LOOKER_METRICS_PATH)]
+        )
+
+
+def get_metric_definitions(
+    table_reference_cache: Optional[TableReferenceCache] = None,
+    parse_workers: int = 1,
+    snapshot: Optional["Snapshot"] = None,
+    stats: Optional[MetricHubStats] = None,
+) -> List[MetricHubDefinition]:
+    start = time.perf_counter()
+    config_collection = _load_config_collection(snapshot)
+    loaded = time.perf_counter()
+
+    # Metrics on a platform often share a data source, so each one is resolved
+    # once per run and its SQL parsed in one batch afterwards
+    data_sources = {}
+    metric_data_sources = []
     for definition in config_collection.definitions:
         for (
             metric_name,
@@ -150,42 +456,77 @@ def get_metric_definitions() -> List[MetricHubDefinition]:
         ) in definition.spec.metrics.definitions.items():
             # Some metrics don't have data sources
             # (e.g. ad_click_rate, chained metric used in jetstream)
-            tables = None
-            datasource = None
+            data_source_key = None
             if metric.data_source is not None:
-                datasource = config_collection.get_data_source_definition(
-                    slug=metric.data_source.name, app_name=definition.platform
-                )
-                tables = [
-                    table.format(dataset=datasource.default_dataset)
-                    for table in _extract_table_references(datasource.from_expression)
-                ]
-
-            statistics = []
-            if metric.statistics is not None:
-                for statistic_name, _ in metric.statistics.items():
-                    statistics.append(MetricStatistic(name=statistic_name))
-
-            metrics.append(
-                MetricHubDefinition(
-                    name=metric.name,
-                    description=metric.description or "",
-                    owners=(
-                        [metric.owner]
-                        if isinstance(metric.owner, str)
-                        else metric.owner
-                    ),
-                    level=metric.level if metric.level else None,
-                    friendly_name=(
-                        metric.friendly_name if metric.friendly_name else None
-                    ),
-                    deprecated=metric.deprecated or False,
-                    sql_definition=metric.select_expression,
-                    product=definition.platform,
-                    bigquery_tables=tables,
-                    statistics=statistics,
-                    data_source=datasource.name if datasource else None,
-                )
+                data_source_key = (definition.platform, metric.data_source.name)
+                if data_source_key not in data_sources:
+                    data_sources[data_source_key] = (
+                        config_collection.get_data_source_definition(
+                            slug=metric.data_source.name, app_name=definition.platform
+                        )
+                    )
+            metric_data_sources.append((definition, metric, data_source_key))
+
+    misses = table_reference_cache.misses if table_reference_cache else 0
+    table_references = _get_table_references(
+        (datasource.from_expression for datasource in data_sources.values()),
+        table_reference_cache,
+        parse_workers,
+    )
+    if stats is not None:
+        stats.load_seconds += loaded - start
+        stats.parse_seconds += time.perf_counter() - loaded
+        stats.data_sources += len(data_sources)
+        stats.sql_parsed += (
+            table_reference_cache.misses - misses
+            if table_reference_cache
+            else len(table_references)
+        )
+    data_source_tables = {
+        key: [
+            table.format(dataset=datasource.default_dataset)
+            for table in table_references[datasource.from_expression]
+        ]
+        for key, datasource in data_sources.items()
+    }
+
+    lookups = sum(key is not None for _, _, key in metric_data_sources)
+    logger.info(
+        f"Resolved {len(data_sources)} data sources for {lookups} metrics, "
+        f"saving {lookups - len(data_sources)} data source lookups and "
+        f"{lookups - len(table_references)} table reference extractions"
+    )
+
+    metrics = []
+    for definition, metric, data_source_key in metric_data_sources:
+        datasource = data_sources.get(data_source_key)
+        tables = None
+        if data_source_key is not None:
+            tables = list(data_source_tables[data_source_key])
+
+        statistics = []
+        if metric.statistics is not None:
+            for statistic_name, _ in metric.statistics.items():
+                statistics.append(MetricStatistic(name=statistic_name))
+
+        metrics.append(
+            MetricHubDefinition(
+                name=metric.name,
+                description=metric.description or "",
+                owners=(
+                    [metric.owner] if isinstance(metric.owner, str) else metric.owner
+                ),
+                level=metric.level if metric.level else None,
+                friendly_name=metric.friendly_name if metric.friendly_name else None,
+                deprecated=metric.deprecated or False,
+                sql_definition=metric.select_expression,
+                product=definition.platform,
+                bigquery_tables=tables,
+                statistics=statistics,
+                data_source=datasource.name if datasource else None,
             )
+        )
 
+    if stats is not None:
+        stats.metrics += len(metrics)
     return metrics
@@ -0,0 +1,66 @@
+"""Runs an upstream fetcher ahead of the code consuming what it fetches."""
+
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+# How many items a fetcher may get ahead of its consumer by default
+DEFAULT_MAX_ITEMS = 256
+# How often a fetcher blocked on a full queue checks whether it should stop
+POLL_SECONDS = 0.1
+
+T = TypeVar("T")
+
+_ITEM, _ERROR, _DONE = range(3)
+
+
+def prefetch(iterable: Iterable[T], max_items: int = DEFAULT_MAX_ITEMS) -> Iterator[T]:
+    """
+    Yield the items of `iterable`, which is iterated on a thread of its own.
+
+    The thread gets at most `max_items` ahead of the consumer and then waits for
+    it, so fetching overlaps with the use of what was fetched without holding
+    all of it in memory. Exceptions raised by `iterable` are raised here. When
+    this generator is closed early, `iterable` is closed at its next item.
+    """
+    items: "queue.Queue" = queue.Queue(maxsize=max_items)
+    stopped = threading.Event()
+
+    def put(kind: int, value=None) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put((kind, value), timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put(_ITEM, item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_ERROR, e)
+        finally:
+            # Generators release their files and connections when closed
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, name="prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == _ITEM:
+                yield value
+            elif kind == _ERROR:
+                raise value
+            else:
+                return
+    finally:
+        stopped.set()
+        producer.join()
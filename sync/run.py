@@ -0,0 +1,278 @@
+"""
+Runs several ingestion recipes in one process.
+
+Every source runs in its own thread and their records are written to a single
+sink, so a nightly sync pays for one interpreter start, one import of the
+datahub package and one connection pool to GMS. Upstream fetches share the
+pool of `sync.session.get_session()`. All recipes must configure the same sink.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import glob
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from typing import List, Optional, Type
+
+from datahub.configuration.config_loader import load_config_file
+from datahub.ingestion.api.committable import CommitPolicy
+from datahub.ingestion.api.common import PipelineContext, RecordEnvelope
+from datahub.ingestion.api.sink import Sink, WriteCallback
+from datahub.ingestion.api.source import Source
+from datahub.ingestion.fs.fs_registry import fs_registry
+from datahub.ingestion.extractor.mce_extractor import (
+    WorkUnitRecordExtractor,
+    WorkUnitRecordExtractorConfig,
+)
+from datahub.ingestion.graph.client import DataHubGraph
+from datahub.ingestion.run.pipeline_config import PipelineConfig
+from datahub.ingestion.sink.datahub_rest import DatahubRestSink
+from datahub.ingestion.sink.sink_registry import sink_registry
+from datahub.ingestion.source.source_registry import source_registry
+from datahub.ingestion.source.state_provider.state_provider_registry import (
+    ingestion_checkpoint_provider_registry,
+)
+
+from sync.datahub.batch_sink import BatchRestSink
+
+RECIPES = "recipes/*.dhub.yaml"
+# Records waiting for the sink, which bounds memory when sources outpace GMS.
+QUEUE_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+# How often a source thread waiting on a full queue checks whether to stop
+STOP_CHECK_SECONDS = 1.0
+
+# Put on the queue by a source thread once it has no more records
+_DONE = object()
+
+
+class _Stopped(Exception):
+    """Raised in a source thread once the records it produces are no longer read."""
+
+
+def _put(records: queue.Queue, item: tuple, stop: threading.Event) -> None:
+    """Put `item` on `records`, unless `stop` is set while waiting for room."""
+    while not stop.is_set():
+        try:
+            records.put(item, timeout=STOP_CHECK_SECONDS)
+            return
+        except queue.Full:
+            continue
+    raise _Stopped("Records are no longer written to the sink")
+
+
+@dataclass
+class SourceRun:
+    recipe: str
+    config: PipelineConfig
+    source: Optional[Source] = None
+    ctx: Optional[PipelineContext] = None
+    error: Optional[Exception] = None
+    write_failures: int = 0
+    duration: float = 0.0
+
+    @property
+    def failed(self) -> bool:
+        return bool(
+            self.error
+            or self.write_failures
+            or (self.source and self.source.get_report().failures)
+        )
+
+
+class _WriteCallback(WriteCallback):
+    _lock = threading.Lock()
+
+    def __init__(self, run: SourceRun):
+        self.run = run
+
+    def on_success(self, record_envelope: RecordEnvelope, success_metadata) -> None:
+        pass
+
+    def on_failure(
+        self, record_envelope: RecordEnvelope, failure_exception, failure_metadata
+    ) -> None:
+        with self._lock:
+            self.run.write_failures += 1
+        logger.error(
+            f"{self.run.recipe}: failed to write "
+            f"{record_envelope.metadata.get('workunit_id')}: {failure_exception}"
+        )
+
+
+def _run_source(
+    run: SourceRun,
+    source_class: Type[Source],
+    graph: Optional[DataHubGraph],
+    records: queue.Queue,
+    stop: threading.Event,
+) -> None:
+    start = time.perf_counter()
+    run.ctx = PipelineContext(
+        run_id=run.config.run_id,
+        graph=graph,
+        pipeline_name=run.config.pipeline_name,
+    )
+    try:
+        run.source = source_class.create(
+            run.config.source.dict().get("config", {}), run.ctx
+        )
+        extractor = WorkUnitRecordExtractor(WorkUnitRecordExtractorConfig(), run.ctx)
+        with run.source:
+            for wu in run.source.get_workunits():
+                try:
+                    for record_envelope in extractor.get_records(wu):
+                        _put(records, (run, record_envelope), stop)
+                except Exception as e:
+                    run.source.get_report().failure(
+                        "Source produced bad metadata", context=wu.id, exc=e
+                    )
+    except _Stopped as e:
+        run.error = e
+    except Exception as e:
+        logger.exception(f"{run.recipe} failed")
+        run.error = e
+    finally:
+        run.duration = time.perf_counter() - start
+        if not stop.is_set():
+            _put(records, (run, _DONE), stop)
+
+
+def _commit(run: SourceRun) -> None:
+    """
+    Commit the stateful ingestion checkpoint, and anything else the source
+    registered to be committed, of a run whose records were all written.
+    """
+    if run.ctx is None or run.failed:
+        return
+
+    has_warnings = bool(run.source.get_report().warnings)
+    for name, committable in run.ctx.get_committables():
+        if (
+            committable.commit_policy == CommitPolicy.ON_NO_ERRORS_AND_NO_WARNINGS
+            and has_warnings
+        ):
+            logger.warning(f"{run.recipe}: not committing {name}, which had warnings")
+            continue
+        try:
+            committable.commit()
+        except Exception as e:
+            logger.exception(f"{run.recipe}: failed to commit {name}")
+            run.error = e
+            return
+
+
+def _create_sink(runs: List[SourceRun]) -> Sink:
+    sink_configs = {
+        json.dumps(run.config.sink.dict() if run.config.sink else None, sort_keys=True)
+        for run in runs
+    }
+    sink_config = runs[0].config.sink
+    if len(sink_configs) != 1 or sink_config is None:
+        raise ValueError("All recipes must configure the same sink")
+
+    ctx = PipelineContext(run_id=f"sync-{time.strftime('%Y_%m_%d-%H_%M_%S')}")
+    return sink_registry.get(sink_config.type).create(
+        sink_config.dict().get("config") or {}, ctx
+    )
+
+
+def run_recipes(recipe_paths: List[str]) -> List[SourceRun]:
+    """Run the sources of all recipes concurrently, writing to their shared sink."""
+    runs = [
+        SourceRun(recipe=path, config=PipelineConfig.from_dict(load_config_file(path)))
+        for path in recipe_paths
+    ]
+    # Plugin registries load their entry points on first use, which isn't thread
+    # safe, so everything the sources look up is loaded before they start
+    source_classes = [source_registry.get(run.config.source.type) for run in runs]
+    for registry in (fs_registry, ingestion_checkpoint_provider_registry):
+        registry.mapping
+    sink = _create_sink(runs)
+    # Stateful ingestion reads its checkpoints from GMS
+    graph: Optional[DataHubGraph] = None
+    if isinstance(sink, DatahubRestSink):
+        graph = sink.emitter.to_graph()
+    elif isinstance(sink, BatchRestSink):
+        graph = sink.to_graph()
+
+    records: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    callbacks = {run.recipe: _WriteCallback(run) for run in runs}
+    # Set if the records stop being read, so blocked sources give up before the
+    # executor waits for them
+    stop = threading.Event()
+    with sink, ThreadPoolExecutor(max_workers=len(runs)) as executor:
+        for run, source_class in zip(runs, source_classes):
+            executor.submit(_run_source, run, source_class, graph, records, stop)
+
+        try:
+            running = len(runs)
+            while running:
+                run, record_envelope = records.get()
+                if record_envelope is _DONE:
+                    logger.info(f"{run.recipe} finished in {run.duration:.1f}s")
+                    running -= 1
+                    continue
+                try:
+                    sink.write_record_async(record_envelope, callbacks[run.recipe])
+                except Exception as e:
+                    callbacks[run.recipe].on_failure(record_envelope, e, {})
+        finally:
+            stop.set()
+
+    # Closing the sink waits for its last writes, which can still fail a run.
+    # Closing the source produced its checkpoint, which is only committed now.
+    for run in runs:
+        _commit(run)
+    _print_report(runs, sink)
+    return runs
+
+
+def _print_report(runs: List[SourceRun], sink: Sink) -> None:
+    for run in runs:
+        if run.source is not None:
+            print(f"Source report for {run.recipe}:")
+            print(run.source.get_report().as_string())
+    print("Sink report:")
+    print(sink.get_report().as_string())
+
+    print("Summary:")
+    for run in runs:
+        if run.error is not None:
+            status = f"error: {run.error}"
+        else:
+            report = run.source.get_report()
+            status = (
+                f"{report.events_produced} work units, "
+                f"{len(report.warnings)} warnings, {len(report.failures)} failures, "
+                f"{run.write_failures} write failures"
+            )
+        print(f"  {run.recipe} ({run.duration:.1f}s): {status}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "recipes",
+        nargs="*",
+        help=f"Recipes to run, by default all of {RECIPES}",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s"
+    )
+
+    runs = run_recipes(args.recipes or sorted(glob.glob(RECIPES)))
+    if any(run.failed for run in runs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Pooled HTTP sessions for fetching upstream metadata."""
+
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Seconds to wait for a connection or for the next byte of a response.
+DEFAULT_TIMEOUT = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Enough connections for every source of a `sync.run` to fetch concurrently.
+SHARED_POOL_SIZE = 32
+
+_shared_session: Optional[requests.Session] = None
+_shared_session_lock = threading.Lock()
+
+
+def build_session(
+    pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5
+) -> requests.Session:
+    """
+    Return a session whose connection pool fits `pool_size` concurrent requests.
+
+    Failed connections and retryable statuses are retried `retries` times, waiting
+    `backoff_factor * 2 ** attempt` seconds in between.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the session shared by all upstream fetches in this process."""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = build_session(pool_size=SHARED_POOL_SIZE)
+        return _shared_session
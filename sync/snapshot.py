@@ -0,0 +1,226 @@
+"""
+Captures upstream responses to a directory, so sources can replay them offline.
+
+    python -m sync.snapshot .cache/snapshot
+
+fetches everything the sources read from GitHub and the Glean Dictionary, and
+every source accepts a `snapshot_dir` to read it from there instead.
+"""
+
+import argparse
+import contextlib
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional
+
+from sync.bigquery_etl import REPO_ARCHIVE
+from sync.glean import get_glean_pings
+from sync.legacy import SCHEMA_URL
+from sync.metrichub import METRIC_HUB_REPO_URL
+from sync.session import DEFAULT_TIMEOUT, get_session
+
+INDEX_FILENAME = "index.json"
+RESPONSES_FILENAME = "responses.json.gz"
+BLOBS_DIRNAME = "blobs"
+# How much of a response is copied to its blob at a time.
+CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def _check_member(member: tarfile.TarInfo, path: Path) -> None:
+    """Raise if extracting `member` into `path` could write outside of it."""
+    root = path.resolve()
+    target = (root / member.name).resolve()
+    if os.path.isabs(member.name) or not target.is_relative_to(root):
+        raise tarfile.TarError(f"{member.name} is outside of the archive")
+    if member.issym():
+        link_target = (target.parent / member.linkname).resolve()
+    elif member.islnk():
+        link_target = (root / member.linkname).resolve()
+    elif member.isfile() or member.isdir():
+        return
+    else:
+        raise tarfile.TarError(f"{member.name} isn't a file, directory or link")
+    if os.path.isabs(member.linkname) or not link_target.is_relative_to(root):
+        raise tarfile.TarError(f"{member.name} links outside of the archive")
+
+
+def _extract_all(tar: tarfile.TarFile, path: Path) -> None:
+    """Extract `tar` into `path`, refusing members that would escape it."""
+    # Extraction filters only exist from Python 3.10.12 and 3.11.4
+    if hasattr(tarfile, "data_filter"):
+        tar.extractall(path, filter="data")
+        return
+
+    members = tar.getmembers()
+    for member in members:
+        _check_member(member, path)
+    tar.extractall(path, members=members)
+
+
+class Snapshot:
+    """
+    Upstream responses captured in a directory and replayed from it.
+
+    Tarballs are kept as they were downloaded, git repositories as gzipped
+    tarballs of a shallow clone, and JSON responses are packed together into one
+    gzipped JSON document. Reading anything that wasn't captured raises KeyError.
+
+    With `record`, everything read is fetched from upstream and added to the
+    snapshot, which is written when it is closed. Entries of earlier captures
+    that aren't fetched again are kept.
+    """
+
+    def __init__(self, directory: str, record: bool = False):
+        self.directory = Path(directory)
+        self.record = record
+        self._lock = threading.Lock()
+
+        index_path = self.directory / INDEX_FILENAME
+        self._index: Dict[str, Dict[str, Any]] = {}
+        if index_path.exists():
+            self._index = json.loads(index_path.read_text())
+        elif not record:
+            raise FileNotFoundError(f"No snapshot in {self.directory}")
+        self._responses: Optional[Dict[str, Any]] = None
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _entry(self, url: str) -> Dict[str, Any]:
+        entry = self._index.get(url)
+        if entry is None:
+            raise KeyError(f"{url} isn't in the snapshot in {self.directory}")
+        return entry
+
+    def _blob_path(self, url: str) -> Path:
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / BLOBS_DIRNAME / f"{digest}.tar.gz"
+
+    @contextlib.contextmanager
+    def _write_blob(self, url: str) -> Iterator[BinaryIO]:
+        """Write the blob of `url`, which is only added once it is complete."""
+        path = self._blob_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                yield f
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._index[url] = {"blob": path.name, "captured_at": time.time()}
+        logger.info(f"Captured {url}")
+
+    def _load_responses(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._responses is None:
+                path = self.directory / RESPONSES_FILENAME
+                self._responses = {}
+                if path.exists():
+                    with gzip.open(path, "rt") as f:
+                        self._responses = json.load(f)
+            return self._responses
+
+    def open(self, url: str) -> BinaryIO:
+        """Return the body of the tarball at `url`."""
+        if self.record:
+            with get_session().get(
+                url, stream=True, timeout=DEFAULT_TIMEOUT
+            ) as response, self._write_blob(url) as f:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, f, CHUNK_SIZE)
+        return open(self.directory / BLOBS_DIRNAME / self._entry(url)["blob"], "rb")
+
+    def get_json(self, url: str, fetch: Callable[[str], Any]) -> Any:
+        """Return the JSON document at `url`, which `fetch` gets when recording."""
+        responses = self._load_responses()
+        if self.record:
+            data = fetch(url)
+            with self._lock:
+                responses[url] = data
+                self._index[url] = {"captured_at": time.time()}
+            return data
+
+        self._entry(url)
+        return responses[url]
+
+    @contextlib.contextmanager
+    def checkout(self, repo_url: str) -> Iterator[Path]:
+        """Check out the default branch of the git repository at `repo_url`."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "repo"
+            if self.record:
+                subprocess.run(
+                    ["git", "clone", "--quiet", "--depth", "1", repo_url, str(path)],
+                    check=True,
+                )
+                with self._write_blob(repo_url) as f, tarfile.open(
+                    fileobj=f, mode="w:gz"
+                ) as tar:
+                    tar.add(path, arcname=".")
+            else:
+                blob = self.directory / BLOBS_DIRNAME / self._entry(repo_url)["blob"]
+                with tarfile.open(blob) as tar:
+                    _extract_all(tar, path)
+            yield path
+
+    def close(self) -> None:
+        if not self.record:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._responses is not None:
+            with gzip.open(self.directory / RESPONSES_FILENAME, "wt") as f:
+                json.dump(self._responses, f)
+        # Blobs are complete before they are indexed, so the index is always valid
+        (self.directory / INDEX_FILENAME).write_text(
+            json.dumps(self._index, indent=2, sort_keys=True)
+        )
+
+
+def capture(directory: str) -> int:
+    """Capture everything the sources fetch and return the number of failures."""
+    failures = []
+    with Snapshot(directory, record=True) as snapshot:
+        for url in (REPO_ARCHIVE, SCHEMA_URL):
+            snapshot.open(url).close()
+        get_glean_pings(snapshot=snapshot, on_error=lambda app, e: failures.append(app))
+        with snapshot.checkout(METRIC_HUB_REPO_URL):
+            pass
+
+    for app in failures:
+        logger.error(f"Failed to capture the Glean app {app}")
+    return len(failures)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("directory", help="Directory to write the snapshot to")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if capture(args.directory):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
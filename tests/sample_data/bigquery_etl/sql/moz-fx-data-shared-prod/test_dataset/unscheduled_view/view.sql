@@ -0,0 +1,7 @@
+CREATE OR REPLACE VIEW
+  `moz-fx-data-shared-prod.test_dataset.unscheduled_view`
+AS
+SELECT
+  *
+FROM
+  `moz-fx-data-shared-prod.test_dataset.test_table`
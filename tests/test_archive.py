@@ -0,0 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import gzip
+import io
+import tarfile
+import time
+from typing import BinaryIO, Dict
+from unittest.mock import MagicMock, patch
+
+from sync.archive import (
+    ARCHIVE_FILENAME,
+    ArchiveCache,
+    TarballStats,
+    iter_tarball,
+    read_tarball,
+)
+
+
+@dataclass
+class MockApiResponse:
+    raw: BinaryIO
+    status_code: int = 200
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.raw.close()
+
+
+def _archive(*names) -> bytes:
+    fp = io.BytesIO()
+    with tarfile.open(fileobj=fp, mode="w:gz") as tar:
+        for name in names:
+            tar.addfile(tarfile.TarInfo(name))
+    return fp.getvalue()
+
+
+def _member_names(tar: tarfile.TarFile):
+    return [member.name for member in tar]
+
+
+def _member_count(tar: tarfile.TarFile):
+    return len(_member_names(tar))
+
+
+@patch("requests.Session.get")
+def test_read_tarball_without_cache(mock_get):
+    mock_get.side_effect = [MockApiResponse(io.BytesIO(_archive("a", "b")))]
+
+    assert read_tarball("https://example.com/a.tar.gz", _member_names) == ["a", "b"]
+
+
+@patch("requests.Session.get")
+def test_read_tarball_records_stats(mock_get):
+    archive = _archive("a", "b", "c")
+    mock_get.side_effect = [MockApiResponse(io.BytesIO(archive))]
+    stats = TarballStats()
+
+    read_tarball("https://example.com/a.tar.gz", _member_names, stats=stats)
+
+    assert stats.members_scanned == 3
+    assert stats.downloaded_bytes == len(archive)
+    assert stats.decompressed_bytes == len(gzip.decompress(archive))
+    assert stats.download_seconds >= 0 and stats.decompress_seconds >= 0
+
+
+@patch("requests.Session.get")
+def test_archive_cache_revalidates(mock_get, tmp_path):
+    url = "https://example.com/a.tar.gz"
+    cache = ArchiveCache(tmp_path)
+    parse = MagicMock(side_effect=_member_names)
+    mock_get.side_effect = [
+        MockApiResponse(io.BytesIO(_archive("a", "b")), headers={"ETag": '"v1"'}),
+        MockApiResponse(io.BytesIO(), status_code=304),
+    ]
+
+    assert read_tarball(url, parse, cache=cache, result_key="names") == ["a", "b"]
+    assert read_tarball(url, parse, cache=cache, result_key="names") == ["a", "b"]
+
+    # The second request is conditional and its result comes from the cache
+    assert mock_get.call_args_list[1].kwargs["headers"] == {"If-None-Match": '"v1"'}
+    assert parse.call_count == 1
+
+
+@patch("requests.Session.get")
+def test_archive_cache_reparses_cached_archive_for_new_key(mock_get, tmp_path):
+    url = "https://example.com/a.tar.gz"
+    cache = ArchiveCache(tmp_path)
+    mock_get.side_effect = [
+        MockApiResponse(io.BytesIO(_archive("a")), headers={"ETag": '"v1"'}),
+        MockApiResponse(io.BytesIO(), status_code=304),
+    ]
+
+    read_tarball(url, _member_names, cache=cache, result_key="names")
+    result = read_tarball(url, _member_count, cache=cache, result_key="count")
+
+    assert result == 1
+
+
+@patch("requests.Session.get")
+def test_archive_cache_only_keeps_items_read_to_the_end(mock_get, tmp_path):
+    url = "https://example.com/a.tar.gz"
+    cache = ArchiveCache(tmp_path)
+    mock_get.side_effect = [
+        MockApiResponse(io.BytesIO(_archive("a", "b")), headers={"ETag": '"v1"'}),
+        MockApiResponse(io.BytesIO(_archive("a", "b")), headers={"ETag": '"v1"'}),
+        MockApiResponse(io.BytesIO(), status_code=304),
+    ]
+
+    def read():
+        return iter_tarball(url, _member_names, cache=cache, result_key="names")
+
+    items = read()
+    assert next(items) == "a"
+    items.close()
+    assert list((tmp_path / "objects").iterdir()) == []
+
+    assert list(read()) == ["a", "b"]
+    # Nothing was kept of the first read, so the second request isn't conditional
+    assert mock_get.call_args_list[1].kwargs["headers"] == {}
+    assert list(read()) == ["a", "b"]
+
+
+@patch("requests.Session.get")
+def test_archive_cache_evicts_least_recently_used(mock_get, tmp_path):
+    first, second = _archive("a"), _archive("b")
+    cache = ArchiveCache(tmp_path, max_bytes=len(second) + 10)
+    mock_get.side_effect = [
+        MockApiResponse(io.BytesIO(first), headers={"ETag": '"v1"'}),
+        MockApiResponse(io.BytesIO(second), headers={"ETag": '"v2"'}),
+    ]
+
+    for url in ["https://example.com/a.tar.gz", "https://example.com/b.tar.gz"]:
+        read_tarball(url, _member_count, cache=cache, result_key="count")
+
+    archives = list((tmp_path / "objects").glob(f"*/{ARCHIVE_FILENAME}"))
+    assert [archive.read_bytes() for archive in archives] == [second]
+
+
+@patch("requests.Session.get")
+def test_archive_cache_reads_url_once_at_a_time(mock_get, tmp_path):
+    url = "https://example.com/a.tar.gz"
+    mock_get.side_effect = [
+        MockApiResponse(io.BytesIO(_archive("a", "b")), headers={"ETag": '"v1"'}),
+        MockApiResponse(io.BytesIO(), status_code=304),
+    ]
+    names = ArchiveCache(tmp_path).iter(url, _member_names, "names")
+    assert next(names) == "a"
+
+    # Another source sharing the cache waits for the download to finish
+    with ThreadPoolExecutor(1) as executor:
+        count = executor.submit(
+            read_tarball, url, _member_count, ArchiveCache(tmp_path), "count"
+        )
+        time.sleep(0.2)
+        assert not count.done() and mock_get.call_count == 1
+
+        assert list(names) == ["b"]
+        assert count.result(timeout=10) == 2
+
+    assert mock_get.call_args_list[1].kwargs["headers"] == {"If-None-Match": '"v1"'}
@@ -0,0 +1,159 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from typing import List, Optional
+
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
+from datahub.ingestion.api.common import PipelineContext, RecordEnvelope
+from datahub.ingestion.api.sink import WriteCallback
+from datahub.metadata.schema_classes import StatusClass
+
+from sync.datahub.batch_sink import BatchRestSink
+
+
+class FakeGms:
+    """
+    Local stand-in for the ingestProposalBatch endpoint of GMS, answering with
+    `statuses` in turn and then 200, after `latency` seconds.
+    """
+
+    def __init__(
+        self,
+        statuses: List[int] = (),
+        retry_after: Optional[str] = None,
+        latency: float = 0.0,
+    ):
+        self.statuses = list(statuses)
+        self.proposals: List[dict] = []
+        self.requests = 0
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._lock = threading.Lock()
+        gms = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with gms._lock:
+                    gms.requests += 1
+                    gms._concurrent += 1
+                    gms.max_concurrent = max(gms.max_concurrent, gms._concurrent)
+                    status = gms.statuses.pop(0) if gms.statuses else 200
+                    if status == 200:
+                        gms.proposals += body["proposals"]
+                time.sleep(latency)
+                with gms._lock:
+                    gms._concurrent -= 1
+
+                self.send_response(status)
+                if retry_after is not None and status != 200:
+                    self.send_header("Retry-After", retry_after)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> "FakeGms":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class RecordingCallback(WriteCallback):
+    def __init__(self):
+        self.succeeded = 0
+        self.failed: List[Exception] = []
+
+    def on_success(self, record_envelope, success_metadata):
+        self.succeeded += 1
+
+    def on_failure(self, record_envelope, failure_exception, failure_metadata):
+        self.failed.append(failure_exception)
+
+
+def _write(gms: FakeGms, records: int, **config) -> BatchRestSink:
+    sink = BatchRestSink.create(
+        {"server": gms.url, "backoff_sec": 0.01, **config},
+        PipelineContext(run_id="test"),
+    )
+    callback = RecordingCallback()
+    for i in range(records):
+        mcp = MetadataChangeProposalWrapper(
+            entityUrn=f"urn:li:corpuser:user{i}", aspect=StatusClass(removed=False)
+        )
+        sink.write_record_async(RecordEnvelope(mcp, metadata={}), callback)
+    sink.close()
+    sink.callback = callback
+    return sink
+
+
+def test_batch_sink_groups_proposals_into_batches():
+    with FakeGms() as gms:
+        sink = _write(gms, 250, max_batch_size=100)
+
+    assert gms.requests == 3
+    assert len(gms.proposals) == 250
+    assert gms.proposals[0]["entityUrn"] == "urn:li:corpuser:user0"
+    assert gms.proposals[0]["aspectName"] == "status"
+    assert sink.callback.succeeded == 250
+    report = sink.get_report()
+    assert report.batches_sent == 3 and report.total_records_written == 250
+    assert set(report.as_obj()["batch_latency_seconds"]) == {"p50", "p95", "max"}
+
+
+def test_batch_sink_limits_batches_in_flight():
+    with FakeGms(latency=0.05) as gms:
+        _write(gms, 200, max_batch_size=10, max_in_flight=4)
+
+    assert 1 < gms.max_concurrent <= 4
+
+
+def test_batch_sink_retries_throttled_batches():
+    with FakeGms(statuses=[429, 503]) as gms:
+        sink = _write(gms, 10, max_in_flight=4)
+
+    assert gms.requests == 3
+    assert len(gms.proposals) == 10
+    assert sink.callback.succeeded == 10
+    report = sink.get_report()
+    assert report.batches_throttled == 2
+    # Halved twice, then allowed one more batch by the one accepted
+    assert report.in_flight_limit == 2
+
+
+def test_batch_sink_pauses_for_retry_after():
+    with FakeGms(statuses=[429], retry_after="0.3") as gms:
+        start = time.perf_counter()
+        sink = _write(gms, 10)
+
+    assert time.perf_counter() - start >= 0.3
+    assert sink.callback.succeeded == 10
+
+
+def test_batch_sink_fails_batch_after_retries():
+    with FakeGms(statuses=[503] * 3) as gms:
+        sink = _write(gms, 10, max_retries=2)
+
+    assert gms.requests == 3
+    assert sink.callback.succeeded == 0 and len(sink.callback.failed) == 10
+    assert sink.get_report().batches_failed == 1
+
+
+def test_batch_sink_does_not_retry_rejected_batch():
+    with FakeGms(statuses=[400]) as gms:
+        sink = _write(gms, 10)
+
+    assert gms.requests == 1
+    assert len(sink.callback.failed) == 10
+    assert len(sink.get_report().failures) == 1
@@ -1,30 +1,71 @@
+import io
 import os
 from dataclasses import dataclass
 from pathlib import Path
+import shutil
+import subprocess
 import tempfile
+import tracemalloc
+from typing import BinaryIO
 from unittest.mock import patch
 
-from sync.bigquery_etl import get_bigquery_etl_table_references
+from datahub.ingestion.api.common import PipelineContext
+import pytest
+
+from sync.bigquery_etl import (
+    GENERATED_SQL_BRANCH,
+    REPO_URL,
+    WTMO_URL,
+    _iter_table_references,
+    get_bigquery_etl_table_references,
+    get_changed_table_references,
+)
+from sync.checkout import GitCheckout
+from sync.datahub.bigquery_etl_source import BigQueryEtlSource
 import tarfile
 
+import yaml
+
 
 @dataclass
 class MockApiResponse:
-    content: bytes
+    raw: BinaryIO
 
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.raw.close()
 
-@patch("requests.get")
-def test_get_legacy_pings(mock_get):
-    with tempfile.NamedTemporaryFile(suffix=".tar.gz") as fp:
-        with tarfile.open(fileobj=fp, mode="w:gz") as tar:
 
-            tar.add(
-                Path("tests/sample_data/bigquery_etl"),
-                arcname=os.path.basename("bigquery-etl-generated-sql"),
-            )
+class RandomReader:
+    """Incompressible file-like payload, so archive size tracks member size."""
 
-        fp.seek(0)
-        mock_get.side_effect = [MockApiResponse(fp.read())]
+    def read(self, size=-1):
+        return os.urandom(size)
+
+
+def _write_archive(fp, padding_size=0):
+    with tarfile.open(fileobj=fp, mode="w:gz") as tar:
+        tar.add(
+            Path("tests/sample_data/bigquery_etl"),
+            arcname=os.path.basename("bigquery-etl-generated-sql"),
+        )
+        if padding_size:
+            padding = tarfile.TarInfo("bigquery-etl-generated-sql/padding.bin")
+            padding.size = padding_size
+            tar.addfile(padding, RandomReader())
+    fp.seek(0)
+
+
+@patch("requests.Session.get")
+def test_get_legacy_pings(mock_get):
+    with tempfile.NamedTemporaryFile(suffix=".tar.gz") as fp:
+        _write_archive(fp)
+        mock_get.side_effect = [MockApiResponse(io.BytesIO(fp.read()))]
 
     data = get_bigquery_etl_table_references()
 
@@ -37,3 +78,170 @@ def test_get_legacy_pings(mock_get):
         data["moz-fx-data-shared-prod.test_dataset.test_table"]["wtmo_url"]
         == "https://workflow.telemetry.mozilla.org/dags/test_dag/grid"
     )
+
+
+@patch("requests.Session.get")
+def test_get_bigquery_etl_table_references_in_memory(mock_get, tmp_path, monkeypatch):
+    with tempfile.NamedTemporaryFile(suffix=".tar.gz") as fp:
+        _write_archive(fp)
+        mock_get.side_effect = [MockApiResponse(io.BytesIO(fp.read()))]
+
+    monkeypatch.chdir(tmp_path)
+    with patch("yaml.load", wraps=yaml.load) as mock_load:
+        data = get_bigquery_etl_table_references()
+
+    # Nothing is extracted to the working directory
+    assert list(tmp_path.iterdir()) == []
+    # Only the metadata file that mentions a DAG is fully parsed
+    assert mock_load.call_count == 1
+    assert data["moz-fx-data-shared-prod.test_dataset.unscheduled_view"] == {
+        "bigquery_etl_url": "https://github.com/mozilla/bigquery-etl/blob/generated-sql/sql/moz-fx-data-shared-prod/test_dataset/unscheduled_view/view.sql"  # noqa: E501
+    }
+
+
+def _peak_memory(mock_get, padding_size):
+    with tempfile.NamedTemporaryFile(suffix=".tar.gz") as fp:
+        _write_archive(fp, padding_size)
+        # Hand the archive over as an open file, the way a socket would be read
+        mock_get.side_effect = [MockApiResponse(open(fp.name, "rb"))]
+
+        tracemalloc.start()
+        try:
+            data = get_bigquery_etl_table_references()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    assert "moz-fx-data-shared-prod.test_dataset.test_table" in data
+    return peak
+
+
+@patch("requests.Session.get")
+def test_get_bigquery_etl_table_references_streams_archive(mock_get):
+    small_peak = _peak_memory(mock_get, 4 * 1024 * 1024)
+    large_peak = _peak_memory(mock_get, 64 * 1024 * 1024)
+
+    # A buffered download would hold the whole 64MB archive at once
+    assert large_peak < 16 * 1024 * 1024
+    assert large_peak < small_peak + 4 * 1024 * 1024
+
+
+TABLE_DIR = "sql/moz-fx-data-shared-prod/test_dataset"
+
+
+class UpstreamRepo:
+    """Bare repository standing in for GitHub, pushed to from a work tree."""
+
+    def __init__(self, path: Path):
+        self.url = str(path / "upstream.git")
+        self.work_tree = path / "work"
+        subprocess.run(["git", "init", "-q", "--bare", self.url], check=True)
+        shutil.copytree("tests/sample_data/bigquery_etl", self.work_tree)
+        self._git("init", "-q", "-b", GENERATED_SQL_BRANCH)
+        self._git("remote", "add", "origin", self.url)
+        self.commit("Generate SQL")
+
+    def _git(self, *args):
+        subprocess.run(
+            ["git", "-C", str(self.work_tree), "-c", "user.name=test"]
+            + ["-c", "user.email=test@", *args],
+            check=True,
+        )
+
+    def commit(self, message):
+        self._git("add", "--all")
+        self._git("commit", "-q", "-m", message)
+        self._git("push", "-q", "origin", GENERATED_SQL_BRANCH)
+
+
+def test_iter_table_references_fails_when_directory_is_split():
+    sql = "bigquery-etl-generated-sql/sql/moz-fx-data-shared-prod/test_dataset"
+    fp = io.BytesIO()
+    with tarfile.open(fileobj=fp, mode="w") as tar:
+        for name in ["a/query.sql", "b/query.sql", "a/metadata.yaml"]:
+            content = b"scheduling: {dag_name: test_dag}"
+            member = tarfile.TarInfo(f"{sql}/{name}")
+            member.size = len(content)
+            tar.addfile(member, io.BytesIO(content))
+    fp.seek(0)
+
+    with tarfile.open(fileobj=fp) as tar:
+        references = _iter_table_references(tar)
+        assert next(references)[0] == "moz-fx-data-shared-prod.test_dataset.a"
+        with pytest.raises(tarfile.TarError, match="a/metadata.yaml"):
+            list(references)
+
+
+def test_get_changed_table_references(tmp_path):
+    upstream = UpstreamRepo(tmp_path)
+    checkout = GitCheckout(
+        str(tmp_path / "checkout"), upstream.url, GENERATED_SQL_BRANCH
+    )
+
+    # Without a synced commit, every table is read
+    head = checkout.update()
+    assert get_changed_table_references(checkout) == {
+        "moz-fx-data-shared-prod.test_dataset.test_table": {
+            "bigquery_etl_url": f"{REPO_URL}/moz-fx-data-shared-prod/test_dataset/test_table/query.sql",  # noqa: E501
+            "wtmo_url": f"{WTMO_URL}/test_dag/grid",
+        },
+        "moz-fx-data-shared-prod.test_dataset.unscheduled_view": {
+            "bigquery_etl_url": f"{REPO_URL}/moz-fx-data-shared-prod/test_dataset/unscheduled_view/view.sql",  # noqa: E501
+        },
+    }
+    checkout.mark_synced(head)
+
+    work_tree = upstream.work_tree / TABLE_DIR
+    metadata = work_tree / "test_table" / "metadata.yaml"
+    metadata.write_text(metadata.read_text().replace("test_dag", "other_dag"))
+    (work_tree / "test_table" / "schema.yaml").write_text("fields: []\n")
+    shutil.rmtree(work_tree / "unscheduled_view")
+    (work_tree / "new_table").mkdir()
+    (work_tree / "new_table" / "query.sql").write_text("SELECT 1\n")
+    upstream.commit("Regenerate SQL")
+
+    checkout.update()
+    assert checkout.synced_commit() == head
+    assert get_changed_table_references(checkout) == {
+        "moz-fx-data-shared-prod.test_dataset.test_table": {
+            "bigquery_etl_url": f"{REPO_URL}/moz-fx-data-shared-prod/test_dataset/test_table/query.sql",  # noqa: E501
+            "wtmo_url": f"{WTMO_URL}/other_dag/grid",
+        },
+        "moz-fx-data-shared-prod.test_dataset.new_table": {
+            "bigquery_etl_url": f"{REPO_URL}/moz-fx-data-shared-prod/test_dataset/new_table/query.sql",  # noqa: E501
+        },
+        # Deleted, so its links are removed
+        "moz-fx-data-shared-prod.test_dataset.unscheduled_view": {},
+    }
+
+
+def test_bigquery_etl_source_syncs_changed_tables(tmp_path):
+    upstream = UpstreamRepo(tmp_path)
+    config = {
+        "git_checkout": {
+            "directory": str(tmp_path / "checkout"),
+            "repo_url": upstream.url,
+        }
+    }
+
+    def sync(commit=True):
+        ctx = PipelineContext(run_id="test")
+        source = BigQueryEtlSource.create(config, ctx)
+        urns = sorted(wu.metadata.entityUrn for wu in source.get_workunits_internal())
+        if commit:
+            for _, committable in ctx.get_committables():
+                committable.commit()
+        return urns
+
+    # The synced commit only moves once the pipeline commits the run
+    assert len(sync(commit=False)) == 2
+    assert len(sync()) == 2
+    # Nothing changed
+    assert sync() == []
+
+    (upstream.work_tree / TABLE_DIR / "unscheduled_view" / "view.sql").unlink()
+    upstream.commit("Remove the view")
+    assert sync() == [
+        "urn:li:dataset:(urn:li:dataPlatform:bigquery,"
+        "moz-fx-data-shared-prod.test_dataset.unscheduled_view,PROD)"
+    ]
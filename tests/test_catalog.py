@@ -0,0 +1,165 @@
+from datetime import timedelta
+from pathlib import Path
+import sqlite3
+import tarfile
+import threading
+
+import pytest
+
+from sync.catalog import Catalog
+from sync.legacy import (
+    PING_RECORD,
+    TABLES_RECORD,
+    _iter_ping_schemas,
+    _iter_ping_tables,
+)
+
+PROJECT = "moz-fx-data-shared-prod"
+
+
+def test_catalog_reads_upstream_once_within_max_age(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return ["project.dataset.table_v1", "project.dataset.table_v2"]
+
+    assert Catalog(path).refresh("upstream", fetch)
+    # A source of the same run finds the tables read by the first one
+    catalog = Catalog(path)
+    assert not catalog.refresh("upstream", fetch)
+    assert len(fetches) == 1
+    assert catalog.has_table("project.dataset.table_v2")
+    assert not catalog.has_table("project.dataset.table_v3")
+    assert catalog.count("upstream") == 2
+    assert catalog.count("other") == 0
+
+
+def test_catalog_table_versions(tmp_path):
+    catalog = Catalog(str(tmp_path / "catalog.sqlite"))
+    catalog.refresh(
+        "upstream",
+        lambda: [
+            "project.dataset.baseline_v10",
+            "project.dataset.baseline_v2",
+            "project.dataset.baseline",
+            "project.dataset.baseline_events_v1",
+            "project.other.baseline_v1",
+        ],
+    )
+
+    assert catalog.table_versions("project.dataset", "baseline") == [2, 10]
+    assert catalog.table_versions("project.dataset", "baseline_events") == [1]
+    assert catalog.table_versions("project.dataset", "metrics") == []
+
+
+def test_catalog_rebuilds_older_versions(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE tables (qualified_name TEXT PRIMARY KEY)")
+    connection.execute("PRAGMA user_version = 1")
+    connection.close()
+
+    catalog = Catalog(path)
+    assert catalog.refresh("upstream", lambda: ["project.dataset.table_v1"])
+    assert catalog.table_versions("project.dataset", "table") == [1]
+
+
+def test_catalog_shares_concurrent_reads(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    Catalog(path)
+    reading = threading.Event()
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        reading.set()
+        # Long enough for the other source to try its own refresh
+        threading.Event().wait(0.2)
+        return ["project.dataset.table_v1"]
+
+    first = threading.Thread(target=lambda: Catalog(path).refresh("upstream", fetch))
+    first.start()
+    assert reading.wait(timeout=10)
+    catalog = Catalog(path)
+    assert not catalog.refresh("upstream", fetch)
+    first.join()
+
+    assert len(fetches) == 1
+    assert catalog.has_table("project.dataset.table_v1")
+
+
+def test_catalog_replaces_tables_of_stale_upstream(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    Catalog(path).refresh("upstream", lambda: ["project.dataset.table_v1"])
+    Catalog(path).refresh("other", lambda: ["project.other.table_v1"])
+
+    catalog = Catalog(path, max_age=timedelta(0))
+    assert catalog.refresh("upstream", lambda: ["project.dataset.table_v2"])
+
+    assert not catalog.has_table("project.dataset.table_v1")
+    assert catalog.has_table("project.dataset.table_v2")
+    assert catalog.has_table("project.other.table_v1")
+
+
+def test_catalog_forced_refresh_is_never_reused(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    Catalog(path).refresh("upstream", lambda: ["project.dataset.table_v1"])
+
+    # A snapshot replaces fresh tables, and is replaced by the next live run
+    catalog = Catalog(path)
+    assert catalog.refresh("upstream", lambda: ["project.dataset.table_v2"], True)
+    assert catalog.table_versions("project.dataset", "table") == [2]
+    assert catalog.refresh("upstream", lambda: ["project.dataset.table_v3"])
+    assert catalog.table_versions("project.dataset", "table") == [3]
+
+
+def test_catalog_keeps_tables_when_refresh_fails(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    Catalog(path).refresh("upstream", lambda: ["project.dataset.table_v1"])
+
+    def fetch():
+        yield "project.dataset.table_v2"
+        raise ConnectionError("upstream is down")
+
+    catalog = Catalog(path, max_age=timedelta(0))
+    with pytest.raises(ConnectionError):
+        catalog.refresh("upstream", fetch)
+
+    assert catalog.has_table("project.dataset.table_v1")
+    assert not catalog.has_table("project.dataset.table_v2")
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = tmp_path / "generated-schemas.tar"
+    with tarfile.open(archive, "w") as tar:
+        tar.add(
+            Path("tests/sample_data/mozilla-pipeline-schemas-generated-schemas"),
+            arcname="mozilla-pipeline-schemas-generated-schemas",
+        )
+    return archive
+
+
+PING_TABLES = {
+    f"{PROJECT}.telemetry_live.fake_ping_v3",
+    f"{PROJECT}.telemetry_live.fake_ping_v4",
+    f"{PROJECT}.telemetry_stable.fake_ping_v3",
+    f"{PROJECT}.telemetry_stable.fake_ping_v4",
+}
+
+
+def test_iter_ping_tables(archive):
+    with tarfile.open(archive) as tar:
+        assert set(_iter_ping_tables(tar)) == PING_TABLES
+
+
+def test_iter_ping_schemas_reads_tables_in_same_pass(archive):
+    with tarfile.open(archive) as tar:
+        *pings, (kind, tables) = _iter_ping_schemas(tar)
+
+    assert [(kind, ping["name"]) for kind, ping in pings] == [
+        (PING_RECORD, "fake-ping")
+    ]
+    assert kind == TABLES_RECORD and set(tables) == PING_TABLES
@@ -0,0 +1,81 @@
+import gzip
+import io
+import tarfile
+
+import pytest
+
+from sync import decompress
+from sync.archive import TarballStats, _open_stream
+
+
+@pytest.fixture
+def pigz_with_gzip(monkeypatch):
+    """Stand in for pigz with gzip, which takes the same options."""
+    monkeypatch.setattr(
+        decompress, "PIGZ_COMMAND", ["gzip", "--decompress", "--stdout"]
+    )
+    monkeypatch.setattr(decompress, "CHUNK_SIZE", 1024)
+
+
+def _archive(members: int) -> bytes:
+    fp = io.BytesIO()
+    with tarfile.open(fileobj=fp, mode="w:gz") as tar:
+        for i in range(members):
+            content = f"member {i}\n".encode() * 100
+            info = tarfile.TarInfo(f"dir/member_{i}.txt")
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return fp.getvalue()
+
+
+@pytest.mark.parametrize("backend", decompress.BACKENDS)
+def test_open_stream_with_backend(backend, pigz_with_gzip):
+    if backend != "pigz" and not decompress.is_available(backend):
+        pytest.skip(f"{backend} isn't installed")
+    archive = _archive(50)
+    stats = TarballStats()
+
+    with _open_stream(io.BytesIO(archive), stats, backend) as tar:
+        contents = [tar.extractfile(member).read() for member in tar]
+
+    assert contents == [f"member {i}\n".encode() * 100 for i in range(50)]
+    assert stats.downloaded_bytes == len(archive)
+    assert stats.decompressed_bytes == len(gzip.decompress(archive))
+    assert stats.members_scanned == 50
+
+
+def _corrupt(archive: bytes) -> bytes:
+    corrupted = bytearray(archive)
+    corrupted[len(corrupted) // 2] ^= 0xFF
+    return bytes(corrupted)
+
+
+@pytest.mark.parametrize(
+    "damage",
+    [_corrupt, lambda archive: archive[: len(archive) // 2]],
+    ids=["corrupt", "truncated"],
+)
+def test_pigz_reports_damaged_archives(damage, pigz_with_gzip):
+    with pytest.raises(OSError, match="failed to decompress"):
+        with _open_stream(io.BytesIO(damage(_archive(50))), backend="pigz") as tar:
+            for member in tar:
+                tar.extractfile(member).read()
+
+
+def test_pigz_stops_when_parse_fails(pigz_with_gzip):
+    with pytest.raises(KeyError):
+        with _open_stream(io.BytesIO(_archive(50)), backend="pigz") as tar:
+            next(iter(tar))
+            raise KeyError("stop")
+
+
+def test_default_backend(monkeypatch):
+    decompress.default_backend.cache_clear()
+    monkeypatch.setenv(decompress.BACKEND_ENV, "stdlib")
+    try:
+        assert decompress.default_backend() == "stdlib"
+        monkeypatch.delenv(decompress.BACKEND_ENV)
+        decompress.default_backend.cache_clear()
+        assert decompress.default_backend() == decompress.available_backends()[0]
+    finally:
+        decompress.default_backend.cache_clear()
@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
+from datahub.ingestion.api.common import PipelineContext
+from datahub.metadata.schema_classes import (
+    AuditStampClass,
+    ChangeTypeClass,
+    InstitutionalMemoryClass,
+    InstitutionalMemoryMetadataClass,
+)
+
+from sync.datahub.fingerprint import (
+    AspectFingerprintReport,
+    AspectFingerprintStore,
+    skip_unchanged_aspects,
+)
+
+URN = "urn:li:dataset:(urn:li:dataPlatform:bigquery,project.dataset.table,PROD)"
+
+
+def _workunits(url: str, created_at: int):
+    aspect = InstitutionalMemoryClass(
+        elements=[
+            InstitutionalMemoryMetadataClass(
+                url=url,
+                description="Airflow DAG",
+                createStamp=AuditStampClass(
+                    time=created_at, actor="urn:li:corpuser:ingestion"
+                ),
+            )
+        ]
+    )
+    return [MetadataChangeProposalWrapper(entityUrn=URN, aspect=aspect).as_workunit()]
+
+
+def _run(path, workunits, max_age=None):
+    report = AspectFingerprintReport()
+    store = AspectFingerprintStore(str(path))
+    emitted = list(skip_unchanged_aspects(workunits, store, report, max_age))
+    return emitted, report
+
+
+def test_skip_unchanged_aspects(tmp_path):
+    path = tmp_path / "fingerprints.sqlite"
+
+    emitted, report = _run(path, _workunits("https://example.com/a", 1))
+    assert len(emitted) == 1
+
+    # Only the audit stamp differs from the previous run
+    emitted, report = _run(path, _workunits("https://example.com/a", 2))
+    assert emitted == []
+    assert (report.emitted, report.skipped, report.skipped_ratio) == (0, 1, 1.0)
+
+    emitted, report = _run(path, _workunits("https://example.com/b", 3))
+    assert len(emitted) == 1
+    assert (report.emitted, report.skipped) == (1, 0)
+
+
+def test_skip_unchanged_aspects_reemits_after_max_age(tmp_path):
+    path = tmp_path / "fingerprints.sqlite"
+
+    _run(path, _workunits("https://example.com/a", 1))
+    emitted, _ = _run(
+        path, _workunits("https://example.com/a", 2), max_age=timedelta(0)
+    )
+
+    assert len(emitted) == 1
+
+
+def test_skip_unchanged_aspects_discards_aborted_stream(tmp_path):
+    path = tmp_path / "fingerprints.sqlite"
+    processor = skip_unchanged_aspects(
+        _workunits("https://example.com/a", 1),
+        AspectFingerprintStore(str(path)),
+        AspectFingerprintReport(),
+    )
+    next(processor)
+    processor.close()
+
+    emitted, _ = _run(path, _workunits("https://example.com/a", 2))
+    assert len(emitted) == 1
+
+
+def test_skip_unchanged_aspects_commits_with_pipeline(tmp_path):
+    path = tmp_path / "fingerprints.sqlite"
+    ctx = PipelineContext(run_id="test")
+    list(
+        skip_unchanged_aspects(
+            _workunits("https://example.com/a", 1),
+            AspectFingerprintStore(str(path)),
+            AspectFingerprintReport(),
+            ctx=ctx,
+        )
+    )
+
+    # Not persisted until the pipeline commits, once the sink has written the run
+    emitted, _ = _run(path, _workunits("https://example.com/a", 2))
+    assert len(emitted) == 1
+
+    [(_, committable)] = ctx.get_committables()
+    committable.commit()
+    emitted, _ = _run(path, _workunits("https://example.com/a", 3))
+    assert emitted == []
+
+
+def test_skip_unchanged_aspects_reports_every_emitted_workunit(tmp_path):
+    path = tmp_path / "fingerprints.sqlite"
+    _run(path, _workunits("https://example.com/a", 1))
+    # Removals aren't fingerprinted, but are still sent to the sink
+    removal = MetadataChangeProposalWrapper(
+        entityUrn=URN, changeType=ChangeTypeClass.DELETE, aspectName="status"
+    ).as_workunit()
+
+    emitted, report = _run(path, [*_workunits("https://example.com/a", 2), removal])
+
+    assert emitted == [removal]
+    assert (report.emitted, report.skipped, report.skipped_ratio) == (1, 1, 0.5)
@@ -1,18 +1,49 @@
 from dataclasses import dataclass
-from unittest.mock import patch
+import json
+from unittest.mock import MagicMock, patch
 
-from sync.glean import get_glean_pings
+import requests
+
+from sync.glean import GLEAN_DICTIONARY_URL, GleanStats, get_glean_pings
 
 
 @dataclass
 class MockApiResponse:
     data: dict | list
 
+    def raise_for_status(self):
+        pass
+
     def json(self):
         return self.data
 
+    @property
+    def content(self):
+        return json.dumps(self.data).encode()
+
+
+def _mock_responses(responses):
+    def get(url, timeout):
+        response = responses[url.removeprefix(f"{GLEAN_DICTIONARY_URL}/data/")]
+        if isinstance(response, Exception):
+            raise response
+        return MockApiResponse(response)
+
+    return get
+
+
+def _app_index(app_name, ping_names):
+    return {
+        "app_name": app_name,
+        "app_ids": [{"name": f"org.mozilla.{app_name}"}],
+        "pings": [
+            {"name": ping_name, "description": f"The {ping_name} ping"}
+            for ping_name in ping_names
+        ],
+    }
 
-@patch("requests.get")
+
+@patch("requests.Session.get")
 def test_get_glean_pings(mock_get):
     list_apps_response = [
         {
@@ -110,13 +141,48 @@ def test_get_glean_pings(mock_get):
         ],
     }
 
-    mock_get.side_effect = [
-        MockApiResponse(list_apps_response),
-        MockApiResponse(app_data_response),
-    ]
+    mock_get.side_effect = _mock_responses(
+        {
+            "apps.json": list_apps_response,
+            "glean_test_app/index.json": app_data_response,
+        }
+    )
 
     actual = get_glean_pings()
 
     assert len(actual) == 1
     assert actual[0].name == "test_ping"
     assert actual[0].app_name == "glean_test_app"
+
+
+@patch("requests.Session.get")
+def test_get_glean_pings_skips_failing_app(mock_get):
+    app_names = [f"app_{i}" for i in range(20)]
+    responses = {
+        f"{app_name}/index.json": _app_index(app_name, ["baseline", "metrics"])
+        for app_name in app_names
+    }
+    responses["apps.json"] = [{"app_name": app_name} for app_name in app_names]
+    responses["app_3/index.json"] = requests.ConnectionError("unreachable")
+    mock_get.side_effect = _mock_responses(responses)
+    on_error = MagicMock()
+    stats = GleanStats()
+
+    actual = get_glean_pings(max_workers=4, timeout=1, on_error=on_error, stats=stats)
+
+    # Pings keep the order of apps.json regardless of which fetch finishes first
+    assert [(ping.app_name, ping.name) for ping in actual] == [
+        (app_name, ping_name)
+        for app_name in app_names
+        if app_name != "app_3"
+        for ping_name in ["baseline", "metrics"]
+    ]
+    on_error.assert_called_once()
+    assert on_error.call_args.args[0] == "app_3"
+    assert all(call.kwargs["timeout"] == 1 for call in mock_get.call_args_list)
+    assert (stats.apps_fetched, stats.apps_failed, stats.pings) == (19, 1, 38)
+    assert stats.downloaded_bytes == sum(
+        len(json.dumps(response).encode())
+        for url, response in responses.items()
+        if url != "app_3/index.json"
+    )
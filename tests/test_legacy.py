@@ -1,20 +1,47 @@
 from dataclasses import dataclass
+import io
+import json
 from pathlib import Path
 import tempfile
+from typing import BinaryIO
 from unittest.mock import patch
 
-from sync.legacy import get_legacy_pings
+from datahub.ingestion.api.common import PipelineContext
+from datahub.metadata.schema_classes import (
+    ArrayTypeClass,
+    NumberTypeClass,
+    SchemaMetadataClass,
+)
+
+from sync.datahub.legacy_source import LegacySource
+from sync.legacy import (
+    LegacyPing,
+    LegacyPingSchemas,
+    LegacySchemaField,
+    SchemaStats,
+    _parse_bq_schema,
+    get_legacy_pings,
+    read_legacy_ping_schemas,
+)
 import tarfile
 import os.path
 
 
 @dataclass
 class MockApiResponse:
-    content: bytes
+    raw: BinaryIO
 
+    def raise_for_status(self):
+        pass
 
-@patch("requests.get")
-def test_get_legacy_pings(mock_get):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.raw.close()
+
+
+def _schemas_response():
     # make sample dir into a tarfile
     with tempfile.NamedTemporaryFile(suffix=".tar.gz") as fp:
         with tarfile.open(fileobj=fp, mode="w:gz") as tar:
@@ -23,12 +50,105 @@ def test_get_legacy_pings(mock_get):
                 arcname=os.path.basename("mozilla-pipeline-schemas-generated-schemas"),
             )
         fp.seek(0)
-        mock_get.side_effect = [MockApiResponse(fp.read())]
+        return MockApiResponse(io.BytesIO(fp.read()))
 
-    pings = get_legacy_pings()
+
+@patch("requests.Session.get")
+def test_get_legacy_pings(mock_get):
+    mock_get.side_effect = [_schemas_response()]
+
+    schema_stats = SchemaStats()
+    pings = get_legacy_pings(schema_stats=schema_stats)
 
     assert len(pings) == 1
     assert pings[0].name == "fake-ping"
     assert len(pings[0].versions) == 2
     assert 3 in pings[0].versions
     assert 4 in pings[0].versions
+
+    assert pings[0].schema_version == 4
+    assert len(pings[0].fields) == 34
+    geo = [f for f in pings[0].fields if f.path.startswith("metadata.geo")]
+    assert [f.path for f in geo][:2] == ["metadata.geo", "metadata.geo.city"]
+    assert geo[0].type == "RECORD"
+    assert schema_stats.fields == {"fake-ping.v3": 34, "fake-ping.v4": 34}
+    assert set(schema_stats.parse_seconds) == {"fake-ping.v3", "fake-ping.v4"}
+
+
+@patch("requests.Session.get")
+def test_read_legacy_ping_schemas_sets_tables_after_pings(mock_get):
+    mock_get.side_effect = [_schemas_response()]
+
+    legacy_pings = read_legacy_ping_schemas()
+    pings = iter(legacy_pings.pings)
+
+    assert next(pings).name == "fake-ping" and legacy_pings.tables is None
+    assert list(pings) == []
+    assert "moz-fx-data-shared-prod.telemetry_live.fake_ping_v4" in legacy_pings.tables
+
+
+def test_parse_bq_schema():
+    schema = [
+        {
+            "fields": [
+                {"mode": "REQUIRED", "name": "id", "type": "STRING"},
+                {
+                    "fields": [{"name": "value", "type": "INT64"}],
+                    "mode": "REPEATED",
+                    "name": "values",
+                    "type": "RECORD",
+                },
+            ],
+            "name": "payload",
+            "type": "RECORD",
+        },
+        {
+            "description": "Tagged",
+            "name": "client_id",
+            "policyTags": {"names": ["pii"]},
+            "type": "STRING",
+        },
+    ]
+
+    fields = _parse_bq_schema(io.BytesIO(json.dumps(schema).encode()))
+
+    assert fields == [
+        ["payload", "RECORD", "NULLABLE", None],
+        ["payload.id", "STRING", "REQUIRED", None],
+        ["payload.values", "RECORD", "REPEATED", None],
+        ["payload.values.value", "INT64", "NULLABLE", None],
+        ["client_id", "STRING", "NULLABLE", "Tagged"],
+    ]
+
+
+@patch("sync.datahub.legacy_source.read_legacy_ping_schemas")
+def test_legacy_source_emits_latest_schema(mock_read_legacy_ping_schemas):
+    def read_legacy_ping_schemas(cache, snapshot, stats, schema_stats):
+        schema_stats.fields.update({"main.v4": 2, "main.v5": 2})
+        schema_stats.parse_seconds.update({"main.v4": 0.1, "main.v5": 0.2})
+        fields = [
+            LegacySchemaField("sample_id", "INT64", "NULLABLE"),
+            LegacySchemaField("experiments", "STRING", "REPEATED", "Enrolled"),
+        ]
+        return LegacyPingSchemas(
+            [LegacyPing("main", [4, 5], schema_version=5, fields=fields)]
+        )
+
+    mock_read_legacy_ping_schemas.side_effect = read_legacy_ping_schemas
+    source = LegacySource.create({}, PipelineContext(run_id="test"))
+
+    schemas = [
+        wu.metadata.aspect
+        for wu in source.get_workunits()
+        if isinstance(wu.metadata.aspect, SchemaMetadataClass)
+    ]
+
+    assert len(schemas) == 1
+    assert schemas[0].version == 5
+    sample_id, experiments = schemas[0].fields
+    assert isinstance(sample_id.type.type, NumberTypeClass)
+    assert isinstance(experiments.type.type, ArrayTypeClass)
+    assert experiments.nativeDataType == "ARRAY<STRING>"
+    assert experiments.description == "Enrolled"
+    assert source.get_report().schemas.fields == {"main.v4": 2, "main.v5": 2}
+    assert "main.v5" in source.get_report().as_string()
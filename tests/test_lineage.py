@@ -0,0 +1,191 @@
+from unittest.mock import patch
+
+from datahub.ingestion.api.common import PipelineContext
+from datahub.metadata.schema_classes import UpstreamLineageClass
+
+from sync.catalog import PING_TABLES, Catalog
+from sync.datahub.glean_source import GleanSource
+from sync.datahub.legacy_source import LegacySource
+from sync.datahub.lineage import LineageAggregator, LineageReport
+from sync.glean import GleanPing
+from sync.legacy import LegacyPing, LegacyPingSchemas
+
+
+def _urn(name):
+    return f"urn:li:dataset:(urn:li:dataPlatform:bigquery,{name},PROD)"
+
+
+def test_lineage_aggregator_merges_upstreams():
+    report = LineageReport()
+    lineage = LineageAggregator(report)
+    lineage.add(_urn("downstream_a"), _urn("upstream_1"))
+    lineage.add(_urn("downstream_b"), _urn("upstream_1"))
+    lineage.add(_urn("downstream_a"), _urn("upstream_2"))
+    lineage.add(_urn("downstream_a"), _urn("upstream_1"))
+
+    workunits = list(lineage.gen_workunits())
+
+    assert [wu.metadata.entityUrn for wu in workunits] == [
+        _urn("downstream_a"),
+        _urn("downstream_b"),
+    ]
+    assert [
+        upstream.dataset for upstream in workunits[0].metadata.aspect.upstreams
+    ] == [_urn("upstream_1"), _urn("upstream_2")]
+    assert (report.edges, report.writes) == (4, 2)
+
+
+@patch("sync.datahub.glean_source.iter_glean_pings")
+def test_glean_source_emits_one_lineage_aspect_per_table(mock_iter_glean_pings):
+    # Both apps send the baseline ping from the same application ID
+    mock_iter_glean_pings.return_value = [
+        GleanPing("baseline", "", "fenix", ["org.mozilla.fenix"]),
+        GleanPing("baseline", "", "fenix_nightly", ["org.mozilla.fenix"]),
+    ]
+    source = GleanSource.create({}, PipelineContext(run_id="test"))
+
+    lineage = [
+        wu.metadata
+        for wu in source.get_workunits_internal()
+        if isinstance(wu.metadata.aspect, UpstreamLineageClass)
+    ]
+
+    assert len(lineage) == 1
+    assert [upstream.dataset for upstream in lineage[0].aspect.upstreams] == [
+        "urn:li:dataset:(urn:li:dataPlatform:Glean,fenix.baseline,PROD)",
+        "urn:li:dataset:(urn:li:dataPlatform:Glean,fenix_nightly.baseline,PROD)",
+    ]
+    assert (source.report.lineage.edges, source.report.lineage.writes) == (2, 1)
+
+
+@patch("sync.datahub.glean_source.iter_glean_pings")
+def test_glean_source_warns_without_catalog(mock_iter_glean_pings):
+    mock_iter_glean_pings.return_value = [
+        GleanPing("baseline", "", "fenix", ["org.mozilla.fenix"]),
+    ]
+    source = GleanSource.create({}, PipelineContext(run_id="test"))
+
+    # Lineage still goes to the _v1 table, but the report says it may not exist
+    assert _lineage_tables(source) == [
+        _urn("moz-fx-data-shared-prod.org_mozilla_fenix_live.baseline_v1")
+    ]
+    warnings = list(source.report.warnings)
+    assert [warning.title for warning in warnings] == ["Ping tables not resolved"]
+
+
+@patch("sync.catalog.iter_ping_tables")
+@patch("sync.datahub.glean_source.iter_glean_pings")
+def test_glean_source_resolves_table_versions(
+    mock_iter_glean_pings, mock_iter_ping_tables, tmp_path
+):
+    mock_iter_glean_pings.return_value = [
+        GleanPing("baseline", "", "fenix", ["org.mozilla.fenix"]),
+        GleanPing("deletion-request", "", "fenix", ["org.mozilla.fenix"]),
+        GleanPing("metrics", "", "fenix", ["org.mozilla.fenix"]),
+    ]
+    mock_iter_ping_tables.return_value = [
+        f"moz-fx-data-shared-prod.org_mozilla_fenix_{suffix}.{table}"
+        for suffix in ("live", "stable")
+        for table in ("baseline_v1", "baseline_v2", "deletion_request_v4")
+    ]
+    source = GleanSource.create(
+        {"catalog": {"path": str(tmp_path / "catalog.sqlite")}},
+        PipelineContext(run_id="test"),
+    )
+
+    lineage = [
+        wu.metadata
+        for wu in source.get_workunits_internal()
+        if isinstance(wu.metadata.aspect, UpstreamLineageClass)
+    ]
+
+    assert [mcp.entityUrn for mcp in lineage] == [
+        _urn("moz-fx-data-shared-prod.org_mozilla_fenix_live.baseline_v1"),
+        _urn("moz-fx-data-shared-prod.org_mozilla_fenix_live.baseline_v2"),
+        _urn("moz-fx-data-shared-prod.org_mozilla_fenix_live.deletion_request_v4"),
+    ]
+    report = source.report
+    assert list(report.lineage.missing_tables) == [
+        "moz-fx-data-shared-prod.org_mozilla_fenix_live.metrics"
+    ]
+    assert report.catalog.refreshed and report.catalog.tables == 6
+
+
+@patch("sync.catalog.iter_ping_tables")
+@patch("sync.datahub.glean_source.iter_glean_pings")
+def test_glean_source_uses_catalog_tables_when_refresh_fails(
+    mock_iter_glean_pings, mock_iter_ping_tables, tmp_path
+):
+    mock_iter_glean_pings.return_value = [
+        GleanPing("baseline", "", "fenix", ["org.mozilla.fenix"]),
+    ]
+    path = str(tmp_path / "catalog.sqlite")
+    Catalog(path).refresh(
+        PING_TABLES,
+        lambda: ["moz-fx-data-shared-prod.org_mozilla_fenix_live.baseline_v1"],
+    )
+    mock_iter_ping_tables.side_effect = ConnectionError("GitHub is down")
+    source = GleanSource.create(
+        {"catalog": {"path": path, "max_age_minutes": 0}},
+        PipelineContext(run_id="test"),
+    )
+
+    assert _lineage_tables(source) == [
+        _urn("moz-fx-data-shared-prod.org_mozilla_fenix_live.baseline_v1")
+    ]
+    report = source.report
+    assert not report.failures and len(report.warnings) == 1
+    assert not report.catalog.refreshed and report.catalog.tables == 1
+
+
+def _lineage_tables(source):
+    return [
+        wu.metadata.entityUrn
+        for wu in source.get_workunits_internal()
+        if isinstance(wu.metadata.aspect, UpstreamLineageClass)
+    ]
+
+
+@patch("sync.datahub.legacy_source.read_legacy_ping_schemas")
+def test_legacy_source_checks_tables_read_with_pings(
+    mock_read_legacy_ping_schemas, tmp_path
+):
+    mock_read_legacy_ping_schemas.return_value = LegacyPingSchemas(
+        [LegacyPing("main", [4, 5])],
+        tables=[
+            "moz-fx-data-shared-prod.telemetry_live.main_v5",
+            "moz-fx-data-shared-prod.telemetry_stable.main_v5",
+        ],
+    )
+    source = LegacySource.create(
+        {"catalog": {"path": str(tmp_path / "catalog.sqlite")}},
+        PipelineContext(run_id="test"),
+    )
+
+    assert _lineage_tables(source) == [
+        _urn("moz-fx-data-shared-prod.telemetry_live.main_v5")
+    ]
+    report = source.report
+    assert list(report.lineage.missing_tables) == [
+        "moz-fx-data-shared-prod.telemetry_live.main_v4"
+    ]
+    assert report.catalog.refreshed and report.catalog.tables == 2
+
+
+@patch("sync.datahub.legacy_source.read_legacy_ping_schemas")
+def test_legacy_source_keeps_lineage_when_catalog_fails(
+    mock_read_legacy_ping_schemas, tmp_path
+):
+    mock_read_legacy_ping_schemas.return_value = LegacyPingSchemas(
+        [LegacyPing("main", [4])], tables=[]
+    )
+    (tmp_path / "catalog.sqlite").write_text("not a database")
+    source = LegacySource.create(
+        {"catalog": {"path": str(tmp_path / "catalog.sqlite")}},
+        PipelineContext(run_id="test"),
+    )
+
+    assert _lineage_tables(source) == [
+        _urn("moz-fx-data-shared-prod.telemetry_live.main_v4")
+    ]
+    assert not source.report.failures and len(source.report.warnings) == 1
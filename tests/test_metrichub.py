@@ -1,7 +1,51 @@
-from sync.metrichub import MetricHubDefinition, MetricLevel, MetricStatistic
-from sync.metrichub import get_metric_definitions
+import os
+import subprocess
+import sys
+
+from metric_config_parser.config import ConfigCollection
+from metric_config_parser.metric import MetricLevel
+import pytest
+
+from sync.metrichub import MetricHubDefinition, MetricStatistic
+from sync.metrichub import TableReferenceCache, get_metric_definitions
+from sync.metrichub import (
+    METRIC_HUB_REPO_URL,
+    LOOKER_METRICS_URL,
+    _extract_simple_table_references,
+    _get_table_references,
+    _normalize_sql,
+    _parse_table_references,
+)
 from unittest.mock import patch, MagicMock
 
+# Shapes of from_expression found in metric-hub data sources
+FROM_EXPRESSIONS = [
+    "mozdata.telemetry.main",
+    "`moz-fx-data-shared-prod.telemetry.main`",
+    "`moz-fx-data-shared-prod`.telemetry.main",
+    "moz-fx-data-shared-prod.telemetry.main",
+    "mozdata.{dataset}.events_unnested",
+    "(SELECT * FROM mozdata.telemetry.clients_daily)",
+    """(
+        SELECT
+            client_id,
+            submission_date,
+            EXTRACT(YEAR FROM submission_date) AS year
+        FROM `moz-fx-data-shared-prod.telemetry.clients_daily`
+        WHERE sample_id = 0
+    )""",
+    "SELECT * FROM moz-fx-data-shared-prod.telemetry.clients_last_seen AS cls",
+    "SELECT * FROM mozdata.telemetry.main m WHERE m.sample_id < 10 LIMIT 10",
+    "SELECT * FROM mozdata.telemetry.main, UNNEST(payload.histograms)",
+    "SELECT * EXCEPT (payload) FROM mozdata.telemetry.main",
+    """SELECT * FROM mozdata.telemetry.main m
+    JOIN mozdata.telemetry.clients_daily c USING (client_id)""",
+    "WITH base AS (SELECT * FROM mozdata.telemetry.main) SELECT * FROM base",
+    "SELECT * FROM (SELECT * FROM mozdata.telemetry.main)",
+    """CREATE TEMP FUNCTION udf_f(x INT64) AS (x + 1);
+    SELECT udf_f(1) FROM mozdata.telemetry.main""",
+]
+
 
 def test_metric_statistic_title_cased_name():
     metric_stat = MetricStatistic(name="test_metric_name")
@@ -52,7 +96,7 @@ class MockConfigCollection:
         return [definition_mock]
 
 
-@patch("sync.metrichub.ConfigCollection")
+@patch("metric_config_parser.config.ConfigCollection")
 def test_get_metric_definitions(mock_config_collection):
     mock_config_collection.from_github_repos.return_value = MockConfigCollection()
 
@@ -61,6 +105,111 @@ def test_get_metric_definitions(mock_config_collection):
     assert metrics[0].name == "example_metric"
 
 
+@patch("sync.metrichub._extract_table_references", return_value=["table"])
+@patch("metric_config_parser.config.ConfigCollection")
+def test_get_metric_definitions_with_cache(
+    mock_config_collection, mock_extract, tmp_path
+):
+    mock_config_collection.from_github_repos.return_value = MockConfigCollection()
+
+    for _ in range(2):
+        cache = TableReferenceCache(str(tmp_path / "cache.sqlite"))
+        metrics = get_metric_definitions(cache)
+        cache.close()
+
+    assert metrics[0].bigquery_tables == ["table"]
+    # The second run is served from the cache
+    assert mock_extract.call_count == 1
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+@patch("sync.metrichub._extract_table_references", return_value=["{dataset}.table"])
+@patch("metric_config_parser.config.ConfigCollection")
+def test_get_metric_definitions_resolves_data_sources_once(
+    mock_config_collection, mock_extract
+):
+    def metric(name, data_source):
+        metric = MagicMock(owner="owner@example.com", statistics=None)
+        metric.name = name
+        metric.data_source.name = data_source
+        return metric
+
+    def definition(platform, metrics):
+        definition = MagicMock(platform=platform)
+        definition.spec.metrics.definitions = {m.name: m for m in metrics}
+        return definition
+
+    config_collection = MagicMock()
+    config_collection.definitions = [
+        definition("firefox_desktop", [metric(f"a_{i}", "main") for i in range(10)]),
+        definition("fenix", [metric(f"b_{i}", "main") for i in range(10)]),
+    ]
+    config_collection.get_data_source_definition.side_effect = (
+        lambda slug, app_name: MagicMock(
+            default_dataset=app_name, from_expression=f"{app_name}.{slug}"
+        )
+    )
+    mock_config_collection.from_github_repos.return_value = config_collection
+
+    metrics = get_metric_definitions()
+
+    assert len(metrics) == 20
+    # One lookup and one parse per (platform, data source), not per metric
+    assert config_collection.get_data_source_definition.call_count == 2
+    assert mock_extract.call_count == 2
+    assert {tuple(m.bigquery_tables) for m in metrics} == {
+        ("firefox_desktop.table",),
+        ("fenix.table",),
+    }
+
+
+def test_import_is_lazy():
+    # Heavy dependencies are only imported on the code paths that use them
+    code = (
+        "import sys, sync.metrichub; "
+        "print(' '.join(m for m in sys.modules if m.split('.')[0] in "
+        "{'sqlglot', 'metric_config_parser', 'datahub'}))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+
+    assert output.stdout.split() == []
+
+
+def test_get_table_references_in_parallel():
+    sqls = [f"SELECT * FROM dataset.table_{i % 5}" for i in range(20)]
+
+    actual = _get_table_references(sqls, workers=4)
+
+    assert actual == {sql: [sql.split()[-1]] for sql in sqls}
+
+
+def test_table_reference_cache_eviction(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = TableReferenceCache(path, max_entries=1)
+    cache.put("SELECT 1 FROM a", ["a"])
+    cache.put("SELECT 1 FROM b", ["b"])
+    cache.close()
+
+    cache = TableReferenceCache(path)
+    assert cache.get("SELECT 1 FROM a") is None
+    assert cache.get("SELECT 1 FROM b") == ["b"]
+    cache.close()
+
+
+def test_table_reference_cache_is_keyed_by_extractor_version(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = TableReferenceCache(path)
+    cache.put("SELECT 1 FROM a", ["a"])
+    cache.close()
+
+    with patch("sync.metrichub.EXTRACTOR_VERSION", "table_references.test"):
+        cache = TableReferenceCache(path)
+        assert cache.get("SELECT 1 FROM a") is None
+        cache.close()
+
+
 def test_metric_hub_definition_urn():
     metric_def = MetricHubDefinition(
         name="example_metric",
@@ -77,3 +226,45 @@ def test_metric_hub_definition_urn():
     )
     print(metric_def.urn)
     assert metric_def.urn == "urn:li:glossaryTerm:Metric Hub.TestProduct.example_metric"
+
+
+@pytest.mark.parametrize("sql", FROM_EXPRESSIONS)
+def test_simple_table_references_match_full_parse(sql):
+    sql = _normalize_sql(sql)
+    tables = _extract_simple_table_references(sql)
+
+    if tables is not None:
+        assert tables == _parse_table_references(sql)
+
+
+def test_simple_table_references():
+    assert _extract_simple_table_references("mozdata.telemetry.main") == [
+        "mozdata.telemetry.main"
+    ]
+    assert _extract_simple_table_references(FROM_EXPRESSIONS[6]) == [
+        "moz-fx-data-shared-prod.telemetry.clients_daily"
+    ]
+    assert _extract_simple_table_references(FROM_EXPRESSIONS[7]) == [
+        "moz-fx-data-shared-prod.telemetry.clients_last_seen"
+    ]
+    # Joins, CTEs, subqueries and UDFs need the full parse
+    for sql in FROM_EXPRESSIONS[-4:]:
+        assert _extract_simple_table_references(sql) is None
+
+
+@pytest.mark.skipif(
+    not os.environ.get("METRIC_HUB_DIFFERENTIAL_TEST"),
+    reason="Fetches every metric-hub data source from GitHub",
+)
+def test_simple_table_references_match_full_parse_for_metric_hub():
+    config_collection = ConfigCollection.from_github_repos(
+        [METRIC_HUB_REPO_URL, LOOKER_METRICS_URL]
+    )
+    for definition in config_collection.definitions:
+        for data_source in definition.spec.data_sources.definitions.values():
+            if not data_source.from_expression:
+                continue
+            sql = _normalize_sql(data_source.from_expression)
+            tables = _extract_simple_table_references(sql)
+            if tables is not None:
+                assert tables == _parse_table_references(sql), sql
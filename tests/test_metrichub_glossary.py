@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
+from unittest.mock import patch
+
+from metric_config_parser.metric import MetricLevel
+import pytest
+import yaml
+
+from sync.datahub.metrichub_glossary import (
+    _YamlStreamWriter,
+    _build_product_dict,
+    _build_product_dicts,
+    _index_by_product,
+    _write_glossary,
+    _write_glossary_shards,
+)
+from sync.metrichub import (
+    METRIC_HUB_REPO_URL,
+    MetricHubDefinition,
+    MetricStatistic,
+)
+
+
+def _metric(name, product, **kwargs):
+    return MetricHubDefinition(
+        name=name,
+        description=kwargs.get("description", f"Description of {name}\nover lines"),
+        sql_definition=kwargs.get("sql_definition", "COUNT(DISTINCT client_id)"),
+        product=product,
+        owners=["owner@example.com"],
+        level=kwargs.get("level"),
+        bigquery_tables=["mozdata.telemetry.main"],
+        data_source=kwargs.get("data_source", "main"),
+        statistics=[MetricStatistic(name="sum")],
+        friendly_name=kwargs.get("friendly_name"),
+        deprecated=kwargs.get("deprecated", False),
+    )
+
+
+METRICS = [
+    _metric("active_users", "firefox_desktop", level=MetricLevel.GOLD),
+    _metric("uri_count", "firefox_desktop", friendly_name="URI Count"),
+    _metric("no_source", "firefox_desktop", data_source=None),
+    _metric("retained", "fenix", deprecated=True, description="Ünïcode: 🦊"),
+]
+
+DUMPERS = [yaml.Dumper, yaml.CDumper] if yaml.__with_libyaml__ else [yaml.Dumper]
+
+
+def _expected_glossary():
+    # The document as it was built and dumped in one piece before streaming
+    return {
+        "version": 1,
+        "source": "Metric-Hub",
+        "url": METRIC_HUB_REPO_URL,
+        "owners": [],
+        "nodes": [
+            {
+                "name": "Metric Hub",
+                "description": "Central hub for metric definitions that are considered the source of truth.",  # noqa: E501
+                "nodes": [
+                    _build_product_dict("firefox_desktop", METRICS[:3]),
+                    _build_product_dict("fenix", METRICS[3:]),
+                ],
+            }
+        ],
+    }
+
+
+@pytest.mark.parametrize("dumper", DUMPERS)
+def test_write_glossary_matches_yaml_dump(dumper):
+    f = io.StringIO()
+    _write_glossary(f, _build_product_dicts(_index_by_product(METRICS)), dumper=dumper)
+
+    assert f.getvalue() == yaml.dump(_expected_glossary(), Dumper=dumper)
+
+
+def test_yaml_stream_writer_keeps_key_order():
+    items = [{"urn": "b", "glossary_terms": ["x", "y"]}, {"urn": "a"}]
+    f = io.StringIO()
+    with _YamlStreamWriter(f, sort_keys=False) as writer:
+        writer.start_sequence()
+        for item in items:
+            writer.write(item)
+        writer.end_sequence()
+
+    assert f.getvalue() == yaml.dump(items, sort_keys=False)
+
+
+def test_index_by_product_merges_interleaved_products():
+    metrics = [METRICS[0], METRICS[3], METRICS[1], METRICS[2]]
+
+    products = _index_by_product(metrics)
+
+    assert list(products) == ["firefox_desktop", "fenix"]
+    assert products["firefox_desktop"] == METRICS[:3]
+
+
+def test_build_product_dicts_in_parallel():
+    products = _index_by_product(METRICS)
+
+    actual = list(_build_product_dicts(products, workers=2))
+
+    assert actual == list(_build_product_dicts(products))
+
+
+def test_build_product_dicts_bounds_products_in_flight():
+    submitted = []
+
+    class RecordingPool(ThreadPoolExecutor):
+        def submit(self, fn, *args):
+            submitted.append(args[0])
+            return super().submit(fn, *args)
+
+    products = {f"product_{i}": [] for i in range(20)}
+    with patch("sync.datahub.metrichub_glossary.process_pool", RecordingPool), patch(
+        "sync.datahub.metrichub_glossary._build_product_dict",
+        lambda product, metrics: {"name": product},
+    ):
+        product_dicts = _build_product_dicts(products, workers=2)
+        assert next(product_dicts) == {"name": "product_0"}
+        # Two products per worker are built ahead of the one being written
+        assert len(submitted) == 4
+        assert [p["name"] for p in product_dicts] == list(products)[1:]
+
+
+def test_write_glossary_shards(tmp_path):
+    (tmp_path / "deleted_product.yaml").write_text("")
+    products = _index_by_product(METRICS)
+
+    changed = _write_glossary_shards(tmp_path, _build_product_dicts(products))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "fenix.yaml",
+        "firefox_desktop.yaml",
+    ]
+    assert len(changed) == 2
+    shard = yaml.safe_load((tmp_path / "fenix.yaml").read_text())
+    assert shard["nodes"][0]["nodes"] == [_build_product_dict("fenix", METRICS[3:])]
+
+    # Only the product whose metrics changed is written again
+    products["fenix"] = [_metric("retained", "fenix", description="Changed")]
+    changed = _write_glossary_shards(tmp_path, _build_product_dicts(products))
+
+    assert changed == [tmp_path / "fenix.yaml"]
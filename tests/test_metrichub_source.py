@@ -0,0 +1,71 @@
+from unittest.mock import patch
+
+from datahub.ingestion.api.common import PipelineContext
+from datahub.metadata.schema_classes import (
+    GlossaryNodeInfoClass,
+    GlossaryTermInfoClass,
+    GlossaryTermsClass,
+    OwnershipClass,
+)
+
+from sync.datahub.metrichub_source import MetricHubGlossarySource
+from sync.metrichub import MetricHubDefinition
+
+
+def _metric(name, product, bigquery_tables):
+    return MetricHubDefinition(
+        name=name,
+        description=f"Description of {name}",
+        sql_definition="COUNT(*)",
+        product=product,
+        owners=["owner@example.com"],
+        level=None,
+        bigquery_tables=bigquery_tables,
+        data_source="main",
+        statistics=None,
+        friendly_name=None,
+        deprecated=False,
+    )
+
+
+@patch("sync.datahub.metrichub_source.get_metric_definitions")
+def test_metrichub_glossary_source(mock_get_metric_definitions):
+    mock_get_metric_definitions.return_value = [
+        _metric("active_users", "fenix", ["mozdata.fenix.baseline"]),
+        _metric("retained", "focus", ["mozdata.fenix.baseline"]),
+        _metric("uri_count", "fenix", None),
+    ]
+    source = MetricHubGlossarySource.create({}, PipelineContext(run_id="test"))
+
+    aspects = {}
+    for wu in source.get_workunits_internal():
+        aspects[(wu.metadata.entityUrn, type(wu.metadata.aspect))] = wu.metadata.aspect
+
+    root = aspects[("urn:li:glossaryNode:Metric-Hub", GlossaryNodeInfoClass)]
+    assert root.name == "Metric Hub" and root.parentNode is None
+    fenix = aspects[("urn:li:glossaryNode:Metric-Hub.fenix", GlossaryNodeInfoClass)]
+    assert fenix.parentNode == "urn:li:glossaryNode:Metric-Hub"
+
+    term_urn = "urn:li:glossaryTerm:Metric Hub.fenix.active_users"
+    term = aspects[(term_urn, GlossaryTermInfoClass)]
+    assert term.parentNode == "urn:li:glossaryNode:Metric-Hub.fenix"
+    assert term.termSource == "EXTERNAL"
+    assert "Description of active_users" in term.definition
+    owners = aspects[(term_urn, OwnershipClass)].owners
+    assert [owner.owner for owner in owners] == ["urn:li:corpuser:owner@example.com"]
+
+    dataset_urn = (
+        "urn:li:dataset:(urn:li:dataPlatform:bigquery,mozdata.fenix.baseline,PROD)"
+    )
+    terms = aspects[(dataset_urn, GlossaryTermsClass)].terms
+    assert [term.urn for term in terms] == [
+        term_urn,
+        "urn:li:glossaryTerm:Metric Hub.focus.retained",
+    ]
+
+    report = source.get_report()
+    assert (report.glossary_nodes, report.glossary_terms, report.datasets) == (
+        3,
+        3,
+        1,
+    )
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from sync.prefetch import prefetch
+
+
+def test_prefetch_yields_items_in_order():
+    assert list(prefetch(range(1000), max_items=10)) == list(range(1000))
+
+
+def test_prefetch_stays_within_max_items():
+    produced = []
+
+    def produce():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    items = prefetch(produce(), max_items=5)
+    assert next(items) == 0
+    # Wait for the producer to fill the queue and block on it
+    time.sleep(0.3)
+    # The queue, the item being put and the one already consumed
+    assert len(produced) <= 5 + 2
+    assert list(items) == list(range(1, 100))
+
+
+def test_prefetch_raises_errors_of_the_iterable():
+    def produce():
+        yield 1
+        raise ValueError("upstream failed")
+
+    items = prefetch(produce())
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="upstream failed"):
+        next(items)
+
+
+def test_prefetch_closes_the_iterable_when_closed():
+    closed = threading.Event()
+
+    def produce():
+        try:
+            for i in range(100):
+                yield i
+        finally:
+            closed.set()
+
+    items = prefetch(produce(), max_items=2)
+    assert next(items) == 0
+    items.close()
+    assert closed.is_set()
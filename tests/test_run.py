@@ -0,0 +1,162 @@
+from glob import glob
+import json
+import threading
+from typing import List, get_type_hints
+
+from datahub.ingestion.api.committable import Committable, CommitPolicy
+from datahub.ingestion.sink.file import FileSink
+from datahub.ingestion.source.file import GenericFileSource
+from datahub.configuration.config_loader import load_config_file
+from datahub.ingestion.run.pipeline_config import PipelineConfig
+from datahub.ingestion.source.source_registry import source_registry
+import pytest
+import yaml
+
+from sync.run import run_recipes
+
+# Output files as they were when each committable was committed
+COMMITTED: List[str] = []
+
+
+class OutputCommittable(Committable):
+    def __init__(self, filename: str):
+        super().__init__(name="output", commit_policy=CommitPolicy.ON_NO_ERRORS)
+        self.filename = filename
+
+    def commit(self) -> None:
+        with open(self.filename) as f:
+            COMMITTED.append(f.read())
+
+
+class CommittingFileSource(GenericFileSource):
+    """File source that commits once its records are written to `output.json`."""
+
+    def get_workunits_internal(self):
+        yield from super().get_workunits_internal()
+        output = str(self.config.path).replace("platform_mce.json", "output.json")
+        self.ctx.register_checkpointer(OutputCommittable(output))
+
+
+class Abort(BaseException):
+    pass
+
+
+class AbortingFileSink(FileSink):
+    def write_record_async(self, record_envelope, write_callback):
+        raise Abort()
+
+
+class RejectingFileSink(FileSink):
+    def write_record_async(self, record_envelope, write_callback):
+        write_callback.on_failure(record_envelope, ValueError("rejected"), {})
+
+
+def _write_recipe(path, source, sink):
+    path.write_text(yaml.dump({"source": source, "sink": sink}))
+    return str(path)
+
+
+def test_run_recipes_share_one_sink(tmp_path):
+    sink = {"type": "file", "config": {"filename": str(tmp_path / "output.json")}}
+    platforms = _write_recipe(
+        tmp_path / "platform.dhub.yaml",
+        {"type": "file", "config": {"filename": "recipes/platform_mce.json"}},
+        sink,
+    )
+    missing = _write_recipe(
+        tmp_path / "missing.dhub.yaml",
+        {"type": "file", "config": {"filename": str(tmp_path / "missing.json")}},
+        sink,
+    )
+
+    runs = run_recipes([platforms, missing, platforms])
+
+    # A failing source doesn't stop the others
+    assert [run.failed for run in runs] == [False, True, False]
+    records = json.loads((tmp_path / "output.json").read_text())
+    with open("recipes/platform_mce.json") as f:
+        assert len(records) == 2 * len(json.load(f))
+
+
+def test_run_recipes_requires_one_sink(tmp_path):
+    source = {"type": "file", "config": {"filename": "recipes/platform_mce.json"}}
+    recipes = [
+        _write_recipe(
+            tmp_path / f"{name}.dhub.yaml",
+            source,
+            {"type": "file", "config": {"filename": str(tmp_path / f"{name}.json")}},
+        )
+        for name in ["a", "b"]
+    ]
+
+    with pytest.raises(ValueError):
+        run_recipes(recipes)
+
+
+@pytest.mark.parametrize("sink_type", ["file", "test_run.RejectingFileSink"])
+def test_run_recipes_commit_after_sink_is_closed(tmp_path, sink_type):
+    (tmp_path / "platform_mce.json").write_text(
+        open("recipes/platform_mce.json").read()
+    )
+    output = tmp_path / "output.json"
+    recipe = _write_recipe(
+        tmp_path / "platform.dhub.yaml",
+        {
+            "type": "test_run.CommittingFileSource",
+            "config": {"filename": str(tmp_path / "platform_mce.json")},
+        },
+        {"type": sink_type, "config": {"filename": str(output)}},
+    )
+    COMMITTED.clear()
+
+    [run] = run_recipes([recipe])
+
+    if sink_type == "file":
+        # Committed once every record was written and the sink was closed
+        assert not run.failed
+        assert COMMITTED == [output.read_text()]
+        assert COMMITTED[0].endswith("]")
+    else:
+        # Nothing is committed for records the sink didn't write
+        assert run.failed
+        assert COMMITTED == []
+
+
+@pytest.mark.parametrize("recipe", sorted(glob("recipes/*.dhub.yaml")))
+def test_recipe_source_configs_are_valid(recipe, monkeypatch):
+    monkeypatch.setenv("DATAHUB_GMS_URL", "http://localhost:8080")
+    monkeypatch.setenv("DATAHUB_GMS_TOKEN", "token")
+    config = PipelineConfig.from_dict(load_config_file(recipe))
+
+    source_class = source_registry.get(config.source.type)
+    config_class = get_type_hints(source_class.__init__).get("config")
+    if config_class is not None:
+        config_class.parse_obj(config.source.dict().get("config", {}))
+
+
+def test_run_recipes_stops_sources_when_records_are_not_read(tmp_path, monkeypatch):
+    monkeypatch.setattr("sync.run.QUEUE_SIZE", 1)
+    monkeypatch.setattr("sync.run.STOP_CHECK_SECONDS", 0.01)
+    sink = {
+        "type": "test_run.AbortingFileSink",
+        "config": {"filename": str(tmp_path / "output.json")},
+    }
+    source = {"type": "file", "config": {"filename": "recipes/platform_mce.json"}}
+    recipes = [
+        _write_recipe(tmp_path / f"{name}.dhub.yaml", source, sink)
+        for name in ["a", "b"]
+    ]
+    raised = []
+
+    def run():
+        try:
+            run_recipes(recipes)
+        except Abort as e:
+            raised.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    # Sources blocked on the full queue give up instead of hanging the run
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert len(raised) == 1
@@ -0,0 +1,126 @@
+import contextlib
+from dataclasses import dataclass
+import io
+import subprocess
+import tarfile
+from typing import BinaryIO
+from unittest.mock import patch
+
+import pytest
+
+from sync.archive import read_tarball
+from sync.glean import GLEAN_DICTIONARY_URL, get_glean_pings
+from sync.snapshot import Snapshot, _extract_all
+
+
+@dataclass
+class MockApiResponse:
+    raw: BinaryIO = None
+    data: dict | list = None
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def _archive(*names) -> bytes:
+    fp = io.BytesIO()
+    with tarfile.open(fileobj=fp, mode="w:gz") as tar:
+        for name in names:
+            tar.addfile(tarfile.TarInfo(name))
+    return fp.getvalue()
+
+
+def _member_names(tar: tarfile.TarFile):
+    return [member.name for member in tar]
+
+
+@patch("requests.Session.get")
+def test_snapshot_replays_tarball(mock_get, tmp_path):
+    url = "https://example.com/a.tar.gz"
+    mock_get.return_value = MockApiResponse(io.BytesIO(_archive("a", "b")))
+
+    with Snapshot(tmp_path, record=True) as snapshot:
+        assert read_tarball(url, _member_names, snapshot=snapshot) == ["a", "b"]
+    mock_get.reset_mock()
+
+    snapshot = Snapshot(tmp_path)
+    assert read_tarball(url, _member_names, snapshot=snapshot) == ["a", "b"]
+    mock_get.assert_not_called()
+    with pytest.raises(KeyError):
+        read_tarball("https://example.com/b.tar.gz", _member_names, snapshot=snapshot)
+
+
+@patch("requests.Session.get")
+def test_snapshot_replays_glean_dictionary(mock_get, tmp_path):
+    responses = {
+        "apps.json": [{"app_name": "fenix"}],
+        "fenix/index.json": {
+            "app_ids": [{"name": "org.mozilla.fenix"}],
+            "pings": [{"name": "baseline", "description": ""}],
+        },
+    }
+    mock_get.side_effect = lambda url, timeout: MockApiResponse(
+        data=responses[url.removeprefix(f"{GLEAN_DICTIONARY_URL}/data/")]
+    )
+
+    with Snapshot(tmp_path, record=True) as snapshot:
+        recorded = get_glean_pings(snapshot=snapshot)
+    mock_get.reset_mock()
+
+    assert get_glean_pings(snapshot=Snapshot(tmp_path)) == recorded
+    assert [ping.qualified_name for ping in recorded] == ["fenix.baseline"]
+    mock_get.assert_not_called()
+
+
+@pytest.fixture(params=["data_filter", "without_filters"])
+def extraction(request, monkeypatch):
+    """Extract with the tarfile data filter, and as on Pythons without it."""
+    if request.param == "without_filters":
+        monkeypatch.delattr(tarfile, "data_filter", raising=False)
+    return request.param
+
+
+def test_snapshot_replays_git_checkout(tmp_path, extraction):
+    repo = tmp_path / "repo"
+    (repo / "definitions").mkdir(parents=True)
+    (repo / "definitions" / "fenix.toml").write_text("[metrics]\n")
+    git = ["git", "-C", str(repo), "-c", "user.name=test", "-c", "user.email=test@"]
+    subprocess.run([*git, "init", "-q"], check=True)
+    subprocess.run([*git, "add", "."], check=True)
+    subprocess.run([*git, "commit", "-q", "-m", "Add fenix"], check=True)
+
+    with Snapshot(tmp_path / "snapshot", record=True) as snapshot:
+        with snapshot.checkout(str(repo)):
+            pass
+    (repo / "definitions" / "fenix.toml").unlink()
+
+    with Snapshot(tmp_path / "snapshot").checkout(str(repo)) as checkout:
+        assert (checkout / "definitions" / "fenix.toml").read_text() == "[metrics]\n"
+        assert (checkout / ".git").is_dir()
+
+
+@pytest.mark.parametrize("name", ["../outside", "{tmp_path}/outside", "link"])
+def test_extract_all_keeps_members_inside_path(tmp_path, extraction, name):
+    member = tarfile.TarInfo(name.format(tmp_path=tmp_path))
+    if name == "link":
+        member.type, member.linkname = tarfile.SYMTYPE, "../outside"
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w") as tar:
+        tar.addfile(member, io.BytesIO(b""))
+    archive.seek(0)
+
+    # The data filter strips leading slashes instead of refusing the member
+    with tarfile.open(fileobj=archive) as tar, contextlib.suppress(tarfile.TarError):
+        _extract_all(tar, tmp_path / "repo")
+        assert extraction == "data_filter"
+    assert not (tmp_path / "outside").exists()
+    assert not (tmp_path / "repo" / "link").is_symlink()
@@ -0,0 +1,76 @@
+from unittest.mock import patch
+
+from datahub.emitter.mcp import MetadataChangeProposalWrapper
+from datahub.ingestion.api.common import PipelineContext
+from datahub.metadata.schema_classes import StatusClass, SubTypesClass
+
+from sync.datahub.legacy_source import LegacySource
+from sync.datahub.stats import StageReport, report_stages, write_prometheus_textfile
+from sync.glean import GleanStats
+from sync.legacy import LegacyPing, LegacyPingSchemas
+
+
+def _workunits(urns):
+    for urn in urns:
+        yield MetadataChangeProposalWrapper(
+            entityUrn=urn, aspect=SubTypesClass(typeNames=["Ping"])
+        ).as_workunit()
+        yield MetadataChangeProposalWrapper(
+            entityUrn=urn, aspect=StatusClass(removed=False)
+        ).as_workunit()
+
+
+def test_report_stages_counts_mcps_by_aspect():
+    report = StageReport()
+    urns = [
+        f"urn:li:dataset:(urn:li:dataPlatform:Glean,app.ping_{i},PROD)"
+        for i in range(3)
+    ]
+
+    assert len(list(report_stages(_workunits(urns), report))) == 6
+    assert report.mcps == {"subTypes": 3, "status": 3}
+    assert report.mcp_seconds >= 0
+
+
+def test_write_prometheus_textfile(tmp_path):
+    report = StageReport(fetch_seconds=1.5, mcp_seconds=0.25)
+    report.mcps["subTypes"] = 3
+    path = tmp_path / "glean.prom"
+
+    write_prometheus_textfile(
+        str(path), "glean", report, {"glean": GleanStats(apps_fetched=2)}
+    )
+
+    lines = path.read_text().splitlines()
+    assert 'sync_stage_seconds{source="glean",stage="fetch"} 1.5' in lines
+    assert 'sync_stage_seconds{source="glean",stage="mcp"} 0.25' in lines
+    assert 'sync_mcps{source="glean",aspect="subTypes"} 3' in lines
+    assert 'sync_glean_apps_fetched{source="glean"} 2' in lines
+    # One TYPE line per metric, however many samples it has
+    assert lines.count("# TYPE sync_stage_seconds gauge") == 1
+    assert not (tmp_path / "glean.prom.tmp").exists()
+
+
+@patch("sync.datahub.legacy_source.read_legacy_ping_schemas")
+def test_legacy_source_reports_stages(mock_read_legacy_ping_schemas, tmp_path):
+    mock_read_legacy_ping_schemas.return_value = LegacyPingSchemas(
+        [LegacyPing("main", [4, 5])]
+    )
+    path = tmp_path / "legacy.prom"
+    source = LegacySource.create(
+        {"prometheus_textfile": str(path)}, PipelineContext(run_id="test")
+    )
+
+    list(source.get_workunits())
+    source.close()
+
+    report = source.get_report()
+    assert report.pings == 1
+    # Only what the source built, not the status aspects added by processors
+    assert report.stages.mcps == {
+        "subTypes": 1,
+        "browsePaths": 1,
+        "upstreamLineage": 2,
+    }
+    assert "stages" in report.as_string() and "tarball" in report.as_string()
+    assert 'sync_mcps{source="legacy",aspect="upstreamLineage"} 2' in path.read_text()